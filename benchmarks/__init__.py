@@ -0,0 +1 @@
+# Standalone benchmarks; run them from the repository root with `python -m benchmarks.<name>`.
@@ -0,0 +1,121 @@
+"""
+Cold start of a webhook worker: time from process launch until the WSGI application is loaded and until
+the first webhook response, and the worker's resident memory after that response.
+
+Every sample is a fresh interpreter that imports telegrambot.wsgi and answers one update in-process with
+inline replies, so no network I/O is measured. Profiles: the full project, the full project behind the
+fast path, and TELEGRAM_WEBHOOK_ONLY.
+
+    python -m benchmarks.bench_coldstart --runs 10
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SECRET = "bench-secret"
+PROFILES = (
+    ("full", {}),
+    ("full + fast path", {"TELEGRAM_WEBHOOK_FAST_PATH": "true"}),
+    ("webhook-only", {"TELEGRAM_WEBHOOK_ONLY": "true"}),
+)
+
+
+def _rss_kb() -> int:
+    try:
+        with open("/proc/self/status") as status:
+            return next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+    except OSError:
+        import resource
+
+        # Peak rather than current RSS; kilobytes on Linux, bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def child() -> None:
+    # Runs in the measured worker: load the application, answer one update, report timestamps.
+    from telegrambot.wsgi import application
+
+    ready = time.monotonic()
+    body = json.dumps({"update_id": 1, "message": {"chat": {"id": 1}, "from": {"first_name": "Bench"}, "text": "hi"}})
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/telegram/webhook/",
+        "SERVER_NAME": "127.0.0.1",
+        "SERVER_PORT": "8000",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "HTTP_HOST": "127.0.0.1",
+        "HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN": SECRET,
+        "wsgi.input": io.BytesIO(body.encode()),
+        "wsgi.url_scheme": "https",
+        "wsgi.errors": io.StringIO(),
+    }
+    status = []
+    b"".join(application(environ, lambda line, headers: status.append(line)))
+    answered = time.monotonic()
+    report = {"status": status[0], "ready": ready, "answered": answered, "rss": _rss_kb(), "modules": len(sys.modules)}
+    print(json.dumps(report))
+
+
+def _sample(overrides) -> dict:
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "telegrambot.settings",
+        "TELEGRAM_WEBHOOK_SECRET": SECRET,
+        "TELEGRAM_INLINE_REPLIES": "true",
+        "TELEGRAM_DEDUP_BACKEND": "",
+        "TELEGRAM_WEBHOOK_ONLY": "false",
+        "TELEGRAM_WEBHOOK_FAST_PATH": "false",
+        "CORE_LOG_LEVEL": "WARNING",
+        **overrides,
+    }
+    started = time.monotonic()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_coldstart", "--child"], env=env, capture_output=True, text=True
+    )
+    if result.returncode:
+        raise SystemExit(result.stderr)
+    sample = json.loads(result.stdout.splitlines()[-1])
+    if not sample["status"].startswith("200"):
+        raise SystemExit(f"Unexpected webhook status {sample['status']}")
+    sample["ready"] -= started
+    sample["answered"] -= started
+    return sample
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Fresh workers started per profile.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    start = time.monotonic()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    print(f"bare interpreter start: {(time.monotonic() - start) * 1000:.0f}ms")
+    samples = {label: [] for label, _ in PROFILES}
+    # Profiles take turns so a noisy neighbour does not skew one of them.
+    for _ in range(args.runs):
+        for label, overrides in PROFILES:
+            samples[label].append(_sample(overrides))
+
+    for label, runs in samples.items():
+        ready = statistics.median(run["ready"] for run in runs)
+        answered = statistics.median(run["answered"] for run in runs)
+        rss = statistics.median(run["rss"] for run in runs)
+        print(
+            f"{label:<17} app loaded {ready * 1000:6.0f}ms  first response {answered * 1000:6.0f}ms  "
+            f"RSS {rss / 1024:5.1f} MB  {runs[0]['modules']} modules  (median of {len(runs)})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Per-request CPU of the full Django/DRF webhook stack versus the WSGI fast path.
+
+Both paths run in-process with inline replies enabled, so no network I/O is measured.
+
+    python -m benchmarks.bench_fastpath --requests 5000
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.common import setup_django, wsgi_environ
+
+SECRET = "bench-secret"
+HEADERS = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+
+def _cpu_per_request(application, bodies) -> float:
+    def start_response(status, headers):
+        assert status.startswith("200"), status
+
+    started = time.process_time()
+    for body in bodies:
+        for _ in application(wsgi_environ("/telegram/webhook/", body, HEADERS), start_response):
+            pass
+    return (time.process_time() - started) / len(bodies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.update(
+        TELEGRAM_WEBHOOK_SECRET=SECRET,
+        TELEGRAM_INLINE_REPLIES="true",
+        TELEGRAM_DEDUP_BACKEND="",
+        CORE_LOG_LEVEL="WARNING",
+    )
+    setup_django()
+    from django.core.wsgi import get_wsgi_application
+
+    from core.fastpath import WebhookFastPath
+
+    bodies = [
+        json.dumps(
+            {"update_id": n, "message": {"chat": {"id": n % 50}, "from": {"first_name": "Bench"}, "text": "hi"}}
+        ).encode()
+        for n in range(args.requests)
+    ]
+    django_app = get_wsgi_application()
+    fast_app = WebhookFastPath(django_app)
+
+    _cpu_per_request(django_app, bodies[:200])
+    _cpu_per_request(fast_app, bodies[:200])
+    full = _cpu_per_request(django_app, bodies)
+    fast = _cpu_per_request(fast_app, bodies)
+
+    print(f"middleware + DRF   {full * 1e6:8.1f} us CPU/request")
+    print(f"fast path          {fast * 1e6:8.1f} us CPU/request")
+    print(f"saved              {(full - fast) * 1e6:8.1f} us ({full / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
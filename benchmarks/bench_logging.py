@@ -0,0 +1,83 @@
+"""
+Cost of logging an error per update on request threads, when the log stream is slow to write to (a busy
+terminal, a full pipe to a log shipper).
+
+Threads log one error with a payload per simulated update. The previous synchronous StreamHandler is
+compared with core.log.QueueLogHandler with and without its rate limit; the stream sleeps for --write-delay
+seconds per line. Reported are updates per second and the p99 time a thread spends in the logging call.
+
+    python -m benchmarks.bench_logging --threads 16 --updates 2000 --write-delay 0.0005
+"""
+import argparse
+import io
+import logging
+import statistics
+import threading
+import time
+
+from core.log import QueueLogHandler
+
+PAYLOAD = {"update_id": 1, "message": {"chat": {"id": 1}, "from": {"first_name": "Bench"}, "text": "hi" * 50}}
+
+
+class SlowStream(io.StringIO):
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        self.lines += 1
+        return len(text)
+
+
+def run(handler: logging.Handler, threads: int, updates: int):
+    logger = logging.getLogger(f"bench.logging.{id(handler)}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    timings = []
+    lock = threading.Lock()
+
+    def worker(count: int) -> None:
+        local = []
+        for n in range(count):
+            started = time.perf_counter()
+            logger.error("Failed to send %s to chat %s: %s", "sendMessage", n, PAYLOAD)
+            local.append(time.perf_counter() - started)
+        with lock:
+            timings.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(updates // threads,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    handler.close()
+    return len(timings) / elapsed, statistics.quantiles(timings, n=100)[98]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--write-delay", type=float, default=0.0005, help="Seconds the stream takes per line.")
+    args = parser.parse_args()
+
+    cases = {
+        "StreamHandler": lambda stream: logging.StreamHandler(stream),
+        "queue": lambda stream: QueueLogHandler(stream, rate=0, max_queue=args.updates),
+        "queue + rate limit": lambda stream: QueueLogHandler(stream, rate=10, max_queue=args.updates),
+    }
+    print(f"{'handler':<20} {'updates/s':>10} {'p99 log call':>13} {'lines written':>14}")
+    for name, build in cases.items():
+        stream = SlowStream(args.write_delay)
+        rate, p99 = run(build(stream), args.threads, args.updates)
+        print(f"{name:<20} {rate:>10.0f} {p99 * 1e6:>11.0f}us {stream.lines:>14}")
+
+
+if __name__ == "__main__":
+    main()
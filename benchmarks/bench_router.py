@@ -0,0 +1,67 @@
+"""
+Routing cost per update as the number of registered handlers grows, for the staged Router and for a
+naive chain that tries every handler's regex in registration order.
+
+Nine in ten handlers are commands and one in ten a text pattern; each case routes to the handler
+registered last, which is the worst case for the chain. Command and update type lookups stay flat, and
+so does the pattern stage, which searches only the patterns whose literal text occurs in the update.
+
+    python -m benchmarks.bench_router --sizes 3 30 300
+"""
+import argparse
+import re
+import timeit
+
+from core.router import Router
+
+
+def _reply(context):
+    return None
+
+
+def build(size: int):
+    router, chain = Router(), []
+    patterns = max(size // 10, 1)
+    for n in range(size - patterns):
+        router.command(f"cmd{n}")(_reply)
+        chain.append(re.compile(rf"^/cmd{n}\b"))
+    for n in range(patterns):
+        router.pattern(rf"\border{n}\b")(_reply)
+        chain.append(re.compile(rf"\border{n}\b"))
+    router.on("message", "callback_query")(_reply)
+    return router, chain, size - patterns - 1, patterns - 1
+
+
+def _chain_route(chain, update):
+    message = update.get("message") or update.get("callback_query") or {}
+    text = message.get("text") or message.get("data") or ""
+    for pattern in chain:
+        if pattern.search(text):
+            return pattern
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 30, 300])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'handlers':>8} {'case':<10} {'router':>12} {'chain':>12}")
+    for size in args.sizes:
+        router, chain, last_command, last_pattern = build(size)
+        cases = {
+            "command": {"message": {"chat": {"id": 1}, "text": f"/cmd{last_command} with some arguments"}},
+            "pattern": {"message": {"chat": {"id": 1}, "text": f"please track order{last_pattern} for me"}},
+            "fallback": {"message": {"chat": {"id": 1}, "text": "hello there, how are you today?"}},
+            "callback": {"callback_query": {"id": "1", "data": "vote:42"}},
+        }
+        for name, update in cases.items():
+            router.route(update)
+            routed = timeit.timeit(lambda: router.route(update), number=args.number) / args.number
+            chained = timeit.timeit(lambda: _chain_route(chain, update), number=args.number) / args.number
+            print(f"{size:>8} {name:<10} {routed * 1e9:>9.0f} ns {chained * 1e9:>9.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Per-call latency of a fresh connection per request versus the pooled keep-alive session.
+
+    python -m benchmarks.bench_session --calls 200
+"""
+import argparse
+import time
+
+from benchmarks.common import FakeBotAPI, format_latencies, setup_django
+
+
+def _measure(call, calls: int) -> list:
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    import requests
+
+    from core.telegram import TelegramClient, build_session
+
+    with FakeBotAPI(tls=True) as api:
+        url = f"{api.url}/bottoken/sendMessage"
+        payload = {"chat_id": 1, "text": "Hello, there!"}
+
+        fresh = _measure(
+            lambda: requests.post(url, json=payload, timeout=10, verify=api.cafile).json(),
+            args.calls,
+        )
+
+        session = build_session(pool_size=4)
+        session.verify = api.cafile
+        session.trust_env = False
+        client = TelegramClient("token", session=session, api_base=api.url)
+        client.send_message(1, "warm-up")
+        pooled = _measure(lambda: client.send_message(1, "Hello, there!"), args.calls)
+
+    print(format_latencies("requests.post (new TLS)", fresh))
+    print(format_latencies("pooled session", pooled))
+    print(f"median speed-up: {sorted(fresh)[len(fresh) // 2] / sorted(pooled)[len(pooled) // 2]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
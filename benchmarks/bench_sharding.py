@@ -0,0 +1,73 @@
+"""
+Throughput of chat-sharded update handling as worker processes are added, with a per-chat ordering
+check. Each update is routed through the handler registry and then burns `--work-us` of CPU, standing
+in for real handler work; no network I/O is involved.
+
+    python -m benchmarks.bench_sharding --updates 20000 --work-us 200 --processes 1 2 4 8
+
+Scaling is linear up to the number of cores as long as there are more active chats than processes.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from benchmarks.common import setup_django
+from benchmarks.updates import generate_updates
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--work-us", type=float, default=200, help="CPU time burnt per update, in microseconds.")
+    parser.add_argument("--processes", type=int, nargs="+", default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("CORE_LOG_LEVEL", "WARNING")
+    setup_django()
+    from core.handlers import router
+    from core.polling import chat_key
+    from core.sharding import ShardPool
+
+    updates = list(generate_updates(args.updates, seed=args.seed))
+    results = multiprocessing.get_context("fork").Queue()
+    work = args.work_us / 1e6
+
+    def handle(update):
+        router.route(update)
+        deadline = time.process_time() + work
+        while time.process_time() < deadline:
+            pass
+        results.put((chat_key(update), update["update_id"]))
+        return True
+
+    failed = False
+    baseline = None
+    print(f"{'processes':>9} {'updates/s':>10} {'speedup':>8}  ordering")
+    for processes in args.processes:
+        pool = ShardPool(handle, processes, max_pending=10000)
+        pool.start()
+        started = time.perf_counter()
+        for update in updates:
+            while not pool.submit(update):
+                pass
+        handled = [results.get() for _ in updates]
+        elapsed = time.perf_counter() - started
+        pool.stop()
+
+        last_seen, violations = {}, 0
+        for chat, update_id in handled:
+            if chat is not None:
+                violations += update_id < last_seen.get(chat, -1)
+                last_seen[chat] = update_id
+        throughput = len(updates) / elapsed
+        baseline = baseline or throughput
+        failed |= bool(violations)
+        print(f"{processes:>9} {throughput:>10.0f} {throughput / baseline:>7.2f}x  {violations} violations")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Cost of reading the chat id and sender name of an update through the dict helpers (json.loads of the
+whole body) and through the lazy core.update model (only the fields read are decoded).
+
+Reports time per update, the peak memory allocated while reading one, and the memory kept per update
+when a batch is held in a queue, either untouched or after its fields were read. The lazy model also
+keeps the raw body, whose average size is printed after that.
+
+The last lines measure where updates actually wait in runpoller: getUpdates batches of 100 held as
+json.loads dicts or as core.update.updates_in views, and the pickled size of an update on its way to
+a shard process.
+
+    python -m benchmarks.bench_update --updates 20000
+    python -m benchmarks.bench_update --heavy   # add photo sizes and entities, like media messages
+"""
+import argparse
+import json
+import pickle
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import setup_django
+from benchmarks.updates import generate_updates
+
+
+def _make_heavy(update):
+    message = update.get("message") or update.get("edited_message")
+    if message:
+        message["photo"] = [
+            {"file_id": f"AgACAgIAAxkBAAI{size}", "file_unique_id": f"AQAD{size}", "width": size, "height": size}
+            for size in (90, 320, 800, 1280)
+        ]
+        message["entities"] = [{"offset": n * 3, "length": 2, "type": "hashtag"} for n in range(10)]
+    return update
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--heavy", action="store_true", help="Add photo and entity arrays to every message.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from core.helpers import extract_message, extract_sender_name, get_chat_id
+    from core.update import Update, updates_in
+
+    updates = list(generate_updates(args.updates, seed=args.seed))
+    if args.heavy:
+        updates = [_make_heavy(update) for update in updates]
+    bodies = [json.dumps(update).encode() for update in updates]
+
+    def dict_path(raw):
+        payload = json.loads(raw)
+        message = extract_message(payload)
+        return payload, (get_chat_id(message), extract_sender_name(message)) if message else None
+
+    def model_path(raw):
+        update = Update.from_bytes(raw)
+        message = update.message
+        return update, (message.chat_id, message.sender_name) if message else None
+
+    for label, path in (("dict helpers", dict_path), ("lazy Update", model_path)):
+        started = time.perf_counter()
+        for raw in bodies:
+            path(raw)
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        peak = 0
+        for raw in bodies[:2000]:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            path(raw)
+            peak += tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        if path is dict_path:
+            parsed = [json.loads(raw) for raw in bodies]
+        else:
+            parsed = [Update.from_bytes(raw) for raw in bodies]
+        untouched = tracemalloc.get_traced_memory()[0]
+        for raw, item in zip(bodies, parsed):
+            if path is model_path and item.message is not None:
+                item.message.chat_id, item.message.sender_name
+        read = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del parsed
+
+        print(
+            f"{label:<13} {elapsed / len(bodies) * 1e6:6.2f}µs/update  "
+            f"peak {peak / 2000:5.0f} B while reading  "
+            f"held: {untouched / len(bodies):6.0f} B/update untouched, {read / len(bodies):6.0f} B/update after reads"
+        )
+    print(f"raw body: {sum(map(len, bodies)) / len(bodies):.0f} B/update on average (kept by the lazy model)")
+
+    # Telegram answers getUpdates with compact JSON. Each batch is copied while traced, so a parser that
+    # keeps the response body is charged for it and one that drops it after parsing is not.
+    compact = [json.dumps(update, ensure_ascii=False, separators=(",", ":")).encode() for update in updates]
+    responses = [
+        b'{"ok":true,"result":[%s]}' % b",".join(compact[start : start + 100]) for start in range(0, len(compact), 100)
+    ]
+    for label, parse in (("dict batches", lambda raw: json.loads(raw)["result"]), ("Update batches", updates_in)):
+        tracemalloc.start()
+        held = [parse(bytes(bytearray(raw))) for raw in responses]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del held
+        print(f"{label:<15} {size / len(compact):6.0f} B/update held while a polled batch waits (body included)")
+    for label, item in (("dict", json.loads(compact[0])), ("Update", Update.from_bytes(compact[0]))):
+        print(f"pickled for a shard as {label:<6} {len(pickle.dumps(item)):5d} B")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Replay a synthetic update stream through the webhook against a fault-injecting fake Bot API and
+report inbound and outbound throughput and tail latency.
+
+    python -m benchmarks.bench_webhook --updates 5000 --concurrency 32 --latency 0.05 --throttle-rate 0.01
+    python -m benchmarks.bench_webhook --dispatch-workers 16 --fast-path --fail-above-p99 50
+
+The webhook runs in-process through the WSGI application, so only the Django side is measured on the
+inbound path; use `load_webhook` to include a real HTTP server.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import FakeBotAPI, format_latencies, percentiles, setup_django, wsgi_environ
+from benchmarks.updates import generate_updates
+
+SECRET = "bench-secret"
+HEADERS = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+
+class _OutboundRecorder:
+    """
+    Wrap a TelegramClient's `request` to time every Bot API call it makes.
+    """
+
+    def __init__(self, client):
+        self.samples = []
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._request = client.request
+        client.request = self
+
+    def __call__(self, method, payload):
+        started = time.perf_counter()
+        error = None
+        try:
+            return self._request(method, payload)
+        except Exception as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.samples.append(elapsed)
+                if error:
+                    self.errors[error] = self.errors.get(error, 0) + 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent inbound webhook calls.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake Bot API base latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra random Bot API latency in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--dispatch-workers", type=int, default=0, help="TELEGRAM_DISPATCH_WORKERS for the run.")
+    parser.add_argument("--rate", type=float, default=0, help="TELEGRAM_RATE_LIMIT (0 disables pacing).")
+    parser.add_argument("--chat-rate", type=float, default=0, help="TELEGRAM_CHAT_RATE_LIMIT (0 disables pacing).")
+    parser.add_argument("--inline", action="store_true", help="Enable TELEGRAM_INLINE_REPLIES.")
+    parser.add_argument("--fast-path", action="store_true", help="Enable TELEGRAM_WEBHOOK_FAST_PATH.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fail-above-p99", type=float, help="Exit non-zero if inbound p99 exceeds this many ms.")
+    args = parser.parse_args()
+
+    api = FakeBotAPI(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    with api:
+        os.environ.update(
+            TELEGRAM_API_BASE=api.url,
+            TELEGRAM_BOT_TOKEN="0:bench",
+            TELEGRAM_WEBHOOK_SECRET=SECRET,
+            TELEGRAM_DISPATCH_WORKERS=str(args.dispatch_workers),
+            TELEGRAM_DISPATCH_QUEUE_SIZE=str(max(args.updates, 1000)),
+            TELEGRAM_RATE_LIMIT=str(args.rate),
+            TELEGRAM_CHAT_RATE_LIMIT=str(args.chat_rate),
+            TELEGRAM_INLINE_REPLIES=str(args.inline).lower(),
+            TELEGRAM_WEBHOOK_FAST_PATH=str(args.fast_path).lower(),
+            CORE_LOG_LEVEL="CRITICAL",
+        )
+        setup_django()
+        from core import webhook
+        from telegrambot.wsgi import application
+
+        outbound = _OutboundRecorder(webhook.telegram_client)
+        bodies = [json.dumps(update).encode() for update in generate_updates(args.updates, seed=args.seed)]
+        inbound, statuses = [], {}
+        lock = threading.Lock()
+
+        def deliver(body: bytes) -> None:
+            status = []
+            started = time.perf_counter()
+            for _ in application(wsgi_environ("/telegram/webhook/", body, HEADERS), lambda s, h: status.append(s)):
+                pass
+            elapsed = time.perf_counter() - started
+            with lock:
+                inbound.append(elapsed)
+                code = status[0].split()[0]
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            list(executor.map(deliver, bodies))
+        inbound_elapsed = time.perf_counter() - started
+        if args.dispatch_workers:
+            webhook.dispatcher.shutdown(timeout=600)
+        total_elapsed = time.perf_counter() - started
+
+    p99 = percentiles(inbound)[99] * 1000
+    print(format_latencies("inbound webhook", inbound))
+    print(f"{'':<28} throughput={len(inbound) / inbound_elapsed:.1f} updates/s statuses={statuses}")
+    print(format_latencies("outbound Bot API", outbound.samples))
+    print(
+        f"{'':<28} throughput={len(outbound.samples) / total_elapsed:.1f} calls/s "
+        f"server={api.outcomes} client_errors={outbound.errors}"
+    )
+
+    if args.fail_above_p99 is not None and p99 > args.fail_above_p99:
+        print(f"FAIL: inbound p99 {p99:.2f}ms exceeds {args.fail_above_p99:.2f}ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
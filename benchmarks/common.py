@@ -0,0 +1,190 @@
+import io
+import json
+import os
+import random
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+
+def setup_django() -> None:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "telegrambot.settings")
+    import django
+
+    django.setup()
+
+
+def wsgi_environ(path: str, body: bytes, headers: Dict[str, str]) -> Dict[str, object]:
+    environ: Dict[str, object] = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": path,
+        "SERVER_NAME": "127.0.0.1",
+        "SERVER_PORT": "8000",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "HTTP_HOST": "127.0.0.1",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.url_scheme": "https",
+        "wsgi.errors": io.StringIO(),
+    }
+    environ.update({f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()})
+    return environ
+
+
+def self_signed_cert(directory: str) -> Tuple[str, str]:
+    """
+    Create a throwaway certificate for 127.0.0.1 with the openssl CLI.
+    """
+    cert, key = Path(directory) / "cert.pem", Path(directory) / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", str(key), "-out", str(cert),
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return str(cert), str(key)
+
+
+class _BotAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        outcome, delay = self.server.plan()
+        if delay:
+            time.sleep(delay)
+
+        if outcome == "throttled":
+            retry_after = self.server.retry_after
+            status, data = 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }
+        elif outcome == "error":
+            status, data = 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+        else:
+            status, data = 200, {"ok": True, "result": {"message_id": 1}}
+
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    throttle_rate = 0.0
+    retry_after = 1
+
+    def setup_faults(self, seed: int) -> None:
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.outcomes: Dict[str, int] = {}
+
+    def plan(self) -> Tuple[str, float]:
+        with self.lock:
+            roll = self.random.random()
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            if roll < self.throttle_rate:
+                outcome = "throttled"
+            elif roll < self.throttle_rate + self.error_rate:
+                outcome = "error"
+            else:
+                outcome = "ok"
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        return outcome, delay
+
+
+class FakeBotAPI:
+    """
+    Keep-alive stand-in for api.telegram.org, served over HTTPS when `tls` is set.
+
+    Every call is delayed by `latency` plus up to `jitter` seconds; a `throttle_rate` share of calls is
+    answered with 429 and `retry_after`, and an `error_rate` share with 500.
+    """
+
+    def __init__(
+        self,
+        *,
+        tls: bool = False,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+        port: int = 0,
+        seed: int = 0,
+    ):
+        self.tls = tls
+        self.cafile = None
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self._server = _Server(("127.0.0.1", port), _BotAPIHandler)
+        self._server.latency = latency
+        self._server.jitter = jitter
+        self._server.error_rate = error_rate
+        self._server.throttle_rate = throttle_rate
+        self._server.retry_after = retry_after
+        self._server.setup_faults(seed)
+        if tls:
+            cert, key = self_signed_cert(self._tmpdir.name)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, key)
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+            self.cafile = cert
+
+    @property
+    def outcomes(self) -> Dict[str, int]:
+        return dict(self._server.outcomes)
+
+    @property
+    def url(self) -> str:
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "FakeBotAPI":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._tmpdir.cleanup()
+
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 95, 99)) -> Dict[int, float]:
+    ordered: List[float] = sorted(samples)
+    if not ordered:
+        return {point: 0.0 for point in points}
+    return {point: ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))] for point in points}
+
+
+def format_latencies(label: str, samples: Sequence[float]) -> str:
+    stats = percentiles(samples)
+    mean = sum(samples) / len(samples) if samples else 0.0
+    return (
+        f"{label:<28} n={len(samples):<6} mean={mean * 1000:7.2f}ms "
+        + " ".join(f"p{point}={value * 1000:7.2f}ms" for point, value in stats.items())
+    )
@@ -0,0 +1,42 @@
+"""
+Serve a local stand-in for api.telegram.org so webhook deployments can be load-tested offline.
+
+    python -m benchmarks.fake_bot_api --port 8081 --latency 0.2
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 gunicorn telegrambot.wsgi
+"""
+import argparse
+import time
+
+from benchmarks.common import FakeBotAPI
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to stall every API call.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random stall of up to this many seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 500.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of calls answered with 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after returned with 429 answers.")
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+
+    with FakeBotAPI(
+        tls=args.tls,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        port=args.port,
+    ) as api:
+        print(f"Fake Bot API listening on {api.url} (latency {args.latency * 1000:.0f}ms)", flush=True)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
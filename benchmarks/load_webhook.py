@@ -0,0 +1,62 @@
+"""
+Fire concurrent Telegram updates at a running webhook and report throughput and latency.
+
+Compare deployments by pointing both at the same fake Bot API:
+
+    python -m benchmarks.fake_bot_api --port 8081 --latency 0.2 &
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 gunicorn -w 4 -b 127.0.0.1:8000 telegrambot.wsgi
+    python -m benchmarks.load_webhook --url http://127.0.0.1:8000/telegram/webhook/
+
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 uvicorn --port 8001 telegrambot.asgi:application
+    python -m benchmarks.load_webhook --url http://127.0.0.1:8001/telegram/webhook/async/
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import format_latencies
+from benchmarks.updates import generate_updates
+
+
+async def run(url: str, total: int, concurrency: int, secret: str, chats: int) -> None:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    samples, statuses = [], {}
+    remaining = generate_updates(total, private_chats=chats, seed=int(time.time()))
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+
+        async def worker() -> None:
+            for update in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json=update, headers=headers)
+                    code = response.status_code
+                except httpx.HTTPError as exc:
+                    code = type(exc).__name__
+                samples.append(time.perf_counter() - started)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(format_latencies(url, samples))
+    print(f"throughput={total / elapsed:.1f} req/s elapsed={elapsed:.2f}s statuses={statuses}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/telegram/webhook/")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--secret", default="", help="Value for the X-Telegram-Bot-Api-Secret-Token header.")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.concurrency, args.secret, args.chats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Synthetic Telegram update streams with the shape of real bot traffic.
+"""
+import itertools
+import random
+import time
+from typing import Any, Dict, Iterator
+
+FIRST_NAMES = ("Ana", "Bruno", "Chloé", "Dmitri", "Emeka", "Fatima", "Giulia", "Hiro", "Ines", "Jonas")
+TEXTS = ("hi", "hello bot", "hola", "/start", "bonjour 👋", "what can you do?", "ok", "thanks!")
+
+# Relative weights of update kinds; groups and edits dominate busy group bots.
+DEFAULT_MIX = {
+    "private": 40,
+    "group": 30,
+    "edited": 10,
+    "sticker": 5,
+    "callback_query": 8,
+    "my_chat_member": 4,
+    "inline_query": 3,
+}
+
+
+def _user(rng: random.Random, user_id: int) -> Dict[str, Any]:
+    user = {"id": user_id, "is_bot": False, "first_name": rng.choice(FIRST_NAMES)}
+    if rng.random() < 0.6:
+        user["username"] = f"user{user_id}"
+    if rng.random() < 0.8:
+        user["language_code"] = rng.choice(("en", "es", "fr"))
+    return user
+
+
+def generate_updates(
+    count: int,
+    *,
+    private_chats: int = 500,
+    group_chats: int = 20,
+    mix: Dict[str, int] = DEFAULT_MIX,
+    seed: int = 0,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield `count` updates with increasing update_id, drawn from `mix`.
+    """
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    message_ids = itertools.count(1)
+    now = int(time.time())
+
+    for update_id in range(1, count + 1):
+        kind = rng.choices(kinds, weights)[0]
+        user = _user(rng, rng.randint(1, private_chats))
+        if kind in ("group", "edited") or (kind == "sticker" and rng.random() < 0.5):
+            group_id = -1000000000000 - rng.randint(1, group_chats)
+            chat = {"id": group_id, "type": "supergroup", "title": f"Group {-group_id % 1000}"}
+        else:
+            chat = {"id": user["id"], "type": "private", "first_name": user["first_name"]}
+
+        message: Dict[str, Any] = {"message_id": next(message_ids), "from": user, "chat": chat, "date": now}
+        if kind == "sticker":
+            message["sticker"] = {"file_id": "CAACAgIAAxkBAAE", "emoji": "🎉", "width": 512, "height": 512}
+        else:
+            message["text"] = rng.choice(TEXTS)
+            if message["text"].startswith("/"):
+                message["entities"] = [{"offset": 0, "length": len(message["text"]), "type": "bot_command"}]
+
+        if kind == "edited":
+            message["edit_date"] = now + 5
+            yield {"update_id": update_id, "edited_message": message}
+        elif kind == "callback_query":
+            yield {
+                "update_id": update_id,
+                "callback_query": {"id": str(update_id), "from": user, "message": message, "data": "noop"},
+            }
+        elif kind == "my_chat_member":
+            member = {"user": user, "status": "member"}
+            yield {
+                "update_id": update_id,
+                "my_chat_member": {
+                    "chat": chat,
+                    "from": user,
+                    "date": now,
+                    "old_chat_member": {**member, "status": "left"},
+                    "new_chat_member": member,
+                },
+            }
+        elif kind == "inline_query":
+            yield {
+                "update_id": update_id,
+                "inline_query": {"id": str(update_id), "from": user, "query": "hel", "offset": ""},
+            }
+        else:
+            yield {"update_id": update_id, "message": message}
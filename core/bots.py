@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+
+from .models import Bot
+from .telegram import AsyncTelegramClient, TelegramClient
+
+logger = logging.getLogger(__name__)
+
+
+class BotConfig(NamedTuple):
+    name: str
+    token: str
+    secret: str = ""
+
+
+class BotRegistry:
+    """
+    The extra bots served at /telegram/bots/<name>/webhook/, from TELEGRAM_BOTS and active Bot rows.
+
+    Rows are re-read at most every `ttl` seconds, so bots added in the admin go live without a restart.
+    Each bot gets one client per process; they all share the process-wide connection pools, and the
+    TELEGRAM_BOT_TOKEN bot keeps the module-level clients of core.webhook.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._bots: Dict[str, BotConfig] = {}
+        self._loaded_at: Optional[float] = None
+        self._clients: Dict[str, TelegramClient] = {}
+        self._async_clients: Dict[str, AsyncTelegramClient] = {}
+
+    def get(self, name: str) -> Optional[BotConfig]:
+        return self._load().get(name)
+
+    def all(self) -> List[BotConfig]:
+        return list(self._load().values())
+
+    def client(self, name: str) -> TelegramClient:
+        """
+        Return the client of bot `name`; raises KeyError for a bot that is not registered.
+        """
+        bot = self._require(name)
+        client = self._clients.get(name)
+        if client is None or client.token != bot.token:
+            client = self._clients[name] = TelegramClient(token=bot.token)
+        return client
+
+    def async_client(self, name: str) -> AsyncTelegramClient:
+        bot = self._require(name)
+        client = self._async_clients.get(name)
+        if client is None or client.token != bot.token:
+            client = self._async_clients[name] = AsyncTelegramClient(token=bot.token)
+        return client
+
+    async def aload(self) -> None:
+        """
+        Re-read stale rows on a worker thread; async views call this before looking bots up.
+        """
+        if not self._is_fresh(time.monotonic()):
+            await sync_to_async(self._load)()
+
+    def reload(self) -> None:
+        self._loaded_at = None
+
+    def _require(self, name: str) -> BotConfig:
+        bot = self.get(name)
+        if bot is None:
+            raise KeyError(f"Unknown bot {name!r}")
+        return bot
+
+    def _load(self) -> Dict[str, BotConfig]:
+        now = time.monotonic()
+        if self._is_fresh(now) or (self._loaded_at is not None and _on_event_loop()):
+            # The ORM is off limits on the event loop: serve the last rows until aload() refreshes them.
+            return self._bots
+        with self._lock:
+            if not self._is_fresh(now):
+                self._bots = self._read()
+                self._loaded_at = now
+        return self._bots
+
+    def _is_fresh(self, now: float) -> bool:
+        return self._loaded_at is not None and now - self._loaded_at < self.ttl
+
+    @staticmethod
+    def _read() -> Dict[str, BotConfig]:
+        bots = {
+            name: BotConfig(name, config["token"], config.get("secret", ""))
+            for name, config in settings.TELEGRAM_BOTS.items()
+        }
+        try:
+            rows = Bot.objects.filter(is_active=True).values_list("name", "token", "webhook_secret")
+            for name, token, secret in rows:
+                bots[name] = BotConfig(name, token, secret)
+        except DatabaseError:
+            # Not migrated yet, or the database is down: keep serving the configured bots.
+            logger.exception("Could not load bots from the database; using TELEGRAM_BOTS only.")
+        return bots
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+bots = BotRegistry(settings.TELEGRAM_BOTS_RELOAD_INTERVAL)
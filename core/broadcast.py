@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from .dispatch import TokenBucket
+from .telegram import RetryAfter, TelegramClient, TelegramError
+
+logger = logging.getLogger(__name__)
+
+DELIVERED, BLOCKED, FAILED = "delivered", "blocked", "failed"
+
+
+def read_chat_ids(path: str) -> Iterator[str]:
+    """
+    Stream chat ids from a text file with one id per line, skipping blank lines and `#` comments.
+    """
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            chat_id = line.split("#", 1)[0].strip()
+            if chat_id:
+                yield chat_id
+
+
+def fingerprint(source: str, text: str) -> str:
+    return hashlib.sha256(f"{source}\0{text}".encode()).hexdigest()[:16]
+
+
+class Checkpoint:
+    """
+    JSON file recording how far into the chat list a broadcast got, written atomically.
+
+    `position` is a low watermark: every chat before it has been handled, so a resumed run skips
+    exactly those and at most re-sends the few that were in flight when the previous run died.
+    """
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+
+    def load(self) -> Tuple[int, Dict[str, int], bool]:
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except FileNotFoundError:
+            return 0, {}, False
+        if data.get("fingerprint") != self.fingerprint:
+            raise ValueError(f"{self.path} belongs to a different broadcast.")
+        return data["position"], data["stats"], data.get("finished", False)
+
+    def save(self, position: int, stats: Dict[str, int], finished: bool = False) -> None:
+        data = {"fingerprint": self.fingerprint, "position": position, "stats": stats, "finished": finished}
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as handle:
+            json.dump(data, handle)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+class Broadcaster:
+    """
+    Send one message to a stream of chats from a pool of threads, paced to `rate` messages per second.
+
+    A 429 pauses every sender for the `retry_after` Telegram asks for, and the chat is retried.
+    Chats that blocked the bot (403) are counted as blocked; other errors are retried with backoff
+    up to `max_attempts` times and then counted as failed.
+    """
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        text: str,
+        *,
+        parse_mode: Optional[str] = None,
+        rate: float = 30.0,
+        workers: int = 32,
+        max_attempts: int = 5,
+        backoff: float = 1.0,
+        checkpoint: Optional[Checkpoint] = None,
+        checkpoint_every: float = 1.0,
+        on_result: Optional[Callable[[str, str, str], None]] = None,
+    ):
+        self.client = client
+        self.text = text
+        self.parse_mode = parse_mode
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.on_result = on_result
+        self.stats: Counter = Counter()
+        self.stop_event = threading.Event()
+        self._bucket = TokenBucket(rate) if rate else None
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._position = 0
+        self._finished_ahead: set = set()
+        self._saved_at = time.monotonic()
+
+    def run(self, chat_ids: Iterable[Any], start: int = 0, stats: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Broadcast to `chat_ids`, skipping the first `start` of them, and return the outcome counts.
+        """
+        self.stats.update(stats or {})
+        self._position = start
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="telegram-broadcast") as executor:
+            for index, chat_id in enumerate(islice(chat_ids, start, None), start):
+                if self.stop_event.is_set():
+                    break
+                slots.acquire()
+                future = executor.submit(self._deliver, index, chat_id)
+                future.add_done_callback(lambda _: slots.release())
+
+        if self.checkpoint:
+            self.checkpoint.save(self._position, dict(self.stats), finished=not self.stop_event.is_set())
+        return dict(self.stats)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def _deliver(self, index: int, chat_id: Any) -> None:
+        try:
+            outcome, error = self._send(chat_id)
+        except Exception as exc:
+            logger.exception("Broadcast to chat %s crashed", chat_id)
+            outcome, error = FAILED, str(exc)
+        if outcome is None:
+            return
+        if self.on_result:
+            self.on_result(str(chat_id), outcome, error)
+        self._complete(index, outcome)
+
+    def _send(self, chat_id: Any) -> Tuple[Optional[str], str]:
+        attempts = 0
+        while True:
+            self._throttle()
+            payload = {"chat_id": chat_id, "text": self.text}
+            if self.parse_mode:
+                payload["parse_mode"] = self.parse_mode
+            try:
+                self.client.request("sendMessage", payload)
+                return DELIVERED, ""
+            except RetryAfter as exc:
+                with self._lock:
+                    self._paused_until = max(self._paused_until, time.monotonic() + exc.retry_after)
+                logger.warning("Broadcast throttled; pausing for %ss", exc.retry_after)
+                continue
+            except TelegramError as exc:
+                data = exc.data if isinstance(exc.data, dict) else {}
+                migrated = (data.get("parameters") or {}).get("migrate_to_chat_id")
+                if migrated:
+                    # The group became a supergroup; Telegram tells us its new id.
+                    chat_id = migrated
+                    continue
+                if data.get("error_code") == 403:
+                    return BLOCKED, str(exc)
+                if data.get("error_code") == 400:
+                    return FAILED, str(exc)
+                error = str(exc)
+            except Exception as exc:
+                error = str(exc) or type(exc).__name__
+
+            attempts += 1
+            if attempts >= self.max_attempts:
+                return FAILED, error
+            if self.stop_event.wait(self.backoff * 2 ** (attempts - 1)):
+                # Stopping: leave the chat unhandled so the checkpoint keeps it for the next run.
+                return None, error
+
+    def _throttle(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    wait = self._bucket.take(now) if self._bucket else 0
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _complete(self, index: int, outcome: str) -> None:
+        with self._lock:
+            self.stats[outcome] += 1
+            self._finished_ahead.add(index)
+            while self._position in self._finished_ahead:
+                self._finished_ahead.remove(self._position)
+                self._position += 1
+            if self.checkpoint and time.monotonic() - self._saved_at >= self.checkpoint_every:
+                self.checkpoint.save(self._position, dict(self.stats))
+                self._saved_at = time.monotonic()
@@ -0,0 +1,175 @@
+"""
+Capture of raw webhook traffic to JSONL files, and reading it back for `manage.py replay`.
+
+Each captured request is one line: {"time": ..., "bot": ..., "headers": {...}, "body": "<raw body>"}. Lines
+are queued by the request thread and written in batches by one background thread per process, to
+webhook-<timestamp>-<pid>-<serial>.jsonl files that rotate once they reach `max_bytes`.
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def wsgi_headers(environ: Mapping[str, Any]) -> Dict[str, str]:
+    """
+    The request headers of a WSGI environ, named the way Django's request.headers names them.
+    """
+    headers = {
+        key[5:].replace("_", "-").title(): value for key, value in environ.items() if key.startswith("HTTP_")
+    }
+    for key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+        if environ.get(key):
+            headers[key.replace("_", "-").title()] = environ[key]
+    return headers
+
+
+class WebhookCapture:
+    """
+    Appends webhook requests to rotating JSONL files in `directory` without blocking the request thread.
+
+    Lines wait in a queue of `max_queue` entries and are written every `flush_interval` seconds; when the
+    queue is full, requests are dropped from the capture and counted.
+    """
+
+    def __init__(
+        self, directory: str, *, max_bytes: int = 100 * 1024 * 1024, max_queue: int = 10000, flush_interval: float = 1
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._file = None
+        self._written = 0
+        self._serial = 0
+
+    def record(self, body: bytes, headers: Mapping[str, str], bot: Optional[str] = None) -> None:
+        self._ensure_started()
+        # The secret is the only thing that authenticates Telegram, so it never reaches the disk.
+        headers = {
+            name: "<redacted>" if name.lower() == SECRET_HEADER.lower() else value for name, value in headers.items()
+        }
+        line = json.dumps(
+            {"time": time.time(), "bot": bot, "headers": headers, "body": body.decode("utf-8", "replace")},
+            ensure_ascii=False,
+        )
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("telegram_capture_dropped_total")
+
+    def close(self) -> None:
+        """
+        Write out the queued lines and stop the writer thread.
+        """
+        with self._lock:
+            if self._writer is None or self._pid != os.getpid():
+                return
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork, so a pre-forked worker starts its own writer and files.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is None:
+                atexit.register(self.close)
+            self._queue = queue.Queue(self.max_queue)
+            self._file = None
+            self._writer = threading.Thread(target=self._run, name="telegram-capture", daemon=True)
+            self._writer.start()
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                lines = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(lines) < 1000:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in lines:
+                stopping = True
+                lines = [line for line in lines if line is not None]
+            try:
+                self._write(lines)
+            except OSError:
+                logger.exception("Could not write %s captured requests to %s", len(lines), self.directory)
+        if self._file is not None:
+            self._file.close()
+
+    def _write(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        if self._file is None or self._written >= self.max_bytes:
+            self._rotate()
+        data = "".join(f"{line}\n" for line in lines).encode()
+        self._file.write(data)
+        self._file.flush()
+        self._written += len(data)
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # The serial keeps the files of one second in the order they were written when sorted by name.
+        self._serial += 1
+        path = self.directory / f"webhook-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self._serial:04d}.jsonl"
+        self._file = path.open("ab", buffering=1024 * 1024)
+        self._written = 0
+        logger.info("Capturing webhook requests to %s", path)
+
+
+def capture_files(paths: Iterable[str]) -> List[Path]:
+    """
+    Expand files and directories of captures into the files to read, oldest first within a directory.
+    """
+    files: List[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(item for item in path.iterdir() if item.name.endswith((".jsonl", ".jsonl.gz"))))
+        else:
+            files.append(path)
+    return files
+
+
+def read_captures(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the captured requests of files and directories, one decoded line at a time; gzipped files work too.
+    """
+    for path in capture_files(paths):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as lines:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping unreadable line %s of %s", number, path)
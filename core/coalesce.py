@@ -0,0 +1,151 @@
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from .metrics import metrics
+from .router import Call
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[List[Call], Optional[str]], bool]
+
+
+class Coalescer:
+    """
+    Holds the reply to a chat's latest message so a burst of messages and edits gets one reply.
+
+    Each new reply for a chat replaces the held one and pushes its delivery back to `window` seconds after
+    the newest update, but never later than `max_delay` seconds after the first held one. At most
+    `max_chats` chats are held; past that, replies go out right away. A reply that `deliver` cannot queue
+    is held again for another window.
+
+    `flush_deliver` sends what is still held at interpreter exit, when thread pools no longer take work;
+    it defaults to `deliver`.
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        *,
+        window: float = 0.0,
+        max_delay: float = 5.0,
+        max_chats: int = 10000,
+        workers: int = 4,
+        flush_deliver: Optional[Deliver] = None,
+    ):
+        self.deliver = deliver
+        self.flush_deliver = flush_deliver or deliver
+        self.window = window
+        self.max_delay = max(max_delay, window)
+        self.max_chats = max_chats
+        self.workers = workers
+        self._cond = threading.Condition()
+        # chat -> [first held at, due at, calls, bot, sequence of the heap entry that is current]
+        self._held: Dict[Hashable, list] = {}
+        self._due: List[Tuple[float, int, Hashable]] = []
+        self._sequence = itertools.count()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._scheduler: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._held)
+
+    def offer(self, chat: Hashable, calls: List[Call], bot: Optional[str] = None) -> bool:
+        """
+        Hold `calls` as the reply for `chat`; returns False when they should be delivered right away instead.
+        """
+        if not self.enabled:
+            return False
+        self._ensure_started()
+        now = time.monotonic()
+        with self._cond:
+            held = self._held.get(chat)
+            if held is None:
+                if len(self._held) >= self.max_chats:
+                    metrics.inc("telegram_coalesce_overflow_total")
+                    return False
+                held = self._held[chat] = [now, 0.0, calls, bot, 0]
+            else:
+                held[2] = calls
+                metrics.inc("telegram_coalesced_replies_total")
+            held[1] = min(now + self.window, held[0] + self.max_delay)
+            held[4] = next(self._sequence)
+            heapq.heappush(self._due, (held[1], held[4], chat))
+            self._cond.notify()
+        return True
+
+    def flush(self) -> None:
+        """
+        Deliver every held reply now through `flush_deliver`, on the calling thread; used at shutdown.
+        """
+        with self._cond:
+            held, self._held, self._due = self._held, {}, []
+            self._cond.notify()
+        for chat, (_, _, calls, bot, _) in held.items():
+            self._send(chat, calls, bot, final=True)
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork, so a pre-forked worker starts its own scheduler on first use.
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._held, self._due = {}, []
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="telegram-coalesce")
+            self._scheduler = threading.Thread(target=self._run, name="telegram-coalesce-scheduler", daemon=True)
+            self._scheduler.start()
+            if self._pid is None:
+                atexit.register(self.flush)
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        with self._cond:
+            while True:
+                if not self._due:
+                    self._cond.wait()
+                    continue
+                due_at, sequence, chat = self._due[0]
+                now = time.monotonic()
+                if due_at > now:
+                    self._cond.wait(due_at - now)
+                    continue
+                heapq.heappop(self._due)
+                held = self._held.get(chat)
+                if held is None or held[4] != sequence:
+                    # A newer reply for the chat moved its delivery later, or it was flushed already.
+                    continue
+                del self._held[chat]
+                self._executor.submit(self._send, chat, held[2], held[3])
+
+    def _send(self, chat: Hashable, calls: List[Call], bot: Optional[str], final: bool = False) -> None:
+        try:
+            if (self.flush_deliver if final else self.deliver)(calls, bot):
+                return
+        except Exception:
+            logger.exception("Delivering the coalesced reply to chat %s failed", chat)
+            return
+        if final:
+            logger.error("Could not deliver the coalesced reply to chat %s at shutdown; dropping it.", chat)
+            return
+        logger.warning("Could not queue the coalesced reply to chat %s; retrying in %ss.", chat, self.window)
+        with self._cond:
+            if chat in self._held:
+                # A newer reply for the chat is held already and replaces this one.
+                return
+            now = time.monotonic()
+            held = self._held[chat] = [now, now + self.window, calls, bot, next(self._sequence)]
+            heapq.heappush(self._due, (held[1], held[4], chat))
+            self._cond.notify()
@@ -0,0 +1,121 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryUpdateCache:
+    """
+    Per-process LRU of recently seen update ids, bounded by `size` entries and `ttl` seconds.
+    """
+
+    def __init__(self, size: int = 10000, ttl: float = 3600):
+        self.size = size
+        self.ttl = ttl
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, update_id: int) -> bool:
+        """
+        Record `update_id`, returning True if it was already recorded within the TTL.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if update_id in self._seen:
+                return True
+            self._seen[update_id] = now
+            if len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+            return False
+
+    def forget(self, update_id: int) -> None:
+        with self._lock:
+            self._seen.pop(update_id, None)
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.ttl
+        while self._seen:
+            update_id, seen_at = next(iter(self._seen.items()))
+            if seen_at > cutoff:
+                return
+            del self._seen[update_id]
+
+
+class SQLiteUpdateCache:
+    """
+    Update id window shared by every worker process through a WAL-mode SQLite file.
+    """
+
+    prune_every = 1000
+
+    def __init__(self, path: str, size: int = 10000, ttl: float = 3600):
+        self.path = str(path)
+        self.size = size
+        self.ttl = ttl
+        self._local = threading.local()
+        self._inserts = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS seen_updates (update_id INTEGER PRIMARY KEY, seen_at REAL NOT NULL)"
+            )
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def seen(self, update_id: int) -> bool:
+        now = time.time()
+        # Inserts a new id, or refreshes one whose TTL lapsed; rowcount stays 0 only for a live duplicate.
+        cursor = self._connection().execute(
+            "INSERT INTO seen_updates (update_id, seen_at) VALUES (?, ?) "
+            "ON CONFLICT(update_id) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_at < ?",
+            (update_id, now, now - self.ttl),
+        )
+        if cursor.rowcount == 0:
+            return True
+        self._inserts += 1
+        if self._inserts % self.prune_every == 0:
+            self._prune(now)
+        return False
+
+    def forget(self, update_id: int) -> None:
+        self._connection().execute("DELETE FROM seen_updates WHERE update_id = ?", (update_id,))
+
+    def _prune(self, now: float) -> None:
+        connection = self._connection()
+        connection.execute("DELETE FROM seen_updates WHERE seen_at < ?", (now - self.ttl,))
+        connection.execute(
+            "DELETE FROM seen_updates WHERE update_id <= "
+            "(SELECT update_id FROM seen_updates ORDER BY update_id DESC LIMIT 1 OFFSET ?)",
+            (self.size,),
+        )
+
+
+def build_update_cache(bot: str = ""):
+    """
+    Build the cache of the TELEGRAM_BOT_TOKEN bot, or of registered bot `bot`: update ids are only
+    unique per bot, so every bot keeps its own window.
+    """
+    backend = settings.TELEGRAM_DEDUP_BACKEND
+    if not backend:
+        return None
+    if backend == "memory":
+        return MemoryUpdateCache(settings.TELEGRAM_DEDUP_SIZE, settings.TELEGRAM_DEDUP_TTL)
+    if backend == "sqlite":
+        path = settings.TELEGRAM_DEDUP_PATH
+        if bot:
+            root, extension = os.path.splitext(path)
+            path = f"{root}.{bot}{extension}"
+        return SQLiteUpdateCache(path, settings.TELEGRAM_DEDUP_SIZE, settings.TELEGRAM_DEDUP_TTL)
+    raise ValueError(f"Unknown TELEGRAM_DEDUP_BACKEND {backend!r}; expected 'memory', 'sqlite' or ''.")
@@ -0,0 +1,232 @@
+import atexit
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from .log import log_context
+from .telegram import CircuitOpen, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# method, payload, the client to send it with (None for the dispatcher's own) and how often an open
+# circuit has deferred it.
+Queued = Tuple[str, Dict[str, Any], Any, int]
+
+
+class TokenBucket:
+    """
+    Refill `rate` tokens per second up to `capacity`; `take` returns how long to wait for the next token.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class Dispatcher:
+    """
+    Queue outbound Bot API calls and send them from a pool of background threads.
+
+    Calls are grouped per chat and scheduled round-robin across chats, paced by a global token bucket
+    (bot-wide limit) and a minimum interval per chat. A chat never has more than one call in flight, so
+    replies keep their order. When Telegram answers 429 the call goes back to the head of its chat queue
+    and all sending pauses for `retry_after` seconds.
+
+    A call whose method has an open circuit (see core.resilience) holds back only its own chat until the
+    next probe, and is dropped after `circuit_retries` such deferrals.
+    """
+
+    def __init__(
+        self,
+        client,
+        *,
+        workers: int = 4,
+        max_queue: int = 1000,
+        flush_timeout: float = 5.0,
+        rate: float = 30.0,
+        chat_rate: float = 1.0,
+        circuit_retries: int = 5,
+    ):
+        self.client = client
+        self.circuit_retries = circuit_retries
+        self.workers = workers
+        self.max_queue = max_queue
+        self.flush_timeout = flush_timeout
+        self.chat_interval = 1.0 / chat_rate if chat_rate else 0.0
+        self._bucket = TokenBucket(rate) if rate else None
+        self._cond = threading.Condition()
+        self._chats: Dict[Hashable, Deque[Queued]] = {}
+        self._ready: List[Tuple[float, int, Hashable]] = []
+        self._next_allowed: Dict[Hashable, float] = {}
+        self._in_flight: Set[Hashable] = set()
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._scheduler: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._closed = False
+
+    @property
+    def depth(self) -> int:
+        return self._pending
+
+    def submit(self, method: str, payload: Dict[str, Any], client=None) -> bool:
+        """
+        Enqueue a call without blocking; returns False when the queue is full or shut down.
+
+        `client` sends the call on behalf of another bot than the dispatcher's own; its chats are paced
+        apart from the same chat ids of other bots.
+        """
+        if self._closed:
+            return False
+        self._ensure_started()
+        chat = payload.get("chat_id")
+        with self._cond:
+            if self._pending >= self.max_queue:
+                logger.warning("Dispatch queue is full (%s pending); rejecting %s.", self._pending, method)
+                return False
+            if chat is None:
+                # Calls outside a chat, like inline query answers, are neither ordered nor paced together.
+                chat = ("no chat", next(self._sequence))
+            elif client is not None:
+                chat = (client.token, chat)
+            queue = self._chats.get(chat)
+            if queue is None:
+                queue = self._chats[chat] = deque()
+            queue.append((method, payload, client, 0))
+            self._pending += 1
+            if len(queue) == 1 and chat not in self._in_flight:
+                self._schedule(chat, time.monotonic())
+            self._cond.notify()
+        return True
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop accepting calls and wait up to `timeout` seconds for pending calls to be sent.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            running = self._pid == os.getpid()
+            deadline = time.monotonic() + (self.flush_timeout if timeout is None else timeout)
+            while running and (self._pending or self._in_flight):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._cond.notify_all()
+
+        if running:
+            self._scheduler.join(max(deadline - time.monotonic(), 0))
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._pending:
+            logger.error("Dispatcher shut down with %s outbound calls still pending.", self._pending)
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork, so a pre-forked worker starts its own pool on first use.
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._executor = ThreadPoolExecutor(max(self.workers, 1), thread_name_prefix="telegram-dispatch")
+            self._scheduler = threading.Thread(target=self._run, name="telegram-scheduler", daemon=True)
+            self._scheduler.start()
+            if self._pid is None:
+                atexit.register(self.shutdown)
+            self._pid = os.getpid()
+
+    def _schedule(self, chat: Hashable, now: float) -> None:
+        # Called with the lock held for a chat that has queued calls and nothing in flight.
+        heapq.heappush(self._ready, (max(now, self._next_allowed.get(chat, 0.0)), next(self._sequence), chat))
+
+    def _run(self) -> None:
+        with self._cond:
+            while True:
+                if self._closed and not (self._pending or self._in_flight):
+                    return
+                if not self._ready:
+                    self._cond.wait()
+                    continue
+
+                now = time.monotonic()
+                ready_at = max(self._ready[0][0], self._paused_until)
+                if ready_at > now:
+                    self._cond.wait(ready_at - now)
+                    continue
+                if self._bucket and (delay := self._bucket.take(now)):
+                    self._cond.wait(delay)
+                    continue
+
+                _, _, chat = heapq.heappop(self._ready)
+                call = self._chats[chat].popleft()
+                self._pending -= 1
+                self._in_flight.add(chat)
+                self._executor.submit(self._deliver, chat, call)
+
+    def _deliver(self, chat: Hashable, call: Queued) -> None:
+        method, payload, client, deferrals = call
+        retry_after = circuit_wait = None
+        try:
+            with log_context(chat_id=payload.get("chat_id")):
+                (client or self.client).request(method, payload)
+        except CircuitOpen as exc:
+            if deferrals < self.circuit_retries:
+                circuit_wait = exc.retry_after
+                logger.warning("%s to chat %s waits %.1fs for its circuit to close", method, chat, circuit_wait)
+            else:
+                logger.error("Dropping %s to chat %s: its circuit stayed open for %s retries", method, chat, deferrals)
+        except RetryAfter as exc:
+            retry_after = exc.retry_after
+            logger.warning("Telegram throttled %s to chat %s; retrying in %ss", method, chat, retry_after)
+        except Exception:
+            logger.exception("Dispatched %s call to chat %s failed", method, chat)
+
+        with self._cond:
+            now = time.monotonic()
+            queue = self._chats[chat]
+            if retry_after is not None:
+                queue.appendleft(call)
+                self._pending += 1
+                self._paused_until = max(self._paused_until, now + retry_after)
+                self._next_allowed[chat] = now + retry_after
+            elif circuit_wait is not None:
+                # Only this method is failing: other chats, and other methods, keep going out.
+                queue.appendleft((method, payload, client, deferrals + 1))
+                self._pending += 1
+                self._next_allowed[chat] = now + circuit_wait
+            else:
+                self._next_allowed[chat] = now + self.chat_interval
+            self._in_flight.discard(chat)
+
+            if queue:
+                self._schedule(chat, now)
+            else:
+                del self._chats[chat]
+            self._prune(now)
+            self._cond.notify_all()
+
+    def _prune(self, now: float) -> None:
+        # Forget pacing state for idle chats whose interval has elapsed so memory tracks active chats only.
+        if len(self._next_allowed) > 2 * len(self._chats) + 1024:
+            self._next_allowed = {
+                chat: allowed for chat, allowed in self._next_allowed.items() if allowed > now or chat in self._chats
+            }
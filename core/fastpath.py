@@ -0,0 +1,89 @@
+import json
+import logging
+from http import HTTPStatus
+from typing import Iterable, Optional, Tuple
+
+from django.conf import settings
+
+from .capture import wsgi_headers
+from .helpers import Payload, peek_update
+from .metrics import metrics
+from .resilience import deadline
+from .webhook import WebhookHandler, webhook_limiter
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATHS = ("/telegram/webhook/", "/telegram/webhook")
+
+
+class WebhookFastPath:
+    """
+    WSGI wrapper that answers webhook POSTs directly, skipping Django's middleware stack, URL
+    resolution and DRF content negotiation. Every other request is passed to `application`.
+
+    The secret check, duplicate detection, JSON validation and status codes match core.views.WebhookView.
+    """
+
+    def __init__(self, application, paths: Iterable[str] = WEBHOOK_PATHS):
+        self.application = application
+        self.paths = frozenset(paths)
+
+    def __call__(self, environ, start_response):
+        if environ.get("REQUEST_METHOD") != "POST" or environ.get("PATH_INFO") not in self.paths:
+            return self.application(environ, start_response)
+
+        with metrics.timer("telegram_webhook_seconds"), deadline(settings.TELEGRAM_WEBHOOK_DEADLINE):
+            status_code, body = self.handle(environ)
+        content = json.dumps(body).encode() if body is not None else b""
+        headers = [("Content-Length", str(len(content)))]
+        if body is not None:
+            headers.append(("Content-Type", "application/json"))
+        start_response(f"{status_code} {HTTPStatus(status_code).phrase}", headers)
+        return [content]
+
+    def handle(self, environ) -> Tuple[int, Optional[Payload]]:
+        if not WebhookHandler._secret_matches(environ.get("HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN", "")):
+            logger.warning("Rejected webhook call due to missing/invalid secret.")
+            return HTTPStatus.FORBIDDEN, None
+
+        raw = self._read_body(environ)
+        WebhookHandler._capture(raw, wsgi_headers(environ))
+        update_id, update_type = peek_update(raw)
+        WebhookHandler._count_update(update_type)
+        if WebhookHandler._is_filtered(update_type):
+            return HTTPStatus.OK, None
+
+        with webhook_limiter.admit() as admitted:
+            if not admitted:
+                return HTTPStatus.SERVICE_UNAVAILABLE, None
+            if WebhookHandler._is_duplicate(update_id):
+                return HTTPStatus.OK, None
+
+            try:
+                status_code, body = self._handle_update(raw)
+            except Exception:
+                WebhookHandler._forget_update(update_id)
+                raise
+            if status_code >= 500:
+                WebhookHandler._forget_update(update_id)
+            return status_code, body
+
+    @staticmethod
+    def _handle_update(raw: bytes) -> Tuple[int, Optional[Payload]]:
+        try:
+            with metrics.timer("telegram_parse_seconds"):
+                payload: Payload = json.loads(raw) if raw else {}
+        except ValueError:
+            logger.warning("Received invalid JSON payload from Telegram.")
+            return HTTPStatus.BAD_REQUEST, None
+
+        logger.debug("Received Telegram payload: %s", payload)
+        return WebhookHandler.answer_update(payload or {})
+
+    @staticmethod
+    def _read_body(environ) -> bytes:
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        return environ["wsgi.input"].read(length) if length > 0 else b""
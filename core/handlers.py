@@ -0,0 +1,37 @@
+import logging
+import random
+
+from django.conf import settings
+
+from .helpers import extract_sender_name, get_chat_id, pick_greeting
+from .inline import InlineAnswers
+from .media import media_call
+from .router import Context, Reply, Router
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+inline_answers = InlineAnswers(settings.TELEGRAM_INLINE_CACHE_SIZE)
+
+
+@router.on("message", "edited_message")
+def greet(context: Context) -> Reply:
+    """
+    Answer any message with a greeting in a random language, followed by one of TELEGRAM_GREETING_MEDIA.
+    """
+    chat_id = get_chat_id(context.event)
+    if chat_id is None:
+        logger.warning("Received message without chat id: %s", context.event)
+        return None
+    greeting = "sendMessage", {"chat_id": chat_id, "text": pick_greeting(extract_sender_name(context.event))}
+    if not settings.TELEGRAM_GREETING_MEDIA:
+        return greeting
+    return [greeting, media_call(chat_id, random.choice(settings.TELEGRAM_GREETING_MEDIA))]
+
+
+@router.on("inline_query")
+def greet_inline(context: Context) -> Reply:
+    """
+    Offer a greeting in every language for the name typed after the bot's username.
+    """
+    return inline_answers.answer(context.event)
@@ -1,8 +1,42 @@
 import random
-from typing import Optional
+import re
+from typing import Any, Dict, Optional, Tuple
 
 GREETINGS = ("Hello", "Hola", "Bonjour")
 
+Payload = Dict[str, Any]
+Message = Dict[str, Any]
+
+# Telegram serialises update_id first and the update type second, so an anchored match on the first
+# bytes of the body identifies the update without decoding the rest of the payload.
+_UPDATE_HEAD = re.compile(rb'\s*\{\s*"update_id"\s*:\s*(\d+)(?:\s*,\s*"([a-z_]+)")?')
+
+
+def peek_update(body: bytes) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Return the update id and update type from a raw update body, or None for whichever is not found.
+    """
+    match = _UPDATE_HEAD.match(body, 0, 128)
+    if not match:
+        return None, None
+    update_type = match.group(2)
+    return int(match.group(1)), update_type.decode() if update_type else None
+
+
+def extract_message(payload: Payload) -> Optional[Message]:
+    """
+    Return the message (or edited message) carried by a Telegram update, if any.
+    """
+    if not isinstance(payload, dict):
+        return None
+    message = payload.get("message") or payload.get("edited_message")
+    return message if isinstance(message, dict) else None
+
+
+def get_chat_id(message: Message) -> Optional[int]:
+    chat = message.get("chat")
+    return chat.get("id") if isinstance(chat, dict) else None
+
 
 def extract_sender_name(message: Optional[dict]) -> str:
     """
@@ -0,0 +1,129 @@
+"""
+Inline mode: typing `@bot Alice` offers "Hello, Alice!", "Hola, Alice!" and "Bonjour, Alice!" to send.
+
+Telegram sends an inline query on every keystroke, so results are built once per normalized query and language
+and kept in an LRU. The results for every prefix of GREETINGS (`@bot h`, `@bot ho`...) are built up front and
+never evicted.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .helpers import GREETINGS, Payload
+from .metrics import metrics
+from .router import Call
+
+# Language code of each greeting; a user's own language is offered first.
+LANGUAGES = {"en": "Hello", "es": "Hola", "fr": "Bonjour"}
+MAX_QUERY_LENGTH = 64
+
+Results = Tuple[Dict[str, Any], ...]
+
+
+def normalize_query(text: str) -> str:
+    """
+    Collapse whitespace and lowercase a leading greeting prefix, so `  HOL  Ana` and `hol Ana` share results.
+    """
+    words = " ".join(text.split())[:MAX_QUERY_LENGTH].split(" ", 1)
+    if _matching_greetings(words[0]):
+        words[0] = words[0].casefold()
+    return " ".join(words)
+
+
+def normalize_language(code: Optional[str]) -> str:
+    """
+    Reduce an IETF language tag to one of LANGUAGES, or "" when no greeting is in that language.
+    """
+    language = (code or "").split("-", 1)[0].casefold()
+    return language if language in LANGUAGES else ""
+
+
+def build_results(query: str, language: str = "") -> Results:
+    """
+    Build the articles for a normalized query: a greeting prefix picks greetings, the rest is the name.
+    """
+    first, _, rest = query.partition(" ")
+    greetings = _matching_greetings(first)
+    name = rest if greetings else query
+    if not greetings:
+        greetings = GREETINGS
+    if language and LANGUAGES[language] in greetings:
+        own = LANGUAGES[language]
+        greetings = (own, *(greeting for greeting in greetings if greeting != own))
+    results = []
+    for greeting in greetings:
+        text = f"{greeting}, {name or 'there'}!"
+        results.append(
+            {
+                "type": "article",
+                "id": greeting.casefold(),
+                "title": text,
+                "input_message_content": {"message_text": text},
+            }
+        )
+    return tuple(results)
+
+
+def _matching_greetings(word: str) -> Tuple[str, ...]:
+    if not word:
+        return ()
+    word = word.casefold()
+    return tuple(greeting for greeting in GREETINGS if greeting.casefold().startswith(word))
+
+
+class InlineAnswers:
+    """
+    Answers inline queries from precomputed results and an LRU of `size` built ones, keyed on query and language.
+
+    Results depend on the language as well as the query, so answers are marked `is_personal` and Telegram
+    reuses one for `cache_time` seconds (TELEGRAM_INLINE_CACHE_TIME when None) for the same user only; users
+    who share a language and query share our cached entry.
+    """
+
+    def __init__(self, size: int = 1000, cache_time: Optional[int] = None):
+        self.size = size
+        self.cache_time = cache_time
+        self._lock = threading.Lock()
+        self._built: "OrderedDict[Tuple[str, str], Results]" = OrderedDict()
+        self._hot: Dict[Tuple[str, str], Results] = {}
+        prefixes = {""} | {greeting.casefold()[:end] for greeting in GREETINGS for end in range(1, len(greeting) + 1)}
+        for language in ("", *LANGUAGES):
+            for prefix in prefixes:
+                self._hot[prefix, language] = build_results(prefix, language)
+
+    def answer(self, inline_query: Payload) -> Call:
+        """
+        Return the answerInlineQuery call for an inline_query update.
+        """
+        sender = inline_query.get("from") or {}
+        results = self.results(inline_query.get("query") or "", sender.get("language_code"))
+        return "answerInlineQuery", {
+            "inline_query_id": inline_query.get("id"),
+            "results": list(results),
+            "cache_time": settings.TELEGRAM_INLINE_CACHE_TIME if self.cache_time is None else self.cache_time,
+            "is_personal": True,
+        }
+
+    def results(self, query: str, language: Optional[str] = None) -> Results:
+        key = normalize_query(query), normalize_language(language)
+        results = self._hot.get(key)
+        if results is not None:
+            metrics.inc("telegram_inline_cache_total", (("result", "precomputed"),))
+            return results
+        with self._lock:
+            results = self._built.get(key)
+            if results is not None:
+                self._built.move_to_end(key)
+        if results is not None:
+            metrics.inc("telegram_inline_cache_total", (("result", "hit"),))
+            return results
+
+        metrics.inc("telegram_inline_cache_total", (("result", "miss"),))
+        results = build_results(*key)
+        with self._lock:
+            self._built[key] = results
+            if len(self._built) > self.size:
+                self._built.popitem(last=False)
+        return results
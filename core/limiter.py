@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for webhook requests; requests over the limit are shed instead of queued.
+
+    Every request that finishes within `target_latency` seconds while at least half the limit is in
+    use raises the limit by 1/limit, about one slot per round of requests. A slower request cuts the
+    limit by `backoff`, at most once per `target_latency` so a single slow round counts once. The
+    limit stays between `min_limit` and `max_limit`; `max_limit=0` admits everything.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        *,
+        min_limit: int = 1,
+        target_latency: float = 1.0,
+        backoff: float = 0.7,
+        log_interval: float = 10.0,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = max(1, min(min_limit, max_limit or min_limit))
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.log_interval = log_interval
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._cut_until = 0.0
+        self._shed_since_log = 0
+        self._logged_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_limit > 0
+
+    @contextmanager
+    def admit(self) -> Iterator[bool]:
+        """
+        Yield True while the request holds a slot, or False when it should be shed.
+        """
+        if not self.enabled:
+            yield True
+            return
+
+        with self._lock:
+            admitted = self.in_flight < int(self.limit)
+            if admitted:
+                self.in_flight += 1
+        if not admitted:
+            self._record_shed()
+            yield False
+            return
+
+        started = time.monotonic()
+        try:
+            yield True
+        finally:
+            self._release(time.monotonic() - started)
+
+    def _release(self, latency: float) -> None:
+        with self._lock:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if latency > self.target_latency:
+                now = time.monotonic()
+                if now < self._cut_until:
+                    return
+                self._cut_until = now + self.target_latency
+                before = int(self.limit)
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                if int(self.limit) < before:
+                    logger.warning(
+                        "Webhook took %.2fs (target %.2fs); concurrency limit lowered to %d with %d in flight",
+                        latency,
+                        self.target_latency,
+                        int(self.limit),
+                        in_flight,
+                    )
+            elif in_flight * 2 >= self.limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _record_shed(self) -> None:
+        metrics.inc("telegram_webhook_shed_total")
+        now = time.monotonic()
+        with self._lock:
+            self._shed_since_log += 1
+            if now - self._logged_at < self.log_interval:
+                return
+            shed, self._shed_since_log, self._logged_at = self._shed_since_log, 0, now
+            limit, in_flight = int(self.limit), self.in_flight
+        logger.warning("Shedding webhook load: %d requests refused, limit %d, %d in flight", shed, limit, in_flight)
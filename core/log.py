@@ -0,0 +1,241 @@
+"""
+Structured logging that never blocks a request thread on I/O.
+
+A record is prepared where it is logged: the update_id and chat_id of the update being handled are attached,
+logged payloads are redacted and cut short, and repeats of a warning or error beyond the rate limit are
+dropped. It then goes on a bounded queue, and one listener thread per process writes it out as a JSON line.
+When the queue is full, records are dropped and counted rather than waited for.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, Optional, Tuple
+
+from .metrics import metrics
+
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("core_log_context", default={})
+
+# Bot tokens show up in Bot API URLs, so they are masked in every message and traceback.
+TOKEN_PATTERN = re.compile(r"\d{5,}:[A-Za-z0-9_-]{30,}")
+REDACTED = "<redacted>"
+CONTEXT_FIELDS = ("update_id", "chat_id")
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """
+    Attach `fields` (those that are not None) to every record logged inside the block, in this thread or task.
+    """
+    token = _context.set({**_context.get(), **{key: value for key, value in fields.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def update_fields(update: Any) -> Dict[str, Any]:
+    """
+    Return the update_id and chat_id of a decoded update, for log_context.
+    """
+    if not isinstance(update, dict):
+        return {}
+    fields = {"update_id": update.get("update_id")}
+    for event in update.values():
+        if not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if isinstance(chat, dict):
+            fields["chat_id"] = chat.get("id")
+        break
+    return fields
+
+
+def redact(value: Any, keys: FrozenSet[str]) -> Any:
+    """
+    Copy a payload with the values of `keys` replaced, at any depth.
+    """
+    if isinstance(value, dict):
+        return {key: REDACTED if key in keys else redact(item, keys) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, keys) for item in value]
+    return value
+
+
+class RateLimiter:
+    """
+    Lets `rate` records with the same key through per `interval` seconds and counts the ones it holds back.
+    """
+
+    max_keys = 1024
+
+    def __init__(self, rate: int, interval: float):
+        self.rate = rate
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._windows: Dict[Tuple, list] = {}
+
+    def allow(self, key: Tuple, now: Optional[float] = None) -> Tuple[bool, int]:
+        """
+        Return whether a record may pass and, for the first one of a new window, how many were held back.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                if window is None and len(self._windows) >= self.max_keys:
+                    self._prune(now)
+                self._windows[key] = [now, 1, 0]
+                return True, suppressed
+            if window[1] < self.rate:
+                window[1] += 1
+                return True, 0
+            window[2] += 1
+            return False, 0
+
+    def _prune(self, now: float) -> None:
+        self._windows = {key: window for key, window in self._windows.items() if now - window[0] < self.interval}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, update and chat ids, and the traceback if any.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in (*CONTEXT_FIELDS, "suppressed"):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class QueueLogHandler(logging.handlers.QueueHandler):
+    """
+    Logging handler that prepares records on the caller's thread and writes them from a background thread.
+
+    Configured from settings.LOGGING; `rate` warnings or errors with the same message template pass per
+    `interval` seconds (0 lets all through), and messages are cut at `max_length` characters.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        *,
+        json_format: bool = True,
+        max_queue: int = 10000,
+        rate: int = 10,
+        interval: float = 60.0,
+        max_length: int = 2000,
+        redact_keys: Iterable[str] = (),
+    ):
+        super().__init__(queue.Queue(max_queue))
+        self.max_queue = max_queue
+        self.max_length = max_length
+        self.redact_keys = frozenset(redact_keys)
+        self.limiter = RateLimiter(rate, interval) if rate else None
+        self.target = logging.StreamHandler(stream)
+        self.target.setFormatter(JsonFormatter() if json_format else logging.Formatter())
+        self.dropped = 0
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not super().filter(record):
+            return False
+        if self.limiter is None or record.levelno < logging.WARNING:
+            return True
+        allowed, suppressed = self.limiter.allow((record.name, record.levelno, record.msg))
+        if allowed and suppressed:
+            record.suppressed = suppressed
+        return allowed
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._ensure_started()
+        super().emit(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render everything that refers to live objects now; the listener thread only serializes strings.
+        record = copy.copy(record)
+        for field, value in _context.get().items():
+            if getattr(record, field, None) is None:
+                setattr(record, field, value)
+        record.msg = self._clip(TOKEN_PATTERN.sub("<token>", self._message(record)))
+        record.args = None
+        if record.exc_info:
+            record.exc_text = TOKEN_PATTERN.sub("<token>", logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("log_records_dropped_total")
+
+    def close(self) -> None:
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                # Writes out whatever is still queued before the thread exits.
+                self._listener.stop()
+            self._listener = None
+        self.target.close()
+        super().close()
+
+    def _message(self, record: logging.LogRecord) -> str:
+        args = record.args
+        if not args:
+            return str(record.msg)
+        if isinstance(args, dict):
+            # logging unwraps a lone dict argument, which is either the payload or a %(name)s mapping.
+            mapping = "%(" in str(record.msg)
+            args = {key: self._render(arg) for key, arg in args.items()} if mapping else self._render(args)
+        else:
+            args = tuple(self._render(arg) for arg in args)
+        return str(record.msg) % args
+
+    def _render(self, arg: Any) -> Any:
+        # Payloads are logged as compact JSON with the configured keys hidden.
+        if isinstance(arg, (dict, list)):
+            return json.dumps(redact(arg, self.redact_keys), ensure_ascii=False, default=str)
+        return arg
+
+    def _clip(self, message: str) -> str:
+        if self.max_length and len(message) > self.max_length:
+            return f"{message[:self.max_length]}... ({len(message) - self.max_length} more characters)"
+        return message
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork, so a pre-forked worker starts its own listener on a fresh queue.
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is None:
+                atexit.register(self.close)
+            else:
+                self.queue = queue.Queue(self.max_queue)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target)
+            self._listener.start()
+            self._pid = os.getpid()
@@ -0,0 +1,37 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bots import bots
+from core.outbox import OutboxDrainer
+from core.telegram import TelegramClient
+
+
+class Command(BaseCommand):
+    help = "Send the replies stored in the outbox, retrying failed calls with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Rows sent per batch.")
+        parser.add_argument("--workers", type=int, default=8, help="Chats sent to concurrently within a batch.")
+        parser.add_argument("--max-attempts", type=int, default=10, help="Attempts before a row is marked failed.")
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_BOT_TOKEN and not bots.all():
+            raise CommandError("TELEGRAM_BOT_TOKEN is missing; set it or register bots before draining the outbox.")
+
+        drainer = OutboxDrainer(
+            TelegramClient(token=settings.TELEGRAM_BOT_TOKEN),
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            rate=settings.TELEGRAM_RATE_LIMIT,
+            chat_rate=settings.TELEGRAM_CHAT_RATE_LIMIT,
+            max_attempts=options["max_attempts"],
+            clients=bots.client,
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: drainer.stop())
+
+        self.stdout.write(self.style.SUCCESS("Draining the outbox; press Ctrl+C to stop."))
+        drainer.run()
+        self.stdout.write("Drainer stopped.")
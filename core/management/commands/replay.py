@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.capture import capture_files, read_captures
+from core.replay import Replayer, StubClient
+from core.webhook import WebhookHandler
+
+
+class Command(BaseCommand):
+    help = "Feed captured webhook requests through the webhook's handling again, in parallel, to measure it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Capture files (.jsonl or .jsonl.gz) or directories of them.")
+        parser.add_argument("--workers", type=int, default=8, help="Updates handled concurrently.")
+        parser.add_argument("--limit", type=int, help="Stop after this many requests.")
+        parser.add_argument(
+            "--stub",
+            action="store_true",
+            help="Answer Bot API calls with a stub instead of sending them; nothing reaches Telegram.",
+        )
+        parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds each stubbed call takes.")
+        parser.add_argument(
+            "--no-dedup", action="store_true", help="Handle every request, even updates already seen or replayed."
+        )
+
+    def handle(self, *args, **options):
+        missing = [path for path in capture_files(options["paths"]) if not path.is_file()]
+        if missing:
+            raise CommandError(f"No such capture file: {missing[0]}")
+
+        client = StubClient(options["stub_latency"]) if options["stub"] else None
+        dedup = not options["no_dedup"]
+        replayer = Replayer(
+            lambda payload, bot: WebhookHandler.replay_update(payload, bot, client=client, dedup=dedup),
+            workers=options["workers"],
+        )
+        stats = replayer.run(read_captures(options["paths"]), limit=options["limit"])
+
+        rate = stats.replayed / stats.seconds if stats.seconds else 0.0
+        self.stdout.write(
+            f"replayed={stats.replayed} failed={stats.failed} unreadable={stats.unreadable} "
+            f"in {stats.seconds:.2f}s ({rate:.0f} updates/s)"
+        )
+        if client is not None:
+            calls = " ".join(f"{method}={count}" for method, count in sorted(client.calls.items()))
+            self.stdout.write(f"stubbed calls: {calls or 'none'}")
+        self.stdout.write(self.style.SUCCESS("Replay finished."))
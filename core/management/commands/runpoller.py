@@ -0,0 +1,80 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.polling import UpdatePoller
+from core.sharding import ShardPool
+from core.telegram import TelegramClient
+from core.webhook import WebhookHandler
+
+
+class Command(BaseCommand):
+    help = "Receive updates by long-polling getUpdates instead of a webhook."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--timeout", type=int, default=50, help="Long-poll timeout in seconds.")
+        parser.add_argument("--limit", type=int, default=100, help="Maximum updates per getUpdates batch (1-100).")
+        parser.add_argument("--workers", type=int, default=8, help="Chats processed concurrently within a batch.")
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=0,
+            help="Handle updates in this many worker processes, sharded by chat (0 handles them in-process).",
+        )
+        parser.add_argument(
+            "--drain-timeout", type=float, default=30, help="Seconds shards get to finish queued updates on exit."
+        )
+        parser.add_argument(
+            "--delete-webhook",
+            action="store_true",
+            help="Remove a registered webhook first; Telegram refuses getUpdates while one is set.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_BOT_TOKEN:
+            raise CommandError("TELEGRAM_BOT_TOKEN is missing; set it before polling for updates.")
+
+        pool = None
+        handle = WebhookHandler.process_update
+        if options["processes"] > 0:
+            # Fork the shards first, before logging or a resize starts threads in this process.
+            pool = ShardPool(handle, options["processes"])
+            pool.start()
+            handle = pool.submit
+
+        client = TelegramClient(
+            token=settings.TELEGRAM_BOT_TOKEN,
+            timeout=(settings.TELEGRAM_CONNECT_TIMEOUT, options["timeout"] + settings.TELEGRAM_READ_TIMEOUT),
+        )
+        if options["delete_webhook"] and not client.delete_webhook():
+            if pool is not None:
+                pool.stop(0)
+            raise CommandError("Failed to delete the registered webhook.")
+
+        poller = UpdatePoller(
+            client,
+            handle,
+            workers=options["workers"],
+            timeout=options["timeout"],
+            limit=options["limit"],
+            allowed_updates=settings.TELEGRAM_ALLOWED_UPDATES,
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: poller.stop())
+        if pool is not None:
+            # Like gunicorn, TTIN adds a worker process and TTOU removes one.
+            signal.signal(signal.SIGTTIN, lambda *_: self._resize(pool, pool.processes + 1))
+            signal.signal(signal.SIGTTOU, lambda *_: self._resize(pool, pool.processes - 1))
+
+        self.stdout.write(self.style.SUCCESS("Polling Telegram for updates; press Ctrl+C to stop."))
+        poller.run()
+        if pool is not None:
+            pool.stop(options["drain_timeout"])
+        self.stdout.write("Poller stopped.")
+
+    @staticmethod
+    def _resize(pool: ShardPool, processes: int) -> None:
+        if processes >= 1:
+            threading.Thread(target=pool.resize, args=(processes,), name="telegram-reshard").start()
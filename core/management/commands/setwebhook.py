@@ -1,6 +1,10 @@
+from urllib.parse import urlsplit
+
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
 
+from core.bots import bots
 from core.telegram import TelegramClient
 
 
@@ -13,18 +17,84 @@ class Command(BaseCommand):
             dest="url",
             help="Public HTTPS URL for the webhook (defaults to TELEGRAM_WEBHOOK_URL setting).",
         )
+        parser.add_argument(
+            "--allowed-updates",
+            dest="allowed_updates",
+            help="Comma-separated update types Telegram should deliver (defaults to TELEGRAM_ALLOWED_UPDATES).",
+        )
+        parser.add_argument(
+            "--max-connections",
+            dest="max_connections",
+            type=int,
+            help="Maximum simultaneous HTTPS connections Telegram opens to the webhook (1-100).",
+        )
+        parser.add_argument(
+            "--drop-pending-updates",
+            dest="drop_pending_updates",
+            action="store_true",
+            help="Discard updates that queued up while no webhook was reachable.",
+        )
+        bots_group = parser.add_mutually_exclusive_group()
+        bots_group.add_argument(
+            "--bot",
+            dest="bot",
+            help="Register this bot from TELEGRAM_BOTS or the Bot table instead of TELEGRAM_BOT_TOKEN.",
+        )
+        bots_group.add_argument(
+            "--all-bots",
+            dest="all_bots",
+            action="store_true",
+            help="Register TELEGRAM_BOT_TOKEN and every registered bot in one run.",
+        )
 
     def handle(self, *args, **options):
         url = options.get("url") or settings.TELEGRAM_WEBHOOK_URL
         if not url:
             raise CommandError("Provide --url or set TELEGRAM_WEBHOOK_URL in your environment.")
 
-        if not settings.TELEGRAM_BOT_TOKEN:
-            raise CommandError("TELEGRAM_BOT_TOKEN is missing; set it before registering the webhook.")
+        # (token, url, secret) per bot; registered bots live under the host of the main webhook URL.
+        targets = []
+        if not options.get("bot"):
+            if settings.TELEGRAM_BOT_TOKEN:
+                targets.append((settings.TELEGRAM_BOT_TOKEN, url, settings.TELEGRAM_WEBHOOK_SECRET))
+            elif not options.get("all_bots"):
+                raise CommandError("TELEGRAM_BOT_TOKEN is missing; set it before registering the webhook.")
+        if options.get("bot"):
+            bot = bots.get(options["bot"])
+            if bot is None:
+                raise CommandError(f"Unknown bot {options['bot']!r}; add it to TELEGRAM_BOTS or the Bot table.")
+            targets.append((bot.token, self._bot_url(url, bot.name), bot.secret))
+        elif options.get("all_bots"):
+            targets.extend((bot.token, self._bot_url(url, bot.name), bot.secret) for bot in bots.all())
+        if not targets:
+            raise CommandError("No bots to register; set TELEGRAM_BOT_TOKEN or TELEGRAM_BOTS.")
+
+        allowed_updates = settings.TELEGRAM_ALLOWED_UPDATES
+        if options.get("allowed_updates") is not None:
+            allowed_updates = [item.strip() for item in options["allowed_updates"].split(",") if item.strip()]
+
+        max_connections = options.get("max_connections")
+        if max_connections is not None and not 1 <= max_connections <= 100:
+            raise CommandError("--max-connections must be between 1 and 100.")
 
-        client = TelegramClient(token=settings.TELEGRAM_BOT_TOKEN)
+        failed = []
+        for token, target_url, secret in targets:
+            client = TelegramClient(token=token)
+            if client.set_webhook(
+                target_url,
+                secret_token=secret or None,
+                allowed_updates=allowed_updates,
+                max_connections=max_connections,
+                drop_pending_updates=options.get("drop_pending_updates", False),
+            ):
+                self.stdout.write(self.style.SUCCESS(f"Webhook successfully set to {target_url}"))
+            else:
+                failed.append(target_url)
 
-        if not client.set_webhook(url, secret_token=settings.TELEGRAM_WEBHOOK_SECRET or None):
-            raise CommandError(f"Failed to register webhook with Telegram using URL {url}")
+        if failed:
+            raise CommandError(f"Failed to register webhook with Telegram using URL {', '.join(failed)}")
 
-        self.stdout.write(self.style.SUCCESS(f"Webhook successfully set to {url}"))
+    @staticmethod
+    def _bot_url(url: str, name: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}{reverse('telegram-bot-webhook', kwargs={'bot': name})}"
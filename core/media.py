@@ -0,0 +1,258 @@
+"""
+Upload-once media: a local file is uploaded the first time a bot sends it, and its file_id is reused after that.
+
+Handlers put `local("stickers/wave.webp")` where a Bot API call expects a file. The client streams the file
+to Telegram on the first send and records the file_id it gets back under the file's SHA-256 in the MediaFile
+table, so every worker, the drainer included, sends the id from then on.
+"""
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import secrets
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+
+from .models import MediaFile
+from .router import Call
+
+logger = logging.getLogger(__name__)
+
+LOCAL_PREFIX = "local:"
+# The payload field that carries the file, per Bot API method.
+MEDIA_FIELDS = {
+    "sendPhoto": "photo",
+    "sendSticker": "sticker",
+    "sendVoice": "voice",
+    "sendAudio": "audio",
+    "sendAnimation": "animation",
+    "sendVideo": "video",
+    "sendDocument": "document",
+}
+MEDIA_METHODS = {
+    ".jpg": "sendPhoto",
+    ".jpeg": "sendPhoto",
+    ".png": "sendPhoto",
+    ".webp": "sendSticker",
+    ".tgs": "sendSticker",
+    ".ogg": "sendVoice",
+    ".oga": "sendVoice",
+    ".opus": "sendVoice",
+    ".mp3": "sendAudio",
+    ".gif": "sendAnimation",
+    ".mp4": "sendVideo",
+}
+CHUNK_SIZE = 64 * 1024
+
+
+def local(name: str) -> str:
+    """
+    Reference a file under TELEGRAM_MEDIA_ROOT from a call payload.
+    """
+    return LOCAL_PREFIX + name
+
+
+def media_call(chat_id: int | str, name: str, **extra: Any) -> Call:
+    """
+    Build the call that sends local file `name`, picking sendPhoto, sendSticker, sendVoice... by its extension.
+    """
+    method = MEDIA_METHODS.get(Path(name).suffix.lower(), "sendDocument")
+    return method, {"chat_id": chat_id, MEDIA_FIELDS[method]: local(name), **extra}
+
+
+def local_file(method: str, payload: Dict[str, Any]) -> Optional[Tuple[str, Path]]:
+    """
+    Return the field and path of the local file a call sends, or None when it sends nothing from disk.
+    """
+    field = MEDIA_FIELDS.get(method)
+    value = payload.get(field) if field else None
+    if isinstance(value, Path):
+        return field, value
+    if not isinstance(value, str) or not value.startswith(LOCAL_PREFIX):
+        return None
+    root = Path(settings.TELEGRAM_MEDIA_ROOT).resolve()
+    path = (root / value[len(LOCAL_PREFIX):]).resolve()
+    if root not in path.parents:
+        raise ValueError(f"{value!r} is outside TELEGRAM_MEDIA_ROOT")
+    return field, path
+
+
+def file_id_of(result: Any, field: str) -> Optional[str]:
+    """
+    Pull the file_id of the sent file out of the Message a send method returned.
+    """
+    if not isinstance(result, dict):
+        return None
+    sent = result.get(field) or result.get("document")
+    if isinstance(sent, list):
+        # Photos come back in several sizes, largest last.
+        sent = sent[-1] if sent else None
+    return sent.get("file_id") if isinstance(sent, dict) else None
+
+
+def bot_id(token: str) -> str:
+    return token.partition(":")[0]
+
+
+class FileIdCache:
+    """
+    Content hash to file_id for every bot: a dict in front of the MediaFile table that all workers share.
+
+    Misses are not remembered, so an id another worker recorded is picked up on the next send.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_ids: Dict[Tuple[str, str], str] = {}
+        self._digests: Dict[Tuple[Path, int, int], str] = {}
+        self._uploads: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def digest(self, path: Path, compute: bool = True) -> Optional[str]:
+        """
+        SHA-256 of the file's content; remembered until its size or modification time changes.
+
+        With `compute` off, only a remembered digest is returned, so the caller never reads the file.
+        """
+        stat = path.stat()
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None and compute:
+            sha = hashlib.sha256()
+            with path.open("rb") as file:
+                for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+                    sha.update(chunk)
+            digest = self._digests[key] = sha.hexdigest()
+        return digest
+
+    def cached(self, token: str, digest: str) -> Optional[str]:
+        """
+        Look the file_id up in this process only, without touching the database.
+        """
+        return self._file_ids.get((bot_id(token), digest))
+
+    def get(self, token: str, digest: str) -> Optional[str]:
+        key = (bot_id(token), digest)
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            return file_id
+        try:
+            file_id = MediaFile.objects.filter(bot_id=key[0], sha256=digest).values_list("file_id", flat=True).first()
+        except DatabaseError:
+            logger.exception("Could not read the file_id cache; uploading the file again.")
+            return None
+        if file_id is not None:
+            self._file_ids[key] = file_id
+        return file_id
+
+    def put(self, token: str, digest: str, file_id: str, kind: str = "", size: int = 0) -> None:
+        key = (bot_id(token), digest)
+        self._file_ids[key] = file_id
+        try:
+            MediaFile.objects.update_or_create(
+                bot_id=key[0], sha256=digest, defaults={"file_id": file_id, "kind": kind, "size": size}
+            )
+        except IntegrityError:
+            # Another worker uploaded the same file at the same time; either id works.
+            pass
+        except DatabaseError:
+            logger.exception("Could not record file_id for %s; other workers will upload it again.", digest)
+
+    def forget(self, token: str, digest: str) -> None:
+        key = (bot_id(token), digest)
+        self._file_ids.pop(key, None)
+        try:
+            MediaFile.objects.filter(bot_id=key[0], sha256=digest).delete()
+        except DatabaseError:
+            logger.exception("Could not drop the stale file_id of %s.", digest)
+
+    def upload_lock(self, token: str, digest: str) -> threading.Lock:
+        """
+        The lock that lets one thread per process upload a file while the others wait for its file_id.
+        """
+        key = (bot_id(token), digest)
+        with self._lock:
+            return self._uploads.setdefault(key, threading.Lock())
+
+    def resolve(self, token: str, method: str, payload: Dict[str, Any]) -> Optional[Call]:
+        """
+        Return the call with its local file swapped for an id this process knows, or None if it must upload.
+
+        Calls that send nothing from disk come back unchanged. Used for inline webhook replies, which
+        cannot carry a file.
+        """
+        upload = local_file(method, payload)
+        if upload is None:
+            return method, payload
+        field, path = upload
+        try:
+            digest = self.digest(path, compute=False)
+        except OSError:
+            return None
+        file_id = self.cached(token, digest) if digest else None
+        return (method, {**payload, field: file_id}) if file_id else None
+
+
+class MultipartBody:
+    """
+    A multipart/form-data request body that reads the file from disk in chunks as it is sent.
+
+    requests takes it as `data=`: its length becomes the Content-Length and the connection pulls it
+    through read(), so an upload never holds the whole file in memory.
+    """
+
+    def __init__(self, fields: Dict[str, Any], field: str, path: Path):
+        self.boundary = secrets.token_hex(16)
+        head = b"".join(self._field(name, value) for name, value in fields.items())
+        filename = path.name.replace('"', "%22")
+        mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        head += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {mimetype}\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._file = path.open("rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._length = len(head) + self.size + len(tail)
+        self._parts = [io.BytesIO(head), self._file, io.BytesIO(tail)]
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _field(self, name: str, value: Any) -> bytes:
+        # Objects such as reply_markup travel as JSON, like in a JSON request body.
+        text = value if isinstance(value, str) else json.dumps(value)
+        return f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{text}\r\n'.encode()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while self._parts and size != 0:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "MultipartBody":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+file_ids = FileIdCache()
@@ -0,0 +1,248 @@
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "telegram_webhook_seconds": ("histogram", "Time spent handling a webhook request."),
+    "telegram_parse_seconds": ("histogram", "Time spent decoding an update payload."),
+    "telegram_api_seconds": ("histogram", "Bot API call latency by method."),
+    "telegram_updates_total": ("counter", "Updates received by update type."),
+    "telegram_webhook_rejected_total": ("counter", "Webhook calls rejected for a missing or invalid secret."),
+    "telegram_webhook_shed_total": ("counter", "Webhook calls shed with 503 at the concurrency limit."),
+    "telegram_webhook_in_flight": ("gauge", "Webhook requests being handled."),
+    "telegram_webhook_concurrency_limit": ("gauge", "Current adaptive concurrency limit of the webhook."),
+    "telegram_api_failures_total": ("counter", "Bot API calls that failed, by method."),
+    "telegram_api_throttled_total": ("counter", "Bot API calls answered with 429, by method."),
+    "telegram_api_short_circuited_total": ("counter", "Bot API calls skipped because the method's circuit was open."),
+    "telegram_open_circuits": ("gauge", "Bot API methods whose circuit breaker is open or half-open."),
+    "telegram_dispatch_queue_depth": ("gauge", "Outbound calls waiting in the dispatch queue."),
+    "telegram_media_uploaded_bytes_total": ("counter", "Bytes of local media uploaded to the Bot API, by method."),
+    "telegram_inline_cache_total": ("counter", "Inline query answers by source: precomputed, LRU hit or miss."),
+    "telegram_coalesce_held_chats": ("gauge", "Chats whose reply is held for coalescing."),
+    "telegram_coalesced_replies_total": ("counter", "Held replies replaced by a newer update from the same chat."),
+    "telegram_coalesce_overflow_total": ("counter", "Replies sent right away because too many chats were held."),
+    "telegram_capture_dropped_total": ("counter", "Webhook requests not captured because the capture queue was full."),
+    "log_records_dropped_total": ("counter", "Log records dropped because the log queue was full."),
+}
+
+
+class Registry:
+    """
+    In-process counters, histograms and gauges; updates cost one dict operation under a lock.
+
+    When `directory` is set, every process periodically writes its snapshot there and `render`
+    merges the snapshots of all processes, so any gunicorn worker can serve the full picture.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._directory: Optional[str] = None
+        self._flusher_pid: Optional[int] = None
+        self._interval = 5.0
+
+    def inc(self, name: str, labels: Labels = (), amount: float = 1) -> None:
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: Labels = ()) -> None:
+        key = (name, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                # One slot per bucket plus +Inf, then the running sum.
+                series = self._histograms[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def timer(self, name: str, labels: Labels = ()) -> "_Timer":
+        return _Timer(self, name, labels)
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        self._gauges[name] = func
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(labels), list(series)] for (name, labels), series in self._histograms.items()]
+        gauges = {}
+        for name, func in self._gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception:
+                logger.exception("Failed to read gauge %s", name)
+        return {"pid": os.getpid(), "counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def share(self, directory: str, interval: float = 5.0) -> None:
+        """
+        Publish this process's snapshot to `directory` every `interval` seconds and at exit.
+        """
+        first = self._directory is None
+        self._directory = directory
+        self._interval = interval
+        os.makedirs(directory, exist_ok=True)
+        self._start_flusher()
+        if first:
+            atexit.register(self.flush)
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_flusher(self) -> None:
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_forever, name="telegram-metrics", daemon=True).start()
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(self._interval)
+            self.flush()
+
+    def _after_fork(self) -> None:
+        # A forked worker starts from zero so the parent's samples are not counted twice.
+        self._lock = threading.Lock()
+        self._counters.clear()
+        self._histograms.clear()
+        self._start_flusher()
+
+    def flush(self) -> None:
+        if not self._directory:
+            return
+        path = os.path.join(self._directory, f"{os.getpid()}.json")
+        try:
+            with open(f"{path}.tmp", "w") as handle:
+                json.dump(self.snapshot(), handle)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            logger.exception("Failed to write metrics snapshot to %s", path)
+
+    def collect(self) -> List[dict]:
+        if not self._directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self._directory, "*.json")):
+            try:
+                with open(path) as handle:
+                    snapshots.append(json.load(handle))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """
+        Merge all process snapshots into the Prometheus text exposition format.
+        """
+        counters: Dict[Tuple[str, Labels], float] = {}
+        histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        gauges: Dict[str, float] = {}
+        for snapshot in self.collect():
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, series in snapshot["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, [0.0] * len(series))
+                for index, value in enumerate(series):
+                    merged[index] += value
+            # Gauges describe current state, so exited workers must not contribute to them.
+            if _is_alive(snapshot["pid"]):
+                for name, value in snapshot["gauges"].items():
+                    gauges[name] = gauges.get(name, 0) + value
+
+        # Series missing from METRICS are still served, after the documented ones and without help text.
+        catalogue: Dict[str, Tuple[str, Optional[str]]] = dict(METRICS)
+        for kind, names in (
+            ("counter", [name for name, _ in counters]),
+            ("histogram", [name for name, _ in histograms]),
+            ("gauge", list(gauges)),
+        ):
+            for name in sorted(set(names) - catalogue.keys()):
+                catalogue[name] = (kind, None)
+
+        lines: List[str] = []
+        for name, (kind, help_text) in catalogue.items():
+            if help_text is not None:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            elif kind == "histogram":
+                for (metric, labels), series in sorted(histograms.items()):
+                    if metric == name:
+                        lines.extend(self._render_histogram(name, labels, series))
+            elif name in gauges:
+                lines.append(f"{name} {_format_value(gauges[name])}")
+        return "\n".join(lines) + "\n"
+
+    def _render_histogram(self, name: str, labels: Labels, series: List[float]) -> List[str]:
+        lines, cumulative = [], 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {_format_value(cumulative)}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {series[-1]!r}")
+        lines.append(f"{name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "started")
+
+    def __init__(self, registry: Registry, name: str, labels: Labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.registry.observe(self.name, time.perf_counter() - self.started, self.labels)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+metrics = Registry()
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Bot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(max_length=64, unique=True)),
+                ('token', models.CharField(max_length=128)),
+                ('webhook_secret', models.CharField(blank=True, max_length=256)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='bot',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
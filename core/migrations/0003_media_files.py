@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_bots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bot_id', models.CharField(max_length=32)),
+                ('sha256', models.CharField(max_length=64)),
+                ('kind', models.CharField(max_length=16)),
+                ('file_id', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bot_id', 'sha256'), name='media_file_unique')],
+            },
+        ),
+    ]
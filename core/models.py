@@ -1,3 +1,66 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OutboxMessage(models.Model):
+    """
+    A Bot API call persisted before it is sent, so a reply survives a crash or a failed request.
+    """
+
+    class Status(models.IntegerChoices):
+        PENDING = 0
+        DONE = 1
+        FAILED = 2
+
+    method = models.CharField(max_length=64)
+    payload = models.JSONField()
+    # Name of the registered bot that sends the call; empty for the TELEGRAM_BOT_TOKEN bot.
+    bot = models.CharField(max_length=64, blank=True, default="")
+    chat_id = models.CharField(max_length=64, blank=True)
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"], name="outbox_ready_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.method} to {self.chat_id or '-'} ({self.get_status_display()})"
+
+
+class Bot(models.Model):
+    """
+    A bot served by this deployment next to the TELEGRAM_BOT_TOKEN one, at /telegram/bots/<name>/webhook/.
+    """
+
+    name = models.SlugField(max_length=64, unique=True)
+    token = models.CharField(max_length=128)
+    webhook_secret = models.CharField(max_length=256, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class MediaFile(models.Model):
+    """
+    The file_id Telegram gave a local file the first time a bot uploaded it, keyed on the file's content hash.
+    """
+
+    # Numeric id of the uploading bot (its token up to the colon); a file_id only works for the bot that got it.
+    bot_id = models.CharField(max_length=32)
+    sha256 = models.CharField(max_length=64)
+    kind = models.CharField(max_length=16)
+    file_id = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["bot_id", "sha256"], name="media_file_unique")]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.sha256[:12]} ({self.bot_id})"
@@ -0,0 +1,323 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .dispatch import TokenBucket
+from .log import log_context
+from .models import OutboxMessage
+from .telegram import RetryAfter, TelegramClient, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Bot API error codes that a retry cannot fix (bad request, bot blocked or kicked).
+PERMANENT_ERRORS = frozenset({400, 403})
+
+
+class _Append:
+    __slots__ = ("messages", "done", "ok")
+
+    def __init__(self, messages: List[OutboxMessage]):
+        self.messages = messages
+        self.done = threading.Event()
+        self.ok = False
+
+
+class OutboxWriter:
+    """
+    Persist outbound calls with group commit: concurrent `append` calls are written by one thread in a
+    single transaction, and each caller returns once its row is committed.
+    """
+
+    def __init__(self, *, max_batch: int = 500, timeout: float = 5.0):
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pending: List[_Append] = []
+        self._pid: Optional[int] = None
+
+    def append(self, method: str, payload: Dict[str, Any]) -> bool:
+        """
+        Store a call for the drainer; returns False if it was not committed.
+
+        A call still waiting for the writer after `timeout` seconds is withdrawn, so False always means the
+        call will never be stored and the update can safely be redelivered. One the writer already took is
+        waited for until its transaction ends.
+        """
+        return self.append_many([(method, payload)])
+
+    def append_many(self, calls: List[Tuple[str, Dict[str, Any]]], bot: str = "") -> bool:
+        """
+        Store several calls in the same transaction, so an update's replies are kept all or none.
+
+        `bot` names the registered bot that sends them; empty for the TELEGRAM_BOT_TOKEN bot.
+        """
+        entry = _Append([self._build(method, payload, bot) for method, payload in calls])
+        self._ensure_started()
+        with self._cond:
+            self._pending.append(entry)
+            self._cond.notify()
+        if not entry.done.wait(self.timeout):
+            with self._cond:
+                queued = entry in self._pending
+                if queued:
+                    self._pending.remove(entry)
+            if queued:
+                logger.error("Timed out storing %s calls in the outbox.", len(calls))
+                return False
+            # The writer's transaction may still commit these rows; answering now could report them lost.
+            entry.done.wait()
+        return entry.ok
+
+    @staticmethod
+    def _build(method: str, payload: Dict[str, Any], bot: str = "") -> OutboxMessage:
+        chat_id = payload.get("chat_id")
+        return OutboxMessage(method=method, payload=payload, bot=bot, chat_id="" if chat_id is None else str(chat_id))
+
+    def _ensure_started(self) -> None:
+        # Like the dispatcher, a pre-forked worker starts its own writer thread on first use.
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pending = []
+            threading.Thread(target=self._run, name="telegram-outbox", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+            self._write(batch)
+
+    def _write(self, batch: List[_Append]) -> None:
+        try:
+            with transaction.atomic():
+                OutboxMessage.objects.bulk_create([message for entry in batch for message in entry.messages])
+            ok = True
+        except Exception:
+            logger.exception("Failed to store %s outbox messages", len(batch))
+            connection.close()
+            ok = False
+        for entry in batch:
+            entry.ok = ok
+            entry.done.set()
+
+
+class OutboxDrainer:
+    """
+    Send pending outbox rows in batches and record the outcome with bulk updates.
+
+    Rows of a batch are grouped by chat; groups are sent concurrently and each group in order. When a
+    call fails, it and every later pending row of its chat are held back with exponential backoff (or
+    Telegram's `retry_after`), so retries never reorder a conversation. Run a single drainer per database.
+
+    Like the Dispatcher, calls to one chat are at least 1/`chat_rate` seconds apart: a row that comes too
+    soon is postponed, with the rest of its chat, instead of holding up the batch.
+
+    Rows stored for a registered bot are sent with `clients(row.bot)`, the others with `client`.
+    """
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        *,
+        batch_size: int = 100,
+        workers: int = 8,
+        rate: float = 30.0,
+        chat_rate: float = 0.0,
+        max_attempts: int = 10,
+        backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        idle_delay: float = 0.5,
+        retention: float = 86400,
+        clients: Optional[Callable[[str], TelegramClient]] = None,
+    ):
+        self.client = client
+        self.clients = clients
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.idle_delay = idle_delay
+        self.retention = retention
+        self.stop_event = threading.Event()
+        self._bucket = TokenBucket(rate) if rate else None
+        self._bucket_lock = threading.Lock()
+        self.chat_interval = 1.0 / chat_rate if chat_rate else 0.0
+        self._next_allowed: Dict[Hashable, float] = {}
+        self._pruned_at = 0.0
+
+    def run(self) -> None:
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="telegram-outbox-worker") as executor:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                if not self.drain_once(executor):
+                    self._prune()
+                    self.stop_event.wait(self.idle_delay)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def drain_once(self, executor: ThreadPoolExecutor) -> int:
+        """
+        Send one batch of due rows; returns how many rows were attempted.
+        """
+        rows = list(
+            OutboxMessage.objects.filter(
+                status=OutboxMessage.Status.PENDING, next_attempt_at__lte=timezone.now()
+            ).order_by("id")[: self.batch_size]
+        )
+        if not rows:
+            return 0
+
+        groups: Dict[Hashable, List[OutboxMessage]] = defaultdict(list)
+        for row in rows:
+            groups[row.bot, row.chat_id].append(row)
+
+        sent: List[int] = []
+        failures: List[Tuple[OutboxMessage, Exception]] = []
+        postponed: List[Tuple[OutboxMessage, float]] = []
+        for group_sent, group_failures, group_postponed in executor.map(self._send_group, groups.values()):
+            sent.extend(group_sent)
+            failures.extend(group_failures)
+            if group_postponed is not None:
+                postponed.append(group_postponed)
+
+        if sent:
+            OutboxMessage.objects.filter(id__in=sent).update(status=OutboxMessage.Status.DONE, sent_at=timezone.now())
+        for row, exc in failures:
+            self._record_failure(row, exc)
+        for row, delay in postponed:
+            self._hold_chat(row, timezone.now() + timedelta(seconds=delay), include_row=True)
+        self._prune_pacing()
+        return len(rows)
+
+    def _send_group(
+        self, rows: List[OutboxMessage]
+    ) -> Tuple[List[int], List[Tuple[OutboxMessage, Exception]], Optional[Tuple[OutboxMessage, float]]]:
+        """
+        Send one chat's rows in order; also returns the first row it postponed for pacing, and for how long.
+        """
+        sent, failures = [], []
+        for row in rows:
+            wait = self._chat_wait((row.bot, row.chat_id))
+            if wait:
+                return sent, failures, (row, wait)
+            self._throttle()
+            try:
+                with log_context(chat_id=row.chat_id or None):
+                    self._client_for(row.bot).request(row.method, row.payload)
+            except Exception as exc:
+                failures.append((row, exc))
+                if not self._is_permanent(exc):
+                    # Later rows of this chat wait for the failed one to go through first.
+                    break
+            else:
+                sent.append(row.id)
+        return sent, failures, None
+
+    def _client_for(self, bot: str) -> TelegramClient:
+        if not bot:
+            return self.client
+        if self.clients is None:
+            raise KeyError(f"No client for bot {bot!r}")
+        return self.clients(bot)
+
+    def _chat_wait(self, chat: Tuple[str, str]) -> float:
+        """
+        Seconds until `chat` may get its next call; 0 means now, and takes that chat's turn.
+        """
+        if not self.chat_interval or not chat[1]:
+            return 0.0
+        now = time.monotonic()
+        allowed = self._next_allowed.get(chat, 0.0)
+        if allowed > now:
+            return allowed - now
+        self._next_allowed[chat] = now + self.chat_interval
+        return 0.0
+
+    def _prune_pacing(self) -> None:
+        # Like the Dispatcher, forget chats whose interval has passed so memory tracks active chats only.
+        if len(self._next_allowed) > 4096:
+            now = time.monotonic()
+            self._next_allowed = {chat: allowed for chat, allowed in self._next_allowed.items() if allowed > now}
+
+    def _throttle(self) -> None:
+        if self._bucket is None:
+            return
+        while True:
+            with self._bucket_lock:
+                delay = self._bucket.take(time.monotonic())
+            if not delay:
+                return
+            time.sleep(delay)
+
+    @staticmethod
+    def _is_permanent(exc: Exception) -> bool:
+        return (
+            isinstance(exc, TelegramError)
+            and not isinstance(exc, RetryAfter)
+            and isinstance(exc.data, dict)
+            and exc.data.get("error_code") in PERMANENT_ERRORS
+        )
+
+    def _record_failure(self, row: OutboxMessage, exc: Exception) -> None:
+        if isinstance(exc, RetryAfter):
+            # A 429 or an open circuit says nothing about the message itself, so it does not use up an attempt.
+            self._reschedule(row, row.attempts, exc.retry_after, exc)
+            return
+
+        attempts = row.attempts + 1
+        if self._is_permanent(exc) or attempts >= self.max_attempts:
+            logger.error("Giving up on outbox message %s after %s attempts: %s", row.id, attempts, exc)
+            OutboxMessage.objects.filter(id=row.id).update(
+                status=OutboxMessage.Status.FAILED, attempts=attempts, last_error=str(exc)
+            )
+            return
+        self._reschedule(row, attempts, min(self.backoff * 2 ** (attempts - 1), self.max_backoff), exc)
+
+    @classmethod
+    def _reschedule(cls, row: OutboxMessage, attempts: int, delay: float, exc: Exception) -> None:
+        retry_at = timezone.now() + timedelta(seconds=delay)
+        logger.warning("Outbox message %s failed (%s); retrying in %.1fs", row.id, exc, delay)
+        with transaction.atomic():
+            OutboxMessage.objects.filter(id=row.id).update(
+                attempts=attempts, next_attempt_at=retry_at, last_error=str(exc)
+            )
+            cls._hold_chat(row, retry_at)
+
+    @staticmethod
+    def _hold_chat(row: OutboxMessage, until: datetime, include_row: bool = False) -> None:
+        """
+        Keep the pending rows of `row`'s chat after it (and `row` itself with `include_row`) until `until`.
+        """
+        later = {"id__gte": row.id} if include_row else {"id__gt": row.id}
+        OutboxMessage.objects.filter(
+            bot=row.bot,
+            chat_id=row.chat_id,
+            status=OutboxMessage.Status.PENDING,
+            next_attempt_at__lt=until,
+            **later,
+        ).update(next_attempt_at=until)
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        if not self.retention or now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        cutoff = timezone.now() - timedelta(seconds=self.retention)
+        deleted, _ = OutboxMessage.objects.filter(status=OutboxMessage.Status.DONE, sent_at__lt=cutoff).delete()
+        if deleted:
+            logger.info("Pruned %s delivered outbox messages", deleted)
@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional
+
+from .helpers import Payload, extract_message, get_chat_id
+from .telegram import RetryAfter, TelegramClient
+from .update import Update
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update: "Payload | Update") -> Hashable:
+    if isinstance(update, Update):
+        message = update.message
+        return message.chat_id if message is not None else None
+    message = extract_message(update)
+    return get_chat_id(message) if message else None
+
+
+class UpdatePoller:
+    """
+    Long-poll getUpdates and hand every update to `handle`.
+
+    A fetcher thread keeps one batch in flight while the previous batch is processed. Within a batch,
+    updates are grouped by chat: groups run concurrently on the worker pool and each group is handled
+    in order, so replies to one chat never overtake each other. `handle` returns False to have an
+    update retried after `retry_delay` seconds. `allowed_updates` is passed on to getUpdates.
+
+    The client returns core.update.Update views, so a batch waits as its response body and each update is
+    decoded only by `handle`.
+    """
+
+    def __init__(
+        self,
+        client: TelegramClient,
+        handle: Callable[[Payload], bool],
+        *,
+        workers: int = 8,
+        timeout: int = 50,
+        limit: int = 100,
+        retry_delay: float = 1.0,
+        allowed_updates: Optional[List[str]] = None,
+    ):
+        self.client = client
+        self.handle = handle
+        self.workers = workers
+        self.timeout = timeout
+        self.limit = limit
+        self.retry_delay = retry_delay
+        self.allowed_updates = allowed_updates
+        self.offset: Optional[int] = None
+        self.stop_event = threading.Event()
+        self._batches: "queue.Queue[List[Update]]" = queue.Queue(maxsize=1)
+
+    def run(self) -> None:
+        # The fetcher is not joined on stop: a batch it receives afterwards is never confirmed by a
+        # following getUpdates call, so Telegram hands it out again on the next run.
+        threading.Thread(target=self._fetch, name="telegram-poller", daemon=True).start()
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="telegram-poll-worker") as executor:
+            while not (self.stop_event.is_set() and self._batches.empty()):
+                try:
+                    batch = self._batches.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                self.process_batch(batch, executor)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def process_batch(self, batch: List[Payload], executor: ThreadPoolExecutor) -> None:
+        groups: Dict[Hashable, List[Payload]] = {}
+        for update in batch:
+            groups.setdefault(chat_key(update), []).append(update)
+        for future in [executor.submit(self._process_group, group) for group in groups.values()]:
+            future.result()
+
+    def _process_group(self, updates: List[Payload]) -> None:
+        for update in updates:
+            while True:
+                try:
+                    if self.handle(update):
+                        break
+                except Exception:
+                    logger.exception("Failed to handle update %s", update.get("update_id"))
+                    break
+                if self.stop_event.wait(self.retry_delay):
+                    logger.error("Stopping with update %s unhandled", update.get("update_id"))
+                    return
+
+    def _fetch(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                batch = self.client.get_updates(
+                    self.offset, timeout=self.timeout, limit=self.limit, allowed_updates=self.allowed_updates
+                )
+            except RetryAfter as exc:
+                self.stop_event.wait(exc.retry_after)
+                continue
+            except Exception:
+                logger.exception("getUpdates failed; retrying")
+                self.stop_event.wait(self.retry_delay)
+                continue
+            if not batch:
+                continue
+            while not self.stop_event.is_set():
+                try:
+                    self._batches.put(batch, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            else:
+                return
+            # Advancing the offset confirms this batch to Telegram on the next call.
+            self.offset = batch[-1].get("update_id") + 1
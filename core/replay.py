@@ -0,0 +1,116 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional
+
+from .helpers import Payload
+from .polling import chat_key
+
+logger = logging.getLogger(__name__)
+
+Handle = Callable[[Payload, Optional[str]], bool]
+
+
+class ReplayStats(NamedTuple):
+    replayed: int
+    failed: int
+    unreadable: int
+    seconds: float
+
+
+class StubClient:
+    """
+    Stands in for TelegramClient during a replay: every call succeeds after `latency` seconds and is counted.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def request(self, method: str, payload: Dict[str, Any]) -> Any:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+        return True
+
+    def call(self, method: str, payload: Dict[str, Any]) -> bool:
+        return self.request(method, payload)
+
+
+class Replayer:
+    """
+    Feeds captured requests to `handle` on `workers` threads, as fast as they go.
+
+    Requests are spread over the threads by chat, so the updates of one chat are handled in the order they
+    were captured while other chats run in parallel. The file is streamed: at most `max_pending` requests
+    are read ahead of the handlers.
+    """
+
+    def __init__(self, handle: Handle, *, workers: int = 8, max_pending: int = 1000):
+        self.handle = handle
+        self.workers = max(workers, 1)
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._turns = itertools.count()
+        self._replayed = self._failed = 0
+
+    def run(self, records: Iterable[Dict[str, Any]], limit: Optional[int] = None) -> ReplayStats:
+        queues: List["queue.Queue[Optional[tuple]]"] = [
+            queue.Queue(max(self.max_pending // self.workers, 1)) for _ in range(self.workers)
+        ]
+        threads = [
+            threading.Thread(target=self._work, args=(shard,), name=f"telegram-replay-{n}", daemon=True)
+            for n, shard in enumerate(queues)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        read = unreadable = 0
+        for record in records:
+            if limit is not None and read >= limit:
+                break
+            try:
+                payload = json.loads(record["body"])
+            except (KeyError, TypeError, ValueError):
+                unreadable += 1
+                continue
+            if not isinstance(payload, dict):
+                unreadable += 1
+                continue
+            read += 1
+            bot = record.get("bot")
+            queues[self._shard(bot, chat_key(payload))].put((payload, bot))
+
+        for shard in queues:
+            shard.put(None)
+        for thread in threads:
+            thread.join()
+        return ReplayStats(self._replayed, self._failed, unreadable, time.perf_counter() - started)
+
+    def _shard(self, bot: Optional[str], chat: Hashable) -> int:
+        if chat is None:
+            # Updates without a chat (inline queries, polls...) have no order to keep, so they take turns.
+            return next(self._turns) % self.workers
+        return hash((bot, chat)) % self.workers
+
+    def _work(self, shard: "queue.Queue[Optional[tuple]]") -> None:
+        while True:
+            item = shard.get()
+            if item is None:
+                return
+            payload, bot = item
+            try:
+                ok = self.handle(payload, bot)
+            except Exception:
+                logger.exception("Replaying update %s failed", payload.get("update_id"))
+                ok = False
+            with self._lock:
+                self._replayed += 1
+                self._failed += not ok
@@ -0,0 +1,158 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("telegram_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    The request that triggered an outbound call has no time budget left for it.
+    """
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """
+    Bound every outbound call made inside the block to `seconds` from now; nested budgets only shrink.
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left in the current budget, or None outside of any `deadline` block.
+    """
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+class _Circuit:
+    __slots__ = ("state", "outcomes", "failures", "opened_at", "probing")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.outcomes: Deque[Tuple[float, bool]] = deque()
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+
+class CircuitBreaker:
+    """
+    Per-method circuit breaker over a sliding time window of call outcomes.
+
+    A method's circuit opens when at least `min_calls` calls in the last `window` seconds finished
+    and `failure_ratio` of them failed. While open, calls fail fast; after `cooldown` seconds one
+    probe call is let through (half-open) and its outcome closes or reopens the circuit.
+    `min_calls=0` disables the breaker.
+    """
+
+    def __init__(self, failure_ratio: float = 0.5, min_calls: int = 5, window: float = 30, cooldown: float = 15):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def state(self, method: str) -> str:
+        with self._lock:
+            circuit = self._circuits.get(method)
+            return circuit.state if circuit else CLOSED
+
+    def allow(self, method: str) -> float:
+        """
+        Return 0 when a call to `method` may proceed, or the seconds until the next probe otherwise.
+
+        Every allowed call must be followed by `record`, since a half-open circuit waits for its probe.
+        """
+        if not self.min_calls:
+            return 0
+        with self._lock:
+            circuit = self._circuits.get(method)
+            if circuit is None or circuit.state == CLOSED:
+                return 0
+            now = time.monotonic()
+            if circuit.state == OPEN:
+                wait = circuit.opened_at + self.cooldown - now
+                if wait > 0:
+                    return wait
+                circuit.state = HALF_OPEN
+                logger.info("Circuit for Telegram method %s is half-open; probing", method)
+            if circuit.probing:
+                return self.cooldown
+            circuit.probing = True
+            return 0
+
+    def record(self, method: str, ok: Optional[bool]) -> None:
+        """
+        Count a finished call; `ok=None` marks an inconclusive one that only releases a pending probe.
+        """
+        if not self.min_calls:
+            return
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.get(method)
+            if circuit is None:
+                circuit = self._circuits[method] = _Circuit()
+
+            if circuit.state != CLOSED:
+                if not circuit.probing:
+                    # A call let through before the circuit opened; the probe decides.
+                    return
+                circuit.probing = False
+                if ok is None:
+                    return
+                if ok:
+                    circuit.state = CLOSED
+                    circuit.outcomes.clear()
+                    circuit.failures = 0
+                    logger.warning("Circuit for Telegram method %s closed", method)
+                else:
+                    circuit.state = OPEN
+                    circuit.opened_at = now
+                    logger.warning("Probe for Telegram method %s failed; circuit stays open", method)
+                return
+            if ok is None:
+                return
+
+            circuit.outcomes.append((now, ok))
+            circuit.failures += not ok
+            cutoff = now - self.window
+            while circuit.outcomes[0][0] < cutoff:
+                _, old_ok = circuit.outcomes.popleft()
+                circuit.failures -= not old_ok
+
+            calls = len(circuit.outcomes)
+            if calls >= self.min_calls and circuit.failures >= self.failure_ratio * calls:
+                circuit.state = OPEN
+                circuit.opened_at = now
+                logger.warning(
+                    "Circuit for Telegram method %s opened: %d of %d calls failed in %ss",
+                    method,
+                    circuit.failures,
+                    calls,
+                    self.window,
+                )
+
+    def open_circuits(self) -> int:
+        with self._lock:
+            return sum(circuit.state != CLOSED for circuit in self._circuits.values())
@@ -0,0 +1,247 @@
+import re
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Pattern, Set, Tuple, Union
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+from .helpers import Payload
+
+Call = Tuple[str, Dict[str, Any]]
+Reply = Union[None, Call, Iterable[Call]]
+
+MESSAGE_TYPES = ("message", "edited_message")
+
+# Field holding the text that commands and patterns are matched against, per update type.
+TEXT_FIELDS = {"callback_query": "data", "inline_query": "query", "chosen_inline_result": "query"}
+
+# Letters that IGNORECASE matches to ASCII ones but str.lower() leaves alone: dotless i and long s. The other
+# two, İ and the Kelvin sign, lower to text holding "i" and "k" already.
+ASCII_FOLDS = {0x131: "i", 0x17F: "s"}
+
+
+class Context(NamedTuple):
+    update: Payload
+    update_type: str
+    event: Payload
+    text: str = ""
+    command: Optional[str] = None
+    args: str = ""
+    match: Optional[re.Match] = None
+
+
+Handler = Callable[[Context], Reply]
+
+
+class Router:
+    """
+    Route updates to registered handlers in three stages, stopping at the first hit:
+
+    1. commands (`/start args`), looked up by update type and command name in a dict;
+    2. text patterns of the update type, only when no command matched; the first one registered that finds
+       a match wins, but only the patterns whose literal text occurs in the update are searched (see
+       PatternSet), so their cost does not grow with the number of patterns;
+    3. the fallback handler of the update type.
+
+    Handlers receive a Context and return nothing, one `(method, payload)` call or a list of calls.
+    """
+
+    def __init__(self, bot_username: Optional[str] = None):
+        self.bot_username = bot_username.lower() if bot_username else None
+        self._fallbacks: Dict[str, Handler] = {}
+        self._commands: Dict[str, Dict[str, Handler]] = {}
+        self._patterns: Dict[str, PatternSet] = {}
+        self._types: Dict[str, None] = {}
+
+    @property
+    def update_types(self) -> List[str]:
+        return list(self._types)
+
+    def on(self, *update_types: str) -> Callable[[Handler], Handler]:
+        """
+        Register the fallback handler for updates of the given types.
+        """
+
+        def register(handler: Handler) -> Handler:
+            for update_type in update_types:
+                if update_type in self._fallbacks:
+                    raise ValueError(f"A handler for {update_type!r} updates is already registered.")
+                self._fallbacks[update_type] = handler
+                self._types[update_type] = None
+            return handler
+
+        return register
+
+    def command(self, *names: str, update_types: Iterable[str] = MESSAGE_TYPES) -> Callable[[Handler], Handler]:
+        """
+        Register a handler for `/name` commands, with or without a leading slash in `names`.
+        """
+
+        def register(handler: Handler) -> Handler:
+            for update_type in update_types:
+                commands = self._commands.setdefault(update_type, {})
+                for name in names:
+                    name = name.lstrip("/").lower()
+                    if name in commands:
+                        raise ValueError(f"Command /{name} is already registered for {update_type!r} updates.")
+                    commands[name] = handler
+                self._types[update_type] = None
+            return handler
+
+        return register
+
+    def pattern(
+        self, regex: Union[str, Pattern], *, flags: int = 0, update_types: Iterable[str] = MESSAGE_TYPES
+    ) -> Callable[[Handler], Handler]:
+        """
+        Register a handler for text that `regex` finds a match in.
+        """
+        compiled = re.compile(regex, flags)
+
+        def register(handler: Handler) -> Handler:
+            for update_type in update_types:
+                self._patterns.setdefault(update_type, PatternSet()).add(compiled, handler)
+                self._types[update_type] = None
+            return handler
+
+        return register
+
+    def resolve(self, update: Payload) -> Optional[Tuple[Handler, Context]]:
+        """
+        Find the handler for `update` and the context to call it with.
+        """
+        if not isinstance(update, dict):
+            return None
+        update_type = next((key for key in update if key in self._types), None)
+        if update_type is None:
+            return None
+        event = update[update_type]
+        if not isinstance(event, dict):
+            return None
+
+        text = event.get(TEXT_FIELDS.get(update_type, "text"))
+        if not isinstance(text, str):
+            text = ""
+
+        if text.startswith("/"):
+            commands = self._commands.get(update_type)
+            if commands:
+                head, *rest = text[1:].split(None, 1) or [""]
+                name, _, mention = head.lower().partition("@")
+                handler = commands.get(name)
+                if handler and (not mention or not self.bot_username or mention == self.bot_username):
+                    return handler, Context(update, update_type, event, text, name, rest[0] if rest else "")
+
+        if text and update_type in self._patterns:
+            hit = self._patterns[update_type].match(text)
+            if hit:
+                handler, match = hit
+                return handler, Context(update, update_type, event, text, match=match)
+
+        handler = self._fallbacks.get(update_type)
+        return (handler, Context(update, update_type, event, text)) if handler else None
+
+    def route(self, update: Payload) -> List[Call]:
+        """
+        Run the matching handler and return the Bot API calls it asked for.
+        """
+        resolved = self.resolve(update)
+        if resolved is None:
+            return []
+        handler, context = resolved
+        return as_calls(handler(context))
+
+
+class PatternSet:
+    """
+    Text patterns matched in registration order, searching only those that can match a given text.
+
+    Most patterns contain a run of literal text that every match includes (`order ` in `order (\\d+)`). One
+    regex over these literals finds the ones that occur in the text, and only their patterns, plus those
+    without a literal, are searched.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[Pattern, Handler]] = []
+        self._by_literal: Dict[str, List[int]] = {}
+        self._unindexed: List[int] = []
+        self._finder: Optional[Pattern] = None
+        self._found: Dict[str, Tuple[int, ...]] = {}
+
+    def add(self, pattern: Pattern, handler: Handler) -> None:
+        index = len(self._entries)
+        self._entries.append((pattern, handler))
+        literal = required_literal(pattern)
+        if literal is None:
+            self._unindexed.append(index)
+        else:
+            self._by_literal.setdefault(literal.lower(), []).append(index)
+        self._finder = None
+
+    def match(self, text: str) -> Optional[Tuple[Handler, re.Match]]:
+        if self._finder is None and self._by_literal:
+            self._build()
+        candidates: Set[int] = set(self._unindexed)
+        if self._finder is not None:
+            # Literals are kept lowercase, as one of an IGNORECASE pattern matches any case; extra candidates
+            # are harmless since every candidate is searched with its own pattern.
+            lowered, position = text.lower(), 0
+            if not lowered.isascii():
+                lowered = lowered.translate(ASCII_FOLDS)
+            while True:
+                found = self._finder.search(lowered, position)
+                if found is None:
+                    break
+                candidates.update(self._found[found.group()])
+                # Resume right after the start, so literals inside or overlapping this one are found too.
+                position = found.start() + 1
+        for index in sorted(candidates):
+            pattern, handler = self._entries[index]
+            match = pattern.search(text)
+            if match:
+                return handler, match
+        return None
+
+    def _build(self) -> None:
+        # Longest first, so at any position the longest literal there matches; the patterns of the literals
+        # that are prefixes of it (and so occur at the same position) are added along with its own.
+        # A plain alternation without groups or flags keeps the regex engine's fast scan for the first character.
+        literals = sorted(self._by_literal, key=len, reverse=True)
+        self._found = {
+            literal: tuple(
+                index for other in literals if literal.startswith(other) for index in self._by_literal[other]
+            )
+            for literal in literals
+        }
+        self._finder = re.compile("|".join(map(re.escape, literals)))
+
+
+def required_literal(pattern: Pattern) -> Optional[str]:
+    """
+    Return the longest run of ASCII literal text at the top level of `pattern`, which every match contains.
+    """
+    if not isinstance(pattern.pattern, str):
+        return None
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+    longest, run = "", []
+    for op, value in [*parsed, (None, None)]:
+        if op is sre_constants.LITERAL and value < 128:
+            run.append(chr(value))
+            continue
+        if len(run) > len(longest):
+            longest = "".join(run)
+        run = []
+    return longest or None
+
+
+def as_calls(reply: Reply) -> List[Call]:
+    if reply is None:
+        return []
+    if isinstance(reply, tuple) and len(reply) == 2 and isinstance(reply[0], str):
+        return [reply]
+    return list(reply)
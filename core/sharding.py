@@ -0,0 +1,175 @@
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+import zlib
+from typing import Callable, Hashable, List, Optional
+
+from django.db import connections
+
+from .helpers import Payload
+from .polling import chat_key
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(key: Hashable, shards: int) -> int:
+    """
+    Map `key` to one of `shards` buckets with jump consistent hashing: growing from N to N+1 shards
+    moves only 1/(N+1) of the keys, and the result is the same in every process.
+    """
+    if isinstance(key, int):
+        value = key & 0xFFFFFFFFFFFFFFFF
+    else:
+        value = zlib.crc32(str(key).encode())
+    bucket, jump = -1, 0
+    while jump < shards:
+        bucket = jump
+        value = (value * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * (float(1 << 31) / float((value >> 33) + 1)))
+    return bucket
+
+
+def _shard_main(index: int, updates: "multiprocessing.Queue", handle: Callable[[Payload], bool], retry_delay: float):
+    # The parent decides when to stop; a terminal's Ctrl+C must not kill shards with work queued.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    while True:
+        update = updates.get()
+        if update is None:
+            return
+        while True:
+            try:
+                if handle(update):
+                    break
+            except Exception:
+                logger.exception("Shard %s failed to handle update %s", index, update.get("update_id"))
+                break
+            time.sleep(retry_delay)
+
+
+class ShardPool:
+    """
+    Hand updates to `processes` worker processes, each owning the chats that hash to it.
+
+    A chat's updates always go to the same process and are handled one at a time in arrival order, so
+    replies never overtake each other while separate chats run on separate cores. Resizing drains
+    every shard before the new layout starts, so no chat is ever handled by two processes at once.
+    A shard that dies (killed for memory, say) is started again on its next update, losing only the
+    update it was handling.
+    Polled core.update.Update views cross to a shard as their raw bodies and are decoded only there.
+
+    Shards are forked so they inherit the loaded Django app. Forking a process that runs threads can
+    leave a lock held forever in the child, which Python 3.12+ warns about; start the pool before
+    anything else, as runpoller does. The state shared with threads here (the log queue, metrics, HTTP
+    sessions, the dispatcher) is rebuilt in a child that finds a new pid, which covers later resizes
+    and restarts.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[Payload], bool],
+        processes: int,
+        *,
+        max_pending: int = 1000,
+        retry_delay: float = 1.0,
+        submit_timeout: float = 0.5,
+    ):
+        self.handle = handle
+        self.processes = processes
+        self.max_pending = max_pending
+        self.retry_delay = retry_delay
+        self.submit_timeout = submit_timeout
+        # Shards inherit the loaded Django app through fork instead of re-importing it.
+        self._context = multiprocessing.get_context("fork")
+        self._lock = threading.Lock()
+        self._queues: List["multiprocessing.Queue"] = []
+        self._workers: List[multiprocessing.Process] = []
+
+    def start(self) -> None:
+        with self._lock:
+            self._start(self.processes)
+
+    def submit(self, update: Payload) -> bool:
+        """
+        Queue `update` on its chat's shard; returns False when that shard stays full past `submit_timeout`.
+        """
+        key = chat_key(update)
+        if key is None:
+            key = update.get("update_id")
+        with self._lock:
+            if not self._queues:
+                return False
+            index = shard_for(key, len(self._queues))
+            if not self._workers[index].is_alive():
+                self._restart(index)
+            try:
+                self._queues[index].put(update, timeout=self.submit_timeout)
+            except queue.Full:
+                return False
+        return True
+
+    def resize(self, processes: int) -> None:
+        """
+        Drain every shard, then restart with `processes` shards.
+        """
+        if processes < 1:
+            raise ValueError("A shard pool needs at least one process.")
+        with self._lock:
+            self._drain(None)
+            self._start(processes)
+        logger.info("Resharded updates across %s processes", processes)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Let every shard finish its queued updates, waiting up to `timeout` seconds in total.
+        """
+        with self._lock:
+            self._drain(timeout)
+
+    def _start(self, processes: int) -> None:
+        connections.close_all()
+        self.processes = processes
+        self._queues = [self._context.Queue(self.max_pending) for _ in range(processes)]
+        self._workers = [self._spawn(index, updates) for index, updates in enumerate(self._queues)]
+
+    def _spawn(self, index: int, updates: "multiprocessing.Queue") -> multiprocessing.Process:
+        worker = self._context.Process(
+            target=_shard_main,
+            args=(index, updates, self.handle, self.retry_delay),
+            name=f"telegram-shard-{index}",
+            daemon=True,
+        )
+        worker.start()
+        return worker
+
+    def _restart(self, index: int) -> None:
+        dead = self._workers[index]
+        logger.error("Shard %s exited with code %s; starting it again.", dead.name, dead.exitcode)
+        # The dead process may have held the queue's read lock, so its queued updates move to a new queue.
+        stale, updates = self._queues[index], self._context.Queue(self.max_pending)
+        while True:
+            try:
+                update = stale.get_nowait()
+            except queue.Empty:
+                break
+            updates.put_nowait(update)
+        # Nothing reads the old queue again: release its pipe and feeder thread without waiting on the dead reader.
+        stale.cancel_join_thread()
+        stale.close()
+        connections.close_all()
+        self._queues[index] = updates
+        self._workers[index] = self._spawn(index, updates)
+
+    def _drain(self, timeout: Optional[float]) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for updates in self._queues:
+            updates.put(None)
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                logger.error("Shard %s did not finish its queued updates in time; terminating it.", worker.name)
+                worker.terminate()
+        self._queues, self._workers = [], []
@@ -1,41 +1,443 @@
+import asyncio
 import logging
-from typing import Any, Dict, Optional
+import os
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 
-import requests
 from django.conf import settings
 
+from .media import FileIdCache, MultipartBody, file_id_of, file_ids, local_file
+from .metrics import metrics
+from .resilience import CircuitBreaker, DeadlineExceeded, remaining
+from .update import Update, updates_in
+
+# requests and httpx are imported on first use: a worker that only answers inline never loads them, and
+# a WSGI worker never loads httpx.
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
 logger = logging.getLogger(__name__)
 
+_session: Optional["requests.Session"] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+_breaker: Optional[CircuitBreaker] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_session() -> "requests.Session":
+    """
+    Return the process-wide keep-alive session, building a fresh pool after a fork.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            _session = build_session(settings.TELEGRAM_HTTP_POOL_SIZE)
+            _session_pid = pid
+    return _session
+
+
+def build_session(pool_size: int) -> "requests.Session":
+    # urllib3 pools are thread-safe and the Bot API sets no cookies, so one session serves every thread.
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_breaker() -> CircuitBreaker:
+    """
+    Return the process-wide circuit breaker shared by every client, built from settings on first use.
+    """
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(
+            failure_ratio=settings.TELEGRAM_BREAKER_FAILURE_RATIO,
+            min_calls=settings.TELEGRAM_BREAKER_MIN_CALLS,
+            window=settings.TELEGRAM_BREAKER_WINDOW,
+            cooldown=settings.TELEGRAM_BREAKER_COOLDOWN,
+        )
+    return _breaker
+
+
+def get_async_http() -> "httpx.AsyncClient":
+    """
+    Return the keep-alive httpx client bound to the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import httpx
+
+        limits = httpx.Limits(
+            max_connections=settings.TELEGRAM_ASYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.TELEGRAM_HTTP_POOL_SIZE,
+        )
+        client = _async_clients[loop] = httpx.AsyncClient(limits=limits)
+    return client
+
+
+def _is_stale_file_id(exc: "TelegramError") -> bool:
+    # Telegram answers 400 "wrong file identifier" for ids it dropped or that belong to another bot.
+    data = exc.data if isinstance(exc.data, dict) else {}
+    return data.get("error_code") == 400 and "file identifier" in str(data.get("description", ""))
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    # Only a library that is already loaded can have raised, so this never imports one.
+    requests, httpx = sys.modules.get("requests"), sys.modules.get("httpx")
+    return (requests is not None and isinstance(exc, requests.Timeout)) or (
+        httpx is not None and isinstance(exc, httpx.TimeoutException)
+    )
+
+
+def webhook_reply(method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Render a Bot API call as a webhook response body that Telegram executes for us.
+    """
+    return {"method": method, **payload}
+
+
+class TelegramError(Exception):
+    """
+    Telegram rejected a Bot API call; `data` holds the decoded error response.
+    """
+
+    def __init__(self, data: Any):
+        super().__init__(data.get("description") if isinstance(data, dict) else data)
+        self.data = data
 
-class TelegramClient:
-    api_base = "https://api.telegram.org"
 
-    def __init__(self, token: Optional[str] = None):
+class RetryAfter(TelegramError):
+    """
+    Telegram throttled the bot (HTTP 429) and asked us to wait `retry_after` seconds.
+    """
+
+    def __init__(self, retry_after: float, data: Any = None):
+        super().__init__(data or f"Retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CircuitOpen(RetryAfter):
+    """
+    The circuit for a Bot API method is open, so the call was not attempted.
+
+    It is a RetryAfter so queues that honour Telegram's throttling hold the call until the next probe.
+    """
+
+    def __init__(self, method: str, retry_after: float):
+        super().__init__(retry_after, f"Circuit for {method} is open; retry after {retry_after:.1f}s")
+        self.method = method
+
+
+class BaseTelegramClient:
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        *,
+        api_base: Optional[str] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
         self.token = token or settings.TELEGRAM_BOT_TOKEN
+        self.api_base = api_base or settings.TELEGRAM_API_BASE
+        self.timeout = timeout or (settings.TELEGRAM_CONNECT_TIMEOUT, settings.TELEGRAM_READ_TIMEOUT)
+        self._breaker = breaker
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        return self._breaker or get_breaker()
 
     def _build_url(self, method: str) -> str:
         if not self.token:
             raise ValueError("TELEGRAM_BOT_TOKEN is not configured.")
         return f"{self.api_base}/bot{self.token}/{method}"
 
-    def _post(self, method: str, payload: Dict[str, Any]) -> bool:
+    @staticmethod
+    def _unwrap(response) -> Any:
         try:
-            response = requests.post(self._build_url(method), json=payload, timeout=10)
-            response.raise_for_status()
             data = response.json()
-        except Exception:
-            logger.exception("Telegram API request failed for method %s", method)
-            return False
+        except ValueError:
+            response.raise_for_status()
+            raise TelegramError(f"Non-JSON response with status {response.status_code}")
 
         if not data.get("ok"):
-            logger.error("Telegram API responded with failure: %s", data)
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            if retry_after is not None:
+                raise RetryAfter(float(retry_after), data)
+            raise TelegramError(data)
+        return data.get("result")
+
+    def _budget(self) -> Tuple[float, float]:
+        """
+        Shrink the (connect, read) timeouts to the time left in the current deadline, if any.
+        """
+        left = remaining()
+        if left is None:
+            return self.timeout
+        if left <= 0:
+            raise DeadlineExceeded("No time left in the request budget for a Bot API call.")
+        connect, read = self.timeout
+        return min(connect, left), min(read, left)
+
+    @contextmanager
+    def _guard(self, method: str, clipped: bool = False) -> Iterator[None]:
+        """
+        Fail fast while the method's circuit is open and report the call's outcome to the breaker.
+
+        Any answer from Telegram below 500, including 4xx errors and 429s, shows the API is up.
+        A timeout that only happened because the deadline `clipped` the configured one says nothing
+        about the API either way.
+        """
+        breaker = self.breaker
+        wait = breaker.allow(method)
+        if wait:
+            metrics.inc("telegram_api_short_circuited_total", (("method", method),))
+            raise CircuitOpen(method, wait)
+        try:
+            yield
+        except TelegramError as exc:
+            code = exc.data.get("error_code", 0) if isinstance(exc.data, dict) else 500
+            breaker.record(method, code < 500)
+            raise
+        except BaseException as exc:
+            breaker.record(method, None if clipped and _is_timeout(exc) else False)
+            raise
+        breaker.record(method, True)
+
+    @staticmethod
+    @contextmanager
+    def _instrument(method: str) -> Iterator[None]:
+        labels = (("method", method),)
+        started = time.perf_counter()
+        try:
+            yield
+        except RetryAfter:
+            metrics.inc("telegram_api_throttled_total", labels)
+            raise
+        except Exception:
+            metrics.inc("telegram_api_failures_total", labels)
+            raise
+        finally:
+            metrics.observe("telegram_api_seconds", time.perf_counter() - started, labels)
+
+    @staticmethod
+    def _log_failure(method: str, exc: TelegramError) -> None:
+        if isinstance(exc, CircuitOpen):
+            logger.warning("Skipped Telegram %s call: %s", method, exc)
+        elif isinstance(exc, RetryAfter):
+            logger.warning("Telegram rate limit hit on %s; retry after %ss", method, exc.retry_after)
+        else:
+            logger.error("Telegram API responded with failure: %s", exc.data)
+
+
+class TelegramClient(BaseTelegramClient):
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        *,
+        session: Optional["requests.Session"] = None,
+        media: Optional[FileIdCache] = None,
+        **kwargs,
+    ):
+        super().__init__(token, **kwargs)
+        self._session = session
+        self._media = media
+
+    @property
+    def session(self) -> "requests.Session":
+        return self._session or get_session()
+
+    @property
+    def media(self) -> FileIdCache:
+        return self._media or file_ids
+
+    def request(self, method: str, payload: Dict[str, Any]) -> Any:
+        """
+        Perform a Bot API call and return its result, raising TelegramError when Telegram refuses it.
+
+        A local file in the payload (see core.media) is uploaded once and sent by file_id afterwards.
+        """
+        upload = local_file(method, payload)
+        if upload is not None:
+            return self._send_file(method, payload, *upload)
+
+        timeout = self._budget()
+        with self._guard(method, timeout != self.timeout), self._instrument(method):
+            response = self.session.post(self._build_url(method), json=payload, timeout=timeout)
+            return self._unwrap(response)
+
+    def upload(self, method: str, payload: Dict[str, Any], field: str, path: Path) -> Any:
+        """
+        Perform a Bot API call with `path` as its multipart `field`, streamed from disk.
+        """
+        timeout = self._budget()
+        with MultipartBody(payload, field, path) as body:
+            with self._guard(method, timeout != self.timeout), self._instrument(method):
+                response = self.session.post(
+                    self._build_url(method), data=body, headers={"Content-Type": body.content_type}, timeout=timeout
+                )
+                result = self._unwrap(response)
+            metrics.inc("telegram_media_uploaded_bytes_total", (("method", method),), body.size)
+        return result
+
+    def _send_file(self, method: str, payload: Dict[str, Any], field: str, path: Path) -> Any:
+        media = self.media
+        digest = media.digest(path)
+        file_id = media.get(self.token, digest)
+        if file_id is not None:
+            try:
+                return self.request(method, {**payload, field: file_id})
+            except TelegramError as exc:
+                if not _is_stale_file_id(exc):
+                    raise
+                logger.warning("Telegram no longer knows file_id of %s; uploading it again.", path)
+                media.forget(self.token, digest)
+
+        with media.upload_lock(self.token, digest):
+            # Another thread may have finished uploading the same file while this one waited.
+            file_id = media.cached(self.token, digest)
+            if file_id is not None:
+                return self.request(method, {**payload, field: file_id})
+            fields = {key: value for key, value in payload.items() if key != field}
+            result = self.upload(method, fields, field, path)
+            file_id = file_id_of(result, field)
+            if file_id:
+                media.put(self.token, digest, file_id, kind=field, size=path.stat().st_size)
+            return result
+
+    def _post(self, method: str, payload: Dict[str, Any]) -> bool:
+        try:
+            self.request(method, payload)
+        except TelegramError as exc:
+            self._log_failure(method, exc)
+            return False
+        except DeadlineExceeded as exc:
+            logger.warning("Skipped Telegram %s call: %s", method, exc)
+            return False
+        except Exception:
+            logger.exception("Telegram API request failed for method %s", method)
             return False
         return True
 
+    def call(self, method: str, payload: Dict[str, Any]) -> bool:
+        return self._post(method, payload)
+
     def send_message(self, chat_id: int | str, text: str) -> bool:
         return self._post("sendMessage", {"chat_id": chat_id, "text": text})
 
-    def set_webhook(self, url: str, secret_token: str | None = None) -> bool:
+    # `photo`, `sticker` and `voice` are a file_id, an HTTP URL, core.media.local(name) or a Path.
+    def send_photo(self, chat_id: int | str, photo: "str | Path", **extra: Any) -> bool:
+        return self._post("sendPhoto", {"chat_id": chat_id, "photo": photo, **extra})
+
+    def send_sticker(self, chat_id: int | str, sticker: "str | Path", **extra: Any) -> bool:
+        return self._post("sendSticker", {"chat_id": chat_id, "sticker": sticker, **extra})
+
+    def send_voice(self, chat_id: int | str, voice: "str | Path", **extra: Any) -> bool:
+        return self._post("sendVoice", {"chat_id": chat_id, "voice": voice, **extra})
+
+    def set_webhook(
+        self,
+        url: str,
+        secret_token: str | None = None,
+        *,
+        allowed_updates: Optional[List[str]] = None,
+        max_connections: Optional[int] = None,
+        drop_pending_updates: bool = False,
+    ) -> bool:
         payload: Dict[str, Any] = {"url": url, **({"secret_token": secret_token} if secret_token else {})}
+        if allowed_updates is not None:
+            payload["allowed_updates"] = allowed_updates
+        if max_connections:
+            payload["max_connections"] = max_connections
+        if drop_pending_updates:
+            payload["drop_pending_updates"] = True
 
         return self._post("setWebhook", payload)
+
+    def delete_webhook(self) -> bool:
+        return self._post("deleteWebhook", {})
+
+    def get_updates(
+        self,
+        offset: Optional[int] = None,
+        *,
+        timeout: int = 50,
+        limit: int = 100,
+        allowed_updates: Optional[List[str]] = None,
+    ) -> List[Update]:
+        """
+        Fetch the next batch of updates as lazy views over the response body (see core.update).
+        """
+        payload: Dict[str, Any] = {"timeout": timeout, "limit": limit, **({"offset": offset} if offset else {})}
+        if allowed_updates is not None:
+            payload["allowed_updates"] = allowed_updates
+        budget = self._budget()
+        with self._guard("getUpdates", budget != self.timeout), self._instrument("getUpdates"):
+            response = self.session.post(self._build_url("getUpdates"), json=payload, timeout=budget)
+            updates = updates_in(response.content) if response.status_code == 200 else None
+            return updates if updates is not None else self._unwrap(response) or []
+
+
+class AsyncTelegramClient(BaseTelegramClient):
+    """
+    Non-blocking counterpart of TelegramClient for async views running under ASGI.
+    """
+
+    def __init__(self, token: Optional[str] = None, *, http: Optional["httpx.AsyncClient"] = None, **kwargs):
+        super().__init__(token, **kwargs)
+        self._http = http
+
+    @property
+    def http(self) -> "httpx.AsyncClient":
+        return self._http or get_async_http()
+
+    async def request(self, method: str, payload: Dict[str, Any]) -> Any:
+        import httpx
+
+        if local_file(method, payload) is not None:
+            # Hashing, the file_id cache and the upload block on disk and the database, so run them off the loop.
+            from asgiref.sync import sync_to_async
+
+            client = TelegramClient(self.token, api_base=self.api_base, timeout=self.timeout, breaker=self._breaker)
+            return await sync_to_async(client.request, thread_sensitive=False)(method, payload)
+
+        connect, read = timeout = self._budget()
+        with self._guard(method, timeout != self.timeout), self._instrument(method):
+            response = await self.http.post(
+                self._build_url(method), json=payload, timeout=httpx.Timeout(read, connect=connect)
+            )
+            return self._unwrap(response)
+
+    async def _post(self, method: str, payload: Dict[str, Any]) -> bool:
+        try:
+            await self.request(method, payload)
+        except TelegramError as exc:
+            self._log_failure(method, exc)
+            return False
+        except DeadlineExceeded as exc:
+            logger.warning("Skipped Telegram %s call: %s", method, exc)
+            return False
+        except Exception:
+            logger.exception("Telegram API request failed for method %s", method)
+            return False
+        return True
+
+    async def call(self, method: str, payload: Dict[str, Any]) -> bool:
+        return await self._post(method, payload)
+
+    async def send_message(self, chat_id: int | str, text: str) -> bool:
+        return await self._post("sendMessage", {"chat_id": chat_id, "text": text})
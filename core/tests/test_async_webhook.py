@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+SECRET = "dummy-test-secret"
+HEADERS = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET=SECRET, TELEGRAM_BOT_TOKEN="secret-token")
+class AsyncWebhookViewTests(TestCase):
+    path = "/telegram/webhook/async/"
+
+    async def test_replies_to_messages_without_blocking(self):
+        payload = {"message": {"chat": {"id": 99}, "text": "hi", "from": {"first_name": "Ariana"}}}
+
+        with mock.patch("core.handlers.pick_greeting", return_value="Bonjour, Ariana!"), mock.patch(
+            "core.webhook.async_telegram_client.call", new_callable=mock.AsyncMock, return_value=True
+        ) as send_message:
+            response = await self.async_client.post(
+                self.path, data=payload, content_type="application/json", headers=HEADERS
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        send_message.assert_awaited_once_with("sendMessage", {"chat_id": 99, "text": "Bonjour, Ariana!"})
+
+    async def test_rejects_invalid_secret(self):
+        with mock.patch(
+            "core.webhook.async_telegram_client.call", new_callable=mock.AsyncMock
+        ) as send_message:
+            response = await self.async_client.post(
+                self.path,
+                data={"message": {"chat": {"id": 1}}},
+                content_type="application/json",
+                headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        send_message.assert_not_awaited()
+
+    async def test_invalid_json_returns_400(self):
+        response = await self.async_client.post(
+            self.path, data="not-json", content_type="application/json", headers=HEADERS
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_ignores_updates_without_message_payload(self):
+        with mock.patch(
+            "core.webhook.async_telegram_client.call", new_callable=mock.AsyncMock
+        ) as send_message:
+            response = await self.async_client.post(
+                self.path, data={"callback_query": {"data": "noop"}}, content_type="application/json", headers=HEADERS
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        send_message.assert_not_awaited()
+
+    @override_settings(TELEGRAM_INLINE_REPLIES=True)
+    async def test_answers_inline_when_enabled(self):
+        payload = {"message": {"chat": {"id": 7}, "text": "hi"}}
+
+        with mock.patch("core.handlers.pick_greeting", return_value="Hola, there!"):
+            response = await self.async_client.post(
+                self.path, data=payload, content_type="application/json", headers=HEADERS
+            )
+
+        self.assertEqual(response.json(), {"method": "sendMessage", "chat_id": 7, "text": "Hola, there!"})
+
+    @override_settings(TELEGRAM_DISPATCH_WORKERS=2)
+    async def test_defers_the_update_when_the_reply_cannot_be_queued(self):
+        payload = {"update_id": 31, "message": {"chat": {"id": 7}, "text": "hi"}}
+
+        with mock.patch("core.webhook.dispatcher.submit", return_value=False), mock.patch(
+            "core.webhook.WebhookHandler._forget_update"
+        ) as forget:
+            response = await self.async_client.post(
+                self.path, data=payload, content_type="application/json", headers=HEADERS
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        forget.assert_called_once_with(31, None)
@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.bots import BotRegistry
+from core.dedup import MemoryUpdateCache
+from core.dispatch import Dispatcher
+from core.models import Bot, OutboxMessage
+from core.outbox import OutboxDrainer
+from core.telegram import get_session
+
+CONFIGURED = {"shop": {"token": "shop-token", "secret": "shop-secret"}}
+
+
+@override_settings(TELEGRAM_BOTS=CONFIGURED)
+class BotRegistryTests(TestCase):
+    def test_merges_configured_bots_with_active_rows(self):
+        Bot.objects.create(name="news", token="news-token", webhook_secret="news-secret")
+        Bot.objects.create(name="old", token="old-token", is_active=False)
+
+        registry = BotRegistry(ttl=60)
+
+        self.assertEqual(sorted(bot.name for bot in registry.all()), ["news", "shop"])
+        self.assertEqual(registry.get("news").secret, "news-secret")
+        self.assertIsNone(registry.get("old"))
+
+    def test_rows_are_reread_after_the_ttl(self):
+        registry = BotRegistry(ttl=60)
+        self.assertIsNone(registry.get("news"))
+
+        Bot.objects.create(name="news", token="news-token")
+        self.assertIsNone(registry.get("news"))
+        registry.reload()
+        self.assertEqual(registry.get("news").token, "news-token")
+
+    def test_clients_are_cached_per_bot_and_share_the_connection_pool(self):
+        registry = BotRegistry()
+
+        client = registry.client("shop")
+
+        self.assertIs(registry.client("shop"), client)
+        self.assertEqual(client.token, "shop-token")
+        self.assertEqual(registry.async_client("shop").token, "shop-token")
+        self.assertIs(client.session, get_session())
+        with self.assertRaises(KeyError):
+            registry.client("missing")
+
+
+@override_settings(TELEGRAM_BOTS=CONFIGURED, TELEGRAM_WEBHOOK_SECRET="main-secret", TELEGRAM_BOT_TOKEN="main-token")
+class BotWebhookTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("core.webhook.bots", BotRegistry(ttl=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, path, payload, secret):
+        return self.client.post(path, data=payload, format="json", HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=secret)
+
+    def test_unknown_bot_is_answered_like_a_wrong_secret(self):
+        unknown = self._post("/telegram/bots/nope/webhook/", {"update_id": 1}, "shop-secret")
+        wrong = self._post("/telegram/bots/shop/webhook/", {"update_id": 1}, "nope-secret")
+
+        self.assertEqual(unknown.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual((unknown.status_code, unknown.content), (wrong.status_code, wrong.content))
+
+    def test_each_bot_checks_its_own_secret(self):
+        with mock.patch("core.views.WebhookView._route", return_value=[]):
+            wrong = self._post("/telegram/bots/shop/webhook/", {"update_id": 1}, "main-secret")
+            right = self._post("/telegram/bots/shop/webhook/", {"update_id": 1}, "shop-secret")
+
+        self.assertEqual(wrong.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(right.status_code, status.HTTP_200_OK)
+
+    def test_replies_go_out_with_the_bots_own_client(self):
+        payload = {"update_id": 7, "message": {"chat": {"id": 5}, "text": "hi"}}
+
+        with mock.patch("core.webhook.telegram_client.call") as main_call, mock.patch(
+            "core.telegram.TelegramClient.call", autospec=True, return_value=True
+        ) as call:
+            response = self._post("/telegram/bots/shop/webhook/", payload, "shop-secret")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        main_call.assert_not_called()
+        self.assertEqual(call.call_args.args[0].token, "shop-token")
+        self.assertEqual(call.call_args.args[1], "sendMessage")
+
+    @override_settings(TELEGRAM_OUTBOX=True)
+    def test_outbox_rows_record_the_bot(self):
+        payload = {"update_id": 8, "message": {"chat": {"id": 5}, "text": "hi"}}
+
+        with mock.patch("core.webhook.outbox_writer.append_many", return_value=True) as append:
+            self._post("/telegram/bots/shop/webhook/", payload, "shop-secret")
+
+        self.assertEqual(append.call_args.kwargs, {"bot": "shop"})
+
+    def test_update_ids_are_deduplicated_per_bot(self):
+        payload = {"update_id": 9, "message": {"chat": {"id": 5}, "text": "hi"}}
+
+        with mock.patch("core.webhook.update_cache", MemoryUpdateCache()), mock.patch(
+            "core.webhook.bot_update_caches", {"shop": MemoryUpdateCache()}
+        ), mock.patch("core.views.WebhookView._deliver_calls", return_value=True) as deliver:
+            self._post("/telegram/webhook/", payload, "main-secret")
+            self._post("/telegram/bots/shop/webhook/", payload, "shop-secret")
+            self._post("/telegram/bots/shop/webhook/", payload, "shop-secret")
+
+        self.assertEqual([c.args[1] for c in deliver.call_args_list], [None, "shop"])
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET="main-secret", TELEGRAM_BOT_TOKEN="main-token")
+class AsyncBotWebhookTests(TestCase):
+    path = "/telegram/bots/news/webhook/async/"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": "news-secret"}
+
+    def setUp(self):
+        super().setUp()
+        Bot.objects.create(name="news", token="news-token", webhook_secret="news-secret")
+        patcher = mock.patch("core.webhook.bots", BotRegistry(ttl=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_database_bots_are_loaded_off_the_event_loop(self):
+        payload = {"update_id": 11, "message": {"chat": {"id": 5}, "text": "hi"}}
+
+        with mock.patch(
+            "core.telegram.AsyncTelegramClient.call", autospec=True, return_value=True
+        ) as call:
+            response = await self.async_client.post(
+                self.path, data=payload, content_type="application/json", headers=self.headers
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(call.call_args.args[0].token, "news-token")
+
+    @override_settings(TELEGRAM_INLINE_REPLIES=True)
+    async def test_database_bots_answer_inline(self):
+        payload = {"update_id": 12, "message": {"chat": {"id": 5}, "text": "hi"}}
+
+        with mock.patch("core.handlers.pick_greeting", return_value="Hi!"):
+            response = await self.async_client.post(
+                self.path, data=payload, content_type="application/json", headers=self.headers
+            )
+
+        self.assertEqual(response.json(), {"method": "sendMessage", "chat_id": 5, "text": "Hi!"})
+
+    async def test_unknown_bot_is_answered_like_a_wrong_secret(self):
+        unknown = await self.async_client.post(
+            "/telegram/bots/nope/webhook/async/", data={}, content_type="application/json", headers=self.headers
+        )
+        wrong = await self.async_client.post(
+            self.path, data={}, content_type="application/json", headers={"X-Telegram-Bot-Api-Secret-Token": "nope"}
+        )
+
+        self.assertEqual(unknown.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual((unknown.status_code, unknown.content), (wrong.status_code, wrong.content))
+
+
+def test_dispatcher_sends_with_the_submitted_client():
+    own, other = mock.Mock(token="own"), mock.Mock(token="other")
+    dispatcher = Dispatcher(own, workers=2, rate=0, chat_rate=0)
+
+    dispatcher.submit("sendMessage", {"chat_id": 1, "text": "a"})
+    dispatcher.submit("sendMessage", {"chat_id": 1, "text": "b"}, other)
+    dispatcher.shutdown(timeout=5)
+
+    own.request.assert_called_once_with("sendMessage", {"chat_id": 1, "text": "a"})
+    other.request.assert_called_once_with("sendMessage", {"chat_id": 1, "text": "b"})
+
+
+class BotOutboxTests(TestCase):
+    def test_drainer_sends_rows_with_their_bots_client(self):
+        own, shop = mock.Mock(), mock.Mock()
+        drainer = OutboxDrainer(own, rate=0, clients={"shop": shop}.__getitem__)
+        OutboxMessage.objects.create(method="sendMessage", chat_id="1", payload={"chat_id": 1, "text": "a"})
+        OutboxMessage.objects.create(method="sendMessage", chat_id="1", bot="shop", payload={"chat_id": 1, "text": "b"})
+
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(drainer.drain_once(executor), 2)
+
+        own.request.assert_called_once_with("sendMessage", {"chat_id": 1, "text": "a"})
+        shop.request.assert_called_once_with("sendMessage", {"chat_id": 1, "text": "b"})
+
+
+@override_settings(
+    TELEGRAM_BOTS=CONFIGURED,
+    TELEGRAM_BOT_TOKEN="main-token",
+    TELEGRAM_WEBHOOK_SECRET="main-secret",
+    TELEGRAM_WEBHOOK_URL="https://bots.example.com/telegram/webhook/",
+)
+class SetWebhookAllBotsTests(TestCase):
+    def test_registers_every_bot_with_its_url_and_secret(self):
+        Bot.objects.create(name="news", token="news-token", webhook_secret="news-secret")
+
+        with mock.patch("core.management.commands.setwebhook.bots", BotRegistry()), mock.patch(
+            "core.management.commands.setwebhook.TelegramClient"
+        ) as client_cls:
+            client_cls.return_value.set_webhook.return_value = True
+            call_command("setwebhook", "--all-bots", stdout=mock.Mock())
+
+        tokens = [c.kwargs["token"] for c in client_cls.call_args_list]
+        registered = [(c.args[0], c.kwargs["secret_token"]) for c in client_cls.return_value.set_webhook.call_args_list]
+        self.assertEqual(tokens, ["main-token", "shop-token", "news-token"])
+        self.assertEqual(
+            registered,
+            [
+                ("https://bots.example.com/telegram/webhook/", "main-secret"),
+                ("https://bots.example.com/telegram/bots/shop/webhook/", "shop-secret"),
+                ("https://bots.example.com/telegram/bots/news/webhook/", "news-secret"),
+            ],
+        )
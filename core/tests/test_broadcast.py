@@ -0,0 +1,121 @@
+import csv
+import json
+import pathlib
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from core.broadcast import Broadcaster, Checkpoint
+from core.models import OutboxMessage
+from core.telegram import RetryAfter, TelegramError
+
+
+class _FakeClient:
+    def __init__(self, errors=None):
+        self.errors = {str(chat_id): list(raised) for chat_id, raised in (errors or {}).items()}
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def request(self, method, payload):
+        with self._lock:
+            pending = self.errors.get(str(payload["chat_id"]))
+            if pending:
+                raise pending.pop(0)
+            self.sent.append(str(payload["chat_id"]))
+
+
+def test_outcomes_are_classified_and_retried():
+    client = _FakeClient(
+        {
+            2: [TelegramError({"ok": False, "error_code": 403, "description": "bot was blocked by the user"})],
+            3: [TelegramError({"ok": False, "error_code": 400, "description": "chat not found"})],
+            4: [RetryAfter(0.01), ConnectionError()],
+            5: [ConnectionError()] * 3,
+            6: [TelegramError({"ok": False, "error_code": 400, "parameters": {"migrate_to_chat_id": -1006}})],
+        }
+    )
+    broadcaster = Broadcaster(client, "news", rate=0, workers=4, max_attempts=3, backoff=0.001)
+
+    stats = broadcaster.run(range(1, 7))
+
+    assert stats == {"delivered": 3, "blocked": 1, "failed": 2}
+    assert sorted(client.sent) == ["-1006", "1", "4"]
+
+
+def test_checkpoint_tracks_the_low_watermark_and_resumes(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.json"), "abc")
+    client = _FakeClient()
+    broadcaster = Broadcaster(client, "news", rate=0, workers=2, checkpoint=checkpoint)
+    chats = (str(n) for n in range(10))
+
+    original = client.request
+
+    def stop_after_five(method, payload):
+        original(method, payload)
+        if len(client.sent) == 5:
+            broadcaster.stop()
+
+    client.request = stop_after_five
+    broadcaster.run(chats)
+    position, stats, finished = checkpoint.load()
+
+    assert not finished
+    assert position == sum(stats.values()) <= len(client.sent)
+
+    resumed = Broadcaster(_FakeClient(), "news", rate=0, workers=2, checkpoint=checkpoint)
+    final = resumed.run((str(n) for n in range(10)), start=position, stats=stats)
+
+    assert final["delivered"] >= 10
+    assert checkpoint.load()[0] == 10 and checkpoint.load()[2] is True
+
+
+@override_settings(TELEGRAM_BOT_TOKEN="token")
+class BroadcastCommandTests(TestCase):
+    def _call(self, *args):
+        stdout = mock.Mock()
+        with mock.patch("core.management.commands.broadcast.signal"):
+            call_command("broadcast", *args, stdout=stdout)
+        return " ".join(str(call.args[0]) for call in stdout.write.call_args_list)
+
+    def test_broadcasts_to_chats_from_a_file_and_reports_failures(self):
+        tmp = self._tmpdir()
+        (tmp / "chats.txt").write_text("# announcement list\n1\n2\n\n3  # vip\n")
+        client = _FakeClient({2: [TelegramError({"ok": False, "error_code": 403})]})
+
+        with mock.patch("core.management.commands.broadcast.TelegramClient", return_value=client):
+            output = self._call(
+                "--file", str(tmp / "chats.txt"), "--text", "hi", "--rate", "0",
+                "--checkpoint", str(tmp / "cp.json"), "--report", str(tmp / "report.csv"),
+            )
+
+        self.assertIn("delivered=2 blocked=1 failed=0 total=3", output)
+        self.assertEqual(sorted(client.sent), ["1", "3"])
+        with open(tmp / "report.csv", newline="") as handle:
+            self.assertEqual([row[:2] for row in csv.reader(handle)], [["2", "blocked"]])
+        self.assertTrue(json.loads((tmp / "cp.json").read_text())["finished"])
+
+        with self.assertRaises(CommandError):
+            self._call("--file", str(tmp / "chats.txt"), "--text", "hi", "--checkpoint", str(tmp / "cp.json"))
+
+    def test_streams_distinct_chat_ids_from_a_model(self):
+        tmp = self._tmpdir()
+        for chat_id in ("10", "11", "10", ""):
+            OutboxMessage.objects.create(method="sendMessage", payload={}, chat_id=chat_id)
+        client = _FakeClient()
+
+        with mock.patch("core.management.commands.broadcast.TelegramClient", return_value=client):
+            output = self._call(
+                "--model", "core.OutboxMessage", "--text", "hi", "--rate", "0", "--checkpoint", str(tmp / "cp.json")
+            )
+
+        self.assertIn("delivered=2", output)
+        self.assertEqual(sorted(client.sent), ["10", "11"])
+
+    def _tmpdir(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return pathlib.Path(directory.name)
@@ -0,0 +1,143 @@
+import gzip
+import io
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.capture import WebhookCapture, read_captures, wsgi_headers
+from core.dedup import MemoryUpdateCache
+from core.metrics import metrics
+from core.replay import Replayer
+
+
+def _message(update_id, chat_id, text="hi"):
+    return {"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": chat_id}, "text": text}}
+
+
+def _capture_line(payload, bot=None):
+    return json.dumps({"time": 0, "bot": bot, "headers": {}, "body": json.dumps(payload)}) + "\n"
+
+
+def test_capture_writes_redacted_lines_and_rotates():
+    with tempfile.TemporaryDirectory() as directory:
+        capture = WebhookCapture(directory, max_bytes=1, flush_interval=0.01)
+        headers = {"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": "topsecret"}
+        capture.record(b'{"update_id": 1}', headers, "shop")
+        deadline = time.monotonic() + 2
+        while not capture._written and time.monotonic() < deadline:
+            time.sleep(0.01)
+        capture.record(b'{"update_id": 2}', headers)
+        capture.close()
+
+        files = sorted(Path(directory).iterdir())
+        records = list(read_captures([directory]))
+
+    assert len(files) == 2
+    assert [record["body"] for record in records] == ['{"update_id": 1}', '{"update_id": 2}']
+    assert records[0]["bot"] == "shop"
+    assert records[0]["headers"]["X-Telegram-Bot-Api-Secret-Token"] == "<redacted>"
+    assert records[0]["headers"]["Content-Type"] == "application/json"
+
+
+def test_capture_drops_requests_when_the_queue_is_full():
+    with tempfile.TemporaryDirectory() as directory:
+        capture = WebhookCapture(directory, max_queue=1)
+        capture._pid = -1  # Pretend the writer runs so nothing drains the queue.
+        capture.record(b"{}", {})
+        capture.record(b"{}", {})
+
+    assert capture.dropped == 1
+    assert "\ntelegram_capture_dropped_total " in metrics.render()
+
+
+def test_read_captures_handles_gzip_and_skips_bad_lines():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "webhook.jsonl.gz"
+        with gzip.open(path, "wt", encoding="utf-8") as handle:
+            handle.write(_capture_line(_message(1, 1)) + "not json\n\n" + _capture_line(_message(2, 1)))
+
+        records = list(read_captures([str(path)]))
+
+    assert [json.loads(record["body"])["update_id"] for record in records] == [1, 2]
+
+
+def test_wsgi_headers_match_django_names():
+    environ = {"HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN": "s", "CONTENT_TYPE": "application/json", "PATH_INFO": "/"}
+
+    assert wsgi_headers(environ) == {"X-Telegram-Bot-Api-Secret-Token": "s", "Content-Type": "application/json"}
+
+
+def test_replayer_keeps_the_order_of_each_chat():
+    seen = {}
+    lock = threading.Lock()
+
+    def handle(payload, bot):
+        with lock:
+            seen.setdefault(payload["message"]["chat"]["id"], []).append(payload["update_id"])
+        return payload["update_id"] != 7
+
+    records = [{"bot": None, "body": json.dumps(_message(n, n % 3))} for n in range(30)]
+    records.append({"bot": None, "body": "[1]"})
+    stats = Replayer(handle, workers=4).run(records)
+
+    assert (stats.replayed, stats.failed, stats.unreadable) == (30, 1, 1)
+    assert all(ids == sorted(ids) for ids in seen.values())
+    assert sorted(sum(seen.values(), [])) == list(range(30))
+
+
+def test_replayer_stops_at_the_limit():
+    records = [{"bot": None, "body": json.dumps(_message(n, n))} for n in range(10)]
+
+    assert Replayer(lambda payload, bot: True, workers=2).run(records, limit=4).replayed == 4
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET="secret", TELEGRAM_BOT_TOKEN="token", TELEGRAM_INLINE_REPLIES=True)
+class CaptureWebhookTests(APITestCase):
+    def test_webhook_captures_authorized_requests(self):
+        capture = mock.Mock()
+        with mock.patch("core.webhook.capture", capture), mock.patch("core.webhook.update_cache", MemoryUpdateCache()):
+            self.client.post("/telegram/webhook/", data=_message(1, 1), format="json")
+            response = self.client.post(
+                "/telegram/webhook/", data=_message(2, 1), format="json", HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN="secret"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [(body, headers, bot)] = [c.args for c in capture.record.call_args_list]
+        self.assertEqual(json.loads(body)["update_id"], 2)
+        self.assertEqual(headers["X-Telegram-Bot-Api-Secret-Token"], "secret")
+        self.assertIsNone(bot)
+
+    def test_replay_command_sends_replies_to_the_stub(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "webhook.jsonl"
+            lines = [_capture_line(_message(n, n % 2)) for n in range(1, 6)]
+            path.write_text("".join(lines + lines[:1]), encoding="utf-8")
+            out = io.StringIO()
+
+            with mock.patch("core.webhook.update_cache", MemoryUpdateCache()), mock.patch(
+                "core.webhook.telegram_client"
+            ) as client:
+                call_command("replay", str(path), "--stub", "--workers", "2", stdout=out)
+
+        client.call.assert_not_called()
+        self.assertIn("replayed=6 failed=0 unreadable=0", out.getvalue())
+        # The repeated update is handled but recognized as a duplicate, so five greetings go out.
+        self.assertIn("stubbed calls: sendMessage=5", out.getvalue())
+
+    def test_replay_update_retries_are_not_deduplicated_after_a_failure(self):
+        stub = mock.Mock()
+        with mock.patch("core.webhook.update_cache", MemoryUpdateCache()), mock.patch(
+            "core.webhook.WebhookHandler._deliver_calls", side_effect=[False, True]
+        ):
+            from core.webhook import WebhookHandler
+
+            self.assertFalse(WebhookHandler.replay_update(_message(1, 1), client=stub))
+            self.assertTrue(WebhookHandler.replay_update(_message(1, 1), client=stub))
@@ -0,0 +1,182 @@
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core import webhook
+from core.coalesce import Coalescer
+from core.metrics import Registry
+
+
+class _Recorder:
+    def __init__(self):
+        self.sent = []
+        self.event = threading.Event()
+
+    def __call__(self, calls, bot):
+        self.sent.append((time.monotonic(), calls, bot))
+        self.event.set()
+        return True
+
+
+def _reply(text):
+    return [("sendMessage", {"chat_id": 1, "text": text})]
+
+
+def test_a_burst_gets_one_reply_to_the_latest_message():
+    recorder = _Recorder()
+    coalescer = Coalescer(recorder, window=0.05, max_delay=1)
+
+    for text in ("one", "two", "three"):
+        assert coalescer.offer(1, _reply(text))
+    assert recorder.event.wait(1)
+    time.sleep(0.1)
+
+    assert [calls for _, calls, _ in recorder.sent] == [_reply("three")]
+    assert coalescer.depth == 0
+
+
+def test_max_delay_caps_the_added_latency():
+    recorder = _Recorder()
+    coalescer = Coalescer(recorder, window=0.1, max_delay=0.2)
+
+    started = time.monotonic()
+    while not recorder.event.is_set() and time.monotonic() - started < 1:
+        coalescer.offer(1, _reply("typing"))
+        time.sleep(0.02)
+
+    assert recorder.sent
+    assert recorder.sent[0][0] - started < 0.35
+
+
+def test_chats_are_held_separately_and_bounded():
+    recorder = _Recorder()
+    coalescer = Coalescer(recorder, window=10, max_chats=2)
+
+    assert coalescer.offer(("shop", 1), _reply("a"), "shop")
+    assert coalescer.offer((None, 1), _reply("b"))
+    assert not coalescer.offer((None, 2), _reply("c"))
+    coalescer.flush()
+
+    assert sorted((bot or "", calls[0][1]["text"]) for _, calls, bot in recorder.sent) == [("", "b"), ("shop", "a")]
+
+
+def test_coalescing_is_exposed_as_metrics():
+    coalescer = Coalescer(mock.Mock(return_value=True), window=10, max_chats=1)
+    registry = Registry()
+    registry.gauge("telegram_coalesce_held_chats", lambda: coalescer.depth)
+
+    with mock.patch("core.coalesce.metrics", registry):
+        coalescer.offer(1, _reply("a"))
+        coalescer.offer(1, _reply("b"))
+        coalescer.offer(2, _reply("c"))
+        text = registry.render()
+    coalescer.flush()
+
+    assert "telegram_coalesce_held_chats 1" in text
+    assert "telegram_coalesced_replies_total 1" in text
+    assert "telegram_coalesce_overflow_total 1" in text
+
+
+def test_disabled_coalescer_holds_nothing():
+    assert not Coalescer(mock.Mock(), window=0).offer(1, _reply("a"))
+
+
+
+def test_a_failed_delivery_is_held_again():
+    outcomes = [False, True]
+    recorder = _Recorder()
+    coalescer = Coalescer(lambda calls, bot: outcomes.pop(0) and recorder(calls, bot), window=0.02, max_delay=1)
+
+    coalescer.offer(1, _reply("a"))
+
+    assert recorder.event.wait(1)
+    assert [calls for _, calls, _ in recorder.sent] == [_reply("a")]
+
+
+def test_held_replies_are_sent_at_exit_with_dispatch_enabled():
+    script = textwrap.dedent(
+        """
+        import django
+        django.setup()
+        from core import webhook
+
+        def call(method, payload):
+            print("SENT", payload["chat_id"], flush=True)
+            return True
+
+        webhook.telegram_client.call = call
+        status, _ = webhook.WebhookHandler.answer_update({"update_id": 1, "message": {"chat": {"id": 3}, "text": "hi"}})
+        print("HELD", status, webhook.coalescer.depth, flush=True)
+        """
+    )
+    env = {key: value for key, value in os.environ.items() if not key.startswith("TELEGRAM_")}
+    env.update(
+        DJANGO_SETTINGS_MODULE="telegrambot.settings",
+        TELEGRAM_BOT_TOKEN="token",
+        TELEGRAM_COALESCE_WINDOW="30",
+        TELEGRAM_DISPATCH_WORKERS="2",
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).resolve().parents[2],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+    assert result.stdout.split("\n")[:2] == ["HELD 200 1", "SENT 3"], result.stderr
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET="secret", TELEGRAM_INLINE_REPLIES=True)
+class CoalescingWebhookTests(APITestCase):
+    def test_messages_and_edits_of_a_chat_collapse_into_one_reply(self):
+        coalescer = Coalescer(webhook.coalescer.deliver, window=10)
+        updates = [
+            {"update_id": 1, "message": {"message_id": 5, "chat": {"id": 3}, "text": "hi"}},
+            {"update_id": 2, "edited_message": {"message_id": 5, "chat": {"id": 3}, "text": "hi!"}},
+        ]
+
+        with mock.patch("core.webhook.coalescer", coalescer), mock.patch(
+            "core.webhook.WebhookHandler._deliver_calls", return_value=True
+        ) as deliver:
+            responses = [
+                self.client.post(
+                    "/telegram/webhook/", data=update, format="json", HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN="secret"
+                )
+                for update in updates
+            ]
+            self.assertEqual(coalescer.depth, 1)
+            coalescer.flush()
+
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_200_OK] * 2)
+        self.assertEqual([response.content for response in responses], [b"", b""])
+        [(calls, bot)] = [c.args for c in deliver.call_args_list]
+        self.assertEqual(calls[0][1]["chat_id"], 3)
+        self.assertIsNone(bot)
+
+    @override_settings(TELEGRAM_OUTBOX=True, TELEGRAM_INLINE_REPLIES=False)
+    def test_replies_are_never_held_when_the_outbox_is_enabled(self):
+        coalescer = Coalescer(webhook.coalescer.deliver, window=10)
+        update = {"update_id": 3, "message": {"message_id": 6, "chat": {"id": 3}, "text": "hi"}}
+
+        with mock.patch("core.webhook.coalescer", coalescer), mock.patch(
+            "core.webhook.outbox_writer.append_many", return_value=True
+        ) as append:
+            response = self.client.post(
+                "/telegram/webhook/", data=update, format="json", HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN="secret"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(coalescer.depth, 0)
+        append.assert_called_once()
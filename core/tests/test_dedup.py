@@ -0,0 +1,62 @@
+import multiprocessing
+from unittest import mock
+
+from core.dedup import MemoryUpdateCache, SQLiteUpdateCache
+
+
+def test_memory_cache_flags_duplicates_until_forgotten():
+    cache = MemoryUpdateCache(size=10, ttl=60)
+
+    assert cache.seen(1) is False
+    assert cache.seen(1) is True
+    cache.forget(1)
+    assert cache.seen(1) is False
+
+
+def test_memory_cache_is_bounded_and_expires():
+    cache = MemoryUpdateCache(size=2, ttl=60)
+    for update_id in (1, 2, 3):
+        cache.seen(update_id)
+    assert cache.seen(1) is False
+
+    with mock.patch("core.dedup.time.monotonic", return_value=10**9):
+        assert cache.seen(3) is False
+
+
+def test_sqlite_cache_flags_duplicates_and_expires(tmp_path):
+    cache = SQLiteUpdateCache(tmp_path / "dedup.sqlite3", ttl=60)
+
+    assert cache.seen(5) is False
+    assert cache.seen(5) is True
+    with mock.patch("core.dedup.time.time", return_value=10**12):
+        assert cache.seen(5) is False
+    cache.forget(5)
+    assert cache.seen(5) is False
+
+
+def test_sqlite_cache_prunes_to_size(tmp_path):
+    cache = SQLiteUpdateCache(tmp_path / "dedup.sqlite3", size=3, ttl=60)
+    cache.prune_every = 5
+
+    for update_id in range(5):
+        cache.seen(update_id)
+
+    count = cache._connection().execute("SELECT COUNT(*) FROM seen_updates").fetchone()[0]
+    assert count == 3
+
+
+def _record(path, update_id, results):
+    results.put(SQLiteUpdateCache(path).seen(update_id))
+
+
+def test_sqlite_cache_is_shared_between_processes(tmp_path):
+    path = tmp_path / "dedup.sqlite3"
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_record, args=(path, 42, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    outcomes = sorted(results.get() for _ in workers)
+    assert outcomes == [False, True, True, True]
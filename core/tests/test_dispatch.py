@@ -0,0 +1,165 @@
+import threading
+import time
+from unittest import mock
+
+from core.dispatch import Dispatcher, TokenBucket
+from core.telegram import CircuitOpen, RetryAfter
+
+
+def _recording_client(delay: float = 0.0):
+    sent = []
+    lock = threading.Lock()
+
+    def request(method, payload):
+        time.sleep(delay)
+        with lock:
+            sent.append((payload["chat_id"], payload["text"]))
+
+    client = mock.Mock()
+    client.request.side_effect = request
+    return client, sent
+
+
+def test_submitted_calls_are_sent_in_background():
+    client, sent = _recording_client()
+    dispatcher = Dispatcher(client, workers=2, rate=0, chat_rate=0)
+
+    assert dispatcher.submit("sendMessage", {"chat_id": 1, "text": "hi"})
+    dispatcher.shutdown(timeout=2)
+
+    assert sent == [(1, "hi")]
+
+
+def test_submit_rejects_when_queue_is_full():
+    release = threading.Event()
+    client = mock.Mock()
+    client.request.side_effect = lambda *args: release.wait(2)
+    dispatcher = Dispatcher(client, workers=1, max_queue=1, rate=0, chat_rate=0)
+
+    results = [dispatcher.submit("sendMessage", {"chat_id": 1, "text": "hi"}) for _ in range(5)]
+    release.set()
+    dispatcher.shutdown(timeout=2)
+
+    assert results[0] is True
+    assert results.count(False) >= 3
+
+
+def test_shutdown_flushes_pending_calls_and_refuses_new_ones():
+    client, sent = _recording_client()
+    dispatcher = Dispatcher(client, workers=2, max_queue=100, rate=0, chat_rate=0)
+
+    for n in range(20):
+        dispatcher.submit("sendMessage", {"chat_id": n % 3, "text": str(n)})
+    dispatcher.shutdown(timeout=2)
+
+    assert len(sent) == 20
+    assert dispatcher.depth == 0
+    assert dispatcher.submit("sendMessage", {"chat_id": 1, "text": "late"}) is False
+
+
+def test_per_chat_order_is_preserved_across_workers():
+    client, sent = _recording_client(delay=0.002)
+    dispatcher = Dispatcher(client, workers=4, rate=0, chat_rate=0)
+
+    for n in range(30):
+        dispatcher.submit("sendMessage", {"chat_id": n % 3, "text": str(n)})
+    dispatcher.shutdown(timeout=5)
+
+    for chat in range(3):
+        assert [int(text) for chat_id, text in sent if chat_id == chat] == list(range(chat, 30, 3))
+
+
+def test_chats_are_served_round_robin():
+    client, sent = _recording_client()
+    dispatcher = Dispatcher(client, workers=1, rate=0, chat_rate=0)
+
+    with dispatcher._cond:
+        dispatcher._ensure_started()
+        for text in ("a1", "a2", "a3"):
+            dispatcher.submit("sendMessage", {"chat_id": "a", "text": text})
+        dispatcher.submit("sendMessage", {"chat_id": "b", "text": "b1"})
+    dispatcher.shutdown(timeout=2)
+
+    assert [text for _, text in sent][:2] == ["a1", "b1"]
+
+
+def test_chat_rate_spaces_messages_to_the_same_chat():
+    client, sent = _recording_client()
+    dispatcher = Dispatcher(client, workers=2, rate=0, chat_rate=20)
+
+    started = time.monotonic()
+    for n in range(3):
+        dispatcher.submit("sendMessage", {"chat_id": 1, "text": str(n)})
+    dispatcher.shutdown(timeout=2)
+
+    assert len(sent) == 3
+    assert time.monotonic() - started >= 0.1
+
+
+def test_calls_without_a_chat_are_not_paced_together():
+    client = mock.Mock()
+    dispatcher = Dispatcher(client, workers=4, rate=0, chat_rate=1)
+
+    started = time.monotonic()
+    for n in range(3):
+        dispatcher.submit("answerInlineQuery", {"inline_query_id": str(n), "results": []})
+    dispatcher.shutdown(timeout=2)
+
+    assert client.request.call_count == 3
+    assert time.monotonic() - started < 0.5
+
+
+def test_retry_after_requeues_the_call_at_the_head_of_its_chat():
+    attempts = []
+
+    def request(method, payload):
+        attempts.append(payload["text"])
+        if len(attempts) == 1:
+            raise RetryAfter(0.05)
+
+    client = mock.Mock()
+    client.request.side_effect = request
+    dispatcher = Dispatcher(client, workers=2, rate=0, chat_rate=0)
+
+    started = time.monotonic()
+    dispatcher.submit("sendMessage", {"chat_id": 1, "text": "first"})
+    dispatcher.submit("sendMessage", {"chat_id": 1, "text": "second"})
+    dispatcher.shutdown(timeout=2)
+
+    assert attempts == ["first", "first", "second"]
+    assert time.monotonic() - started >= 0.05
+
+
+def test_an_open_circuit_holds_back_only_its_own_calls():
+    sent = []
+
+    def request(method, payload):
+        if method == "sendPhoto":
+            raise CircuitOpen(method, 0.05)
+        sent.append((method, payload["chat_id"]))
+
+    client = mock.Mock()
+    client.request.side_effect = request
+    dispatcher = Dispatcher(client, workers=2, rate=0, chat_rate=0, circuit_retries=2)
+
+    started = time.monotonic()
+    dispatcher.submit("sendPhoto", {"chat_id": 1, "photo": "x"})
+    dispatcher.submit("sendMessage", {"chat_id": 1, "text": "after the photo"})
+    dispatcher.submit("sendMessage", {"chat_id": 2, "text": "other chat"})
+    while ("sendMessage", 2) not in sent and time.monotonic() - started < 2:
+        time.sleep(0.001)
+    other_chat_latency = time.monotonic() - started
+    dispatcher.shutdown(timeout=2)
+
+    assert other_chat_latency < 0.05
+    assert dispatcher._paused_until == 0.0
+    assert client.request.call_count == 5
+    assert sent[-1] == ("sendMessage", 1)
+
+
+def test_token_bucket_paces_to_its_rate():
+    bucket = TokenBucket(rate=10)
+
+    assert bucket.take(bucket._updated) == 0
+    assert abs(bucket.take(bucket._updated) - 0.1) < 1e-9
+    assert bucket.take(bucket._updated + 0.11) == 0
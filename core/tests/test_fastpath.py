@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import mock
+
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.dedup import MemoryUpdateCache
+from core.fastpath import WebhookFastPath
+
+SECRET = "dummy-test-secret"
+
+# Answers one update from a fresh webhook-only worker and reports which heavy packages it loaded.
+WEBHOOK_ONLY_WORKER = """
+import io, json, sys
+from telegrambot.wsgi import application
+body = json.dumps({"update_id": 1, "message": {"chat": {"id": 5}, "text": "hi"}}).encode()
+environ = {
+    "REQUEST_METHOD": "POST", "PATH_INFO": "/telegram/webhook/", "SERVER_NAME": "localhost", "SERVER_PORT": "80",
+    "CONTENT_TYPE": "application/json", "CONTENT_LENGTH": str(len(body)), "wsgi.input": io.BytesIO(body),
+    "wsgi.url_scheme": "http", "HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN": "%s",
+}
+status = []
+content = b"".join(application(environ, lambda line, headers: status.append(line)))
+heavy = ("rest_framework", "requests", "httpx", "django.contrib.admin", "django.contrib.auth.models")
+print(json.dumps([status[0], json.loads(content), [name for name in heavy if name in sys.modules]]))
+""" % SECRET
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET=SECRET, TELEGRAM_BOT_TOKEN="secret-token")
+class WebhookFastPathTests(SimpleTestCase):
+    def setUp(self):
+        self.inner = mock.Mock(return_value=[b"from-django"])
+        self.app = WebhookFastPath(self.inner)
+
+    def _call(self, data, *, path="/telegram/webhook/", secret=SECRET):
+        body = data if isinstance(data, str) else json.dumps(data)
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+        environ = RequestFactory().post(path, data=body, content_type="application/json", headers=headers).environ
+        start_response = mock.Mock()
+        content = b"".join(self.app(environ, start_response))
+        return start_response.call_args.args[0] if start_response.called else None, content
+
+    def test_other_paths_go_through_django(self):
+        status_line, content = self._call({}, path="/admin/")
+
+        self.assertEqual(content, b"from-django")
+        self.inner.assert_called_once()
+
+    def test_rejects_invalid_secret(self):
+        with mock.patch("core.webhook.telegram_client.call") as send_message:
+            status_line, _ = self._call({"message": {"chat": {"id": 1}}}, secret="wrong")
+
+        self.assertEqual(status_line, "403 Forbidden")
+        send_message.assert_not_called()
+
+    def test_invalid_json_returns_400(self):
+        status_line, _ = self._call("not-json")
+
+        self.assertEqual(status_line, "400 Bad Request")
+
+    def test_replies_to_messages(self):
+        payload = {"message": {"chat": {"id": 99}, "text": "hi", "from": {"first_name": "Ariana"}}}
+
+        with mock.patch("core.handlers.pick_greeting", return_value="Bonjour, Ariana!"), mock.patch(
+            "core.webhook.telegram_client.call", return_value=True
+        ) as send_message:
+            status_line, content = self._call(payload)
+
+        self.assertEqual((status_line, content), ("200 OK", b""))
+        send_message.assert_called_once_with("sendMessage", {"chat_id": 99, "text": "Bonjour, Ariana!"})
+        self.inner.assert_not_called()
+
+    @override_settings(TELEGRAM_INLINE_REPLIES=True)
+    def test_answers_inline_when_enabled(self):
+        with mock.patch("core.handlers.pick_greeting", return_value="Hola, there!"):
+            status_line, content = self._call({"message": {"chat": {"id": 7}, "text": "hi"}})
+
+        self.assertEqual(status_line, "200 OK")
+        self.assertEqual(json.loads(content), {"method": "sendMessage", "chat_id": 7, "text": "Hola, there!"})
+
+    @override_settings(TELEGRAM_DISPATCH_WORKERS=2)
+    def test_returns_503_and_forgets_update_when_queue_is_full(self):
+        payload = {"update_id": 601, "message": {"chat": {"id": 3}, "text": "hi"}}
+
+        with mock.patch("core.webhook.update_cache", MemoryUpdateCache()), mock.patch(
+            "core.webhook.dispatcher.submit", side_effect=[False, True]
+        ):
+            first, _ = self._call(payload)
+            second, _ = self._call(payload)
+            third, _ = self._call(payload)
+
+        self.assertEqual([first, second, third], ["503 Service Unavailable", "200 OK", "200 OK"])
+
+
+def test_webhook_only_profile_answers_without_loading_drf_admin_or_http_clients():
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE="telegrambot.settings",
+        TELEGRAM_WEBHOOK_ONLY="true",
+        TELEGRAM_WEBHOOK_FAST_PATH="false",
+        TELEGRAM_INLINE_REPLIES="true",
+        TELEGRAM_WEBHOOK_SECRET=SECRET,
+        TELEGRAM_DEDUP_BACKEND="",
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", WEBHOOK_ONLY_WORKER], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    status_line, body, loaded = json.loads(result.stdout)
+    assert status_line == "200 OK"
+    assert (body["method"], body["chat_id"]) == ("sendMessage", 5)
+    assert loaded == []
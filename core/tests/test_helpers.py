@@ -23,3 +23,28 @@ def test_pick_greeting_defaults_name_when_missing():
     rng = random.Random(1)
     greeting = helpers.pick_greeting(None, rng=rng)
     assert greeting.endswith(", there!")
+
+
+def test_extract_message_falls_back_to_edited_message():
+    payload = {"update_id": 1, "edited_message": {"chat": {"id": 3}}}
+    assert helpers.extract_message(payload) == {"chat": {"id": 3}}
+
+
+def test_extract_message_ignores_other_update_types():
+    assert helpers.extract_message({"callback_query": {"data": "x"}}) is None
+    assert helpers.extract_message(["not", "a", "dict"]) is None
+
+
+def test_get_chat_id_requires_chat_object():
+    assert helpers.get_chat_id({"chat": {"id": 8}}) == 8
+    assert helpers.get_chat_id({"chat": "8"}) is None
+
+
+def test_peek_update_reads_id_and_type_from_leading_keys():
+    assert helpers.peek_update(b'{"update_id": 123, "callback_query": {"id": "1"}}') == (123, "callback_query")
+    assert helpers.peek_update(b'{"update_id":7}') == (7, None)
+
+
+def test_peek_update_ignores_bodies_without_leading_update_id():
+    assert helpers.peek_update(b'{"message": {"text": "\\"update_id\\": 5"}}') == (None, None)
+    assert helpers.peek_update(b"not-json") == (None, None)
@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.handlers import router
+from core.inline import InlineAnswers, build_results, normalize_language, normalize_query
+from core.metrics import metrics
+
+
+def _titles(results):
+    return [result["title"] for result in results]
+
+
+def test_queries_are_normalized_before_caching():
+    assert normalize_query("  HOL   Ana ") == "hol Ana"
+    assert normalize_query("Ana  Maria") == "Ana Maria"
+    assert normalize_query("x" * 300) == "x" * 64
+    assert normalize_language("es-MX") == "es"
+    assert normalize_language("de") == ""
+    assert normalize_language(None) == ""
+
+
+def test_greeting_prefix_filters_and_the_rest_is_the_name():
+    assert _titles(build_results("bon Ana")) == ["Bonjour, Ana!"]
+    assert _titles(build_results("h")) == ["Hello, there!", "Hola, there!"]
+    assert _titles(build_results("Ana")) == ["Hello, Ana!", "Hola, Ana!", "Bonjour, Ana!"]
+
+
+def test_the_users_language_comes_first():
+    assert _titles(build_results("Ana", "fr")) == ["Bonjour, Ana!", "Hello, Ana!", "Hola, Ana!"]
+
+
+def test_greeting_prefixes_are_precomputed_and_other_queries_cached():
+    answers = InlineAnswers(size=2)
+
+    with mock.patch("core.inline.build_results", wraps=build_results) as build:
+        assert answers.results("HOL", "es-ES") is answers.results("hol", "es")
+        assert build.call_count == 0
+
+        first = answers.results("Ana", "en")
+        assert answers.results(" Ana ", "en-GB") is first
+        assert build.call_count == 1
+
+    text = metrics.render()
+    for result in ("precomputed", "hit", "miss"):
+        assert f'telegram_inline_cache_total{{result="{result}"}} ' in text
+
+
+def test_lru_evicts_the_least_recently_used_answer():
+    answers = InlineAnswers(size=2)
+    ana = answers.results("Ana")
+    answers.results("Bea")
+    answers.results("Ana")
+    answers.results("Cy")
+
+    with mock.patch("core.inline.build_results", wraps=build_results) as build:
+        assert answers.results("Ana") is ana
+        answers.results("Bea")
+        assert build.call_count == 1
+
+
+@override_settings(TELEGRAM_INLINE_CACHE_TIME=42)
+def test_inline_query_is_answered_with_the_cache_settings():
+    update = {"update_id": 1, "inline_query": {"id": "q1", "from": {"id": 7, "language_code": "es"}, "query": "Ana"}}
+
+    [(method, payload)] = router.route(update)
+
+    assert method == "answerInlineQuery"
+    assert payload["inline_query_id"] == "q1"
+    assert payload["results"][0]["input_message_content"] == {"message_text": "Hola, Ana!"}
+    assert payload["cache_time"] == 42
+    assert payload["is_personal"] is True
+
+
+def test_an_explicit_cache_time_overrides_the_setting():
+    _, payload = InlineAnswers(cache_time=5).answer({"id": "q1", "query": "Ana"})
+
+    assert payload["cache_time"] == 5
+
+
+@override_settings(
+    TELEGRAM_WEBHOOK_SECRET="secret",
+    TELEGRAM_INLINE_REPLIES=True,
+    TELEGRAM_ALLOWED_UPDATES=["message", "inline_query"],
+)
+class InlineQueryWebhookTests(APITestCase):
+    def test_inline_query_is_answered_in_the_webhook_response(self):
+        update = {"update_id": 10, "inline_query": {"id": "q1", "from": {"id": 7}, "query": "bon"}}
+
+        response = self.client.post(
+            "/telegram/webhook/", data=update, format="json", HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN="secret"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["method"], "answerInlineQuery")
+        self.assertEqual([result["id"] for result in response.json()["results"]], ["bonjour"])
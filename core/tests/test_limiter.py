@@ -0,0 +1,60 @@
+from unittest import mock
+
+from core.limiter import AdaptiveLimiter
+
+
+def _finish(limiter, latency, clock):
+    with limiter.admit() as admitted:
+        assert admitted
+        clock.return_value += latency
+
+
+def test_sheds_requests_over_the_limit_and_releases_slots():
+    limiter = AdaptiveLimiter(2)
+
+    with limiter.admit() as first, limiter.admit() as second, limiter.admit() as third:
+        assert (first, second, third) == (True, True, False)
+        assert limiter.in_flight == 2
+
+    assert limiter.in_flight == 0
+
+
+def test_slow_requests_cut_the_limit_once_per_target_window_down_to_the_floor():
+    limiter = AdaptiveLimiter(10, min_limit=3, target_latency=1.0, backoff=0.5)
+
+    with mock.patch("core.limiter.time.monotonic", return_value=100.0) as clock:
+        _finish(limiter, 2.0, clock)
+        assert limiter.limit == 5
+        clock.return_value -= 2.0
+        _finish(limiter, 1.5, clock)
+        assert limiter.limit == 5
+
+        for _ in range(3):
+            _finish(limiter, 2.0, clock)
+        assert limiter.limit == 3
+
+
+def test_fast_requests_grow_the_limit_only_while_it_is_in_use():
+    limiter = AdaptiveLimiter(10, target_latency=1.0)
+    limiter.limit = 4.0
+
+    with mock.patch("core.limiter.time.monotonic", return_value=0.0) as clock:
+        _finish(limiter, 0.1, clock)
+        assert limiter.limit == 4.0
+
+        with limiter.admit():
+            _finish(limiter, 0.1, clock)
+        assert limiter.limit == 4.25
+
+    limiter.limit = 10.0
+    with limiter.admit(), limiter.admit(), limiter.admit(), limiter.admit(), limiter.admit():
+        pass
+    assert limiter.limit == 10.0
+
+
+def test_zero_max_limit_admits_everything():
+    limiter = AdaptiveLimiter(0)
+
+    with limiter.admit() as admitted:
+        assert admitted
+        assert limiter.in_flight == 0
@@ -0,0 +1,145 @@
+import io
+import json
+import logging
+import logging.config
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core.log import QueueLogHandler, RateLimiter, log_context, update_fields
+from core.metrics import metrics
+from core.webhook import WebhookHandler
+
+
+def _logger(handler: QueueLogHandler, name: str = "core.tests.log") -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def _lines(stream: io.StringIO):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_are_json_with_the_update_and_chat_ids():
+    stream = io.StringIO()
+    handler = QueueLogHandler(stream)
+    logger = _logger(handler)
+
+    with log_context(update_id=7, chat_id=42):
+        logger.warning("Failed to send %s to chat %s", "sendMessage", 42)
+    logger.info("outside")
+    handler.close()
+
+    inside, outside = _lines(stream)
+    assert inside["message"] == "Failed to send sendMessage to chat 42"
+    assert (inside["level"], inside["update_id"], inside["chat_id"]) == ("WARNING", 7, 42)
+    assert "update_id" not in outside
+
+
+def test_payloads_are_redacted_truncated_and_tokens_masked():
+    stream = io.StringIO()
+    handler = QueueLogHandler(stream, max_length=80, redact_keys=["text"])
+    logger = _logger(handler)
+
+    logger.info("Payload: %s", {"chat": {"id": 1}, "text": "secret words"})
+    logger.info("Calling https://api.telegram.org/bot123456:%s/sendMessage", "A" * 35)
+    logger.info("%s", "x" * 100)
+    handler.close()
+
+    payload, url, long = (line["message"] for line in _lines(stream))
+    assert payload == 'Payload: {"chat": {"id": 1}, "text": "<redacted>"}'
+    assert url == "Calling https://api.telegram.org/bot<token>/sendMessage"
+    assert long == "x" * 80 + "... (20 more characters)"
+
+
+def test_repeated_errors_are_rate_limited_per_message():
+    stream = io.StringIO()
+    handler = QueueLogHandler(stream, rate=2, interval=60)
+    logger = _logger(handler)
+
+    with mock.patch("core.log.time.monotonic", return_value=100.0):
+        for chat_id in range(5):
+            logger.error("Failed to send to chat %s", chat_id)
+        logger.error("Another failure")
+        logger.info("Info is never limited")
+        logger.info("Info is never limited")
+    with mock.patch("core.log.time.monotonic", return_value=161.0):
+        logger.error("Failed to send to chat %s", 9)
+    handler.close()
+
+    messages = [(line["message"], line.get("suppressed")) for line in _lines(stream)]
+    assert messages == [
+        ("Failed to send to chat 0", None),
+        ("Failed to send to chat 1", None),
+        ("Another failure", None),
+        ("Info is never limited", None),
+        ("Info is never limited", None),
+        ("Failed to send to chat 9", 3),
+    ]
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = QueueLogHandler(io.StringIO(), max_queue=1)
+    logger = _logger(handler)
+
+    with mock.patch.object(handler, "_ensure_started"):
+        for n in range(3):
+            logger.info("record %s", n)
+
+    assert handler.dropped == 2
+    assert handler.queue.get_nowait().getMessage() == "record 0"
+    text = metrics.render()
+    assert "# TYPE log_records_dropped_total counter" in text
+    assert "\nlog_records_dropped_total " in text
+
+
+def test_rate_limiter_forgets_idle_keys():
+    limiter = RateLimiter(rate=1, interval=10)
+    limiter.max_keys = 2
+    limiter.allow(("a",), now=0)
+    limiter.allow(("b",), now=0)
+
+    assert limiter.allow(("c",), now=20) == (True, 0)
+    assert set(limiter._windows) == {("c",)}
+
+
+def test_logging_setting_builds_the_handler_with_its_options():
+    config = {**settings.LOGGING, "loggers": {"core.tests.config": {"handlers": ["console"], "level": "INFO"}}}
+    config["handlers"] = {"console": {**settings.LOGGING["handlers"]["console"], "max_queue": 7}}
+    with mock.patch("sys.stderr", io.StringIO()) as stderr:
+        logging.config.dictConfig(config)
+    [handler] = logging.getLogger("core.tests.config").handlers
+
+    logging.getLogger("core.tests.config").warning("configured")
+    handler.close()
+
+    assert handler.max_queue == 7
+    assert _lines(stderr)[0]["message"] == "configured"
+
+
+def test_update_fields_finds_the_chat_of_any_update():
+    assert update_fields({"update_id": 1, "message": {"chat": {"id": 5}}}) == {"update_id": 1, "chat_id": 5}
+    assert update_fields({"update_id": 2, "callback_query": {"message": {"chat": {"id": 6}}}})["chat_id"] == 6
+    assert update_fields({"update_id": 3, "inline_query": {"id": "q"}}) == {"update_id": 3}
+
+
+class WebhookLogContextTests(SimpleTestCase):
+    def test_handler_logs_carry_the_update_being_answered(self):
+        stream = io.StringIO()
+        handler = QueueLogHandler(stream)
+        logger = _logger(handler, "core.tests.handler")
+
+        def route(payload):
+            logger.warning("routing")
+            return []
+
+        with mock.patch("core.webhook.WebhookHandler._route", side_effect=route):
+            WebhookHandler.answer_update({"update_id": 11, "message": {"chat": {"id": 3}, "text": "hi"}})
+        handler.close()
+
+        [line] = _lines(stream)
+        self.assertEqual((line["update_id"], line["chat_id"]), (11, 3))
@@ -0,0 +1,159 @@
+import email
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from core.handlers import router
+from core.media import FileIdCache, MultipartBody, file_id_of, local, local_file, media_call
+from core.metrics import metrics
+from core.models import MediaFile
+from core.telegram import TelegramClient, TelegramError
+from core.webhook import WebhookHandler
+
+
+def _response(data: dict) -> mock.Mock:
+    response = mock.Mock()
+    response.json.return_value = data
+    return response
+
+
+def _sent(file_id: str) -> mock.Mock:
+    return _response({"ok": True, "result": {"message_id": 1, "sticker": {"file_id": file_id}}})
+
+
+class MediaTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        (self.root / "stickers").mkdir()
+        (self.root / "stickers" / "wave.webp").write_bytes(b"RIFF" + b"\x00" * 5000)
+        settings_override = override_settings(TELEGRAM_MEDIA_ROOT=str(self.root))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class UploadOnceTests(MediaTestCase):
+    def _client(self, session, media=None):
+        return TelegramClient("42:token", session=session, media=media or FileIdCache())
+
+    def test_first_send_uploads_and_later_sends_reuse_the_file_id(self):
+        session = mock.Mock()
+        session.post.side_effect = [_sent("F1"), _sent("F1")]
+        client = self._client(session)
+
+        self.assertTrue(client.send_sticker(5, local("stickers/wave.webp")))
+        self.assertTrue(client.send_sticker(6, local("stickers/wave.webp")))
+
+        upload, reuse = session.post.call_args_list
+        self.assertIsInstance(upload.kwargs["data"], MultipartBody)
+        self.assertTrue(upload.kwargs["headers"]["Content-Type"].startswith("multipart/form-data; boundary="))
+        self.assertEqual(reuse.kwargs["json"], {"chat_id": 6, "sticker": "F1"})
+        self.assertEqual(MediaFile.objects.get().file_id, "F1")
+        self.assertIn('telegram_media_uploaded_bytes_total{method="sendSticker"} ', metrics.render())
+
+    def test_workers_share_file_ids_through_the_database(self):
+        first, second = mock.Mock(), mock.Mock()
+        first.post.return_value = _sent("F1")
+        second.post.return_value = _sent("F1")
+
+        self._client(first).send_sticker(5, local("stickers/wave.webp"))
+        self._client(second).send_sticker(5, local("stickers/wave.webp"))
+
+        self.assertEqual(second.post.call_args.kwargs["json"]["sticker"], "F1")
+
+    def test_file_ids_are_kept_per_bot(self):
+        session = mock.Mock()
+        session.post.side_effect = [_sent("F1"), _sent("F2")]
+        media = FileIdCache()
+
+        TelegramClient("42:a", session=session, media=media).send_sticker(5, local("stickers/wave.webp"))
+        TelegramClient("43:b", session=session, media=media).send_sticker(5, local("stickers/wave.webp"))
+
+        self.assertIn("data", session.post.call_args.kwargs)
+        self.assertEqual(sorted(MediaFile.objects.values_list("bot_id", "file_id")), [("42", "F1"), ("43", "F2")])
+
+    def test_stale_file_id_is_uploaded_again(self):
+        session = mock.Mock()
+        session.post.side_effect = [
+            _response({"ok": False, "error_code": 400, "description": "Bad Request: wrong file identifier"}),
+            _sent("F2"),
+        ]
+        media = FileIdCache()
+        media.put("42:token", media.digest(self.root / "stickers" / "wave.webp"), "F1")
+
+        self._client(session, media).request("sendSticker", {"chat_id": 5, "sticker": local("stickers/wave.webp")})
+
+        self.assertEqual(session.post.call_args_list[0].kwargs["json"]["sticker"], "F1")
+        self.assertIsInstance(session.post.call_args_list[1].kwargs["data"], MultipartBody)
+        self.assertEqual(MediaFile.objects.get().file_id, "F2")
+
+    def test_other_errors_are_not_treated_as_stale(self):
+        session = mock.Mock()
+        session.post.return_value = _response({"ok": False, "error_code": 403, "description": "Forbidden"})
+        media = FileIdCache()
+        media.put("42:token", media.digest(self.root / "stickers" / "wave.webp"), "F1")
+
+        with self.assertRaises(TelegramError):
+            self._client(session, media).request("sendSticker", {"chat_id": 5, "sticker": local("stickers/wave.webp")})
+        self.assertEqual(session.post.call_count, 1)
+
+    def test_local_files_must_stay_under_the_media_root(self):
+        with self.assertRaises(ValueError):
+            local_file("sendPhoto", {"photo": local("../secret.png")})
+        self.assertIsNone(local_file("sendPhoto", {"photo": "AgACAgQAAx"}))
+
+
+@override_settings(TELEGRAM_INLINE_REPLIES=True, TELEGRAM_BOT_TOKEN="42:token")
+class InlineMediaTests(MediaTestCase):
+    def test_inline_reply_uses_a_known_file_id_and_skips_unknown_files(self):
+        call = media_call(5, "stickers/wave.webp")
+        media = FileIdCache()
+
+        with mock.patch("core.webhook.file_ids", media):
+            self.assertIsNone(WebhookHandler._inline_call([call]))
+            media.put("42:token", media.digest(self.root / "stickers" / "wave.webp"), "F1")
+            self.assertEqual(WebhookHandler._inline_call([call]), ("sendSticker", {"chat_id": 5, "sticker": "F1"}))
+
+
+def test_multipart_body_streams_fields_and_file(tmp_path):
+    path = tmp_path / "hello.ogg"
+    path.write_bytes(b"OggS" * 1000)
+
+    with MultipartBody({"chat_id": 5, "reply_markup": {"k": 1}}, "voice", path) as body:
+        chunks = iter(lambda: body.read(1000), b"")
+        data = b"".join(chunks)
+        content_type = body.content_type
+
+    assert len(data) == len(body)
+    message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + data)
+    parts = {part.get_param("name", header="content-disposition"): part for part in message.get_payload()}
+    assert parts["chat_id"].get_payload() == "5"
+    assert parts["reply_markup"].get_payload() == '{"k": 1}'
+    assert parts["voice"].get_filename() == "hello.ogg"
+    assert parts["voice"].get_payload(decode=True) == b"OggS" * 1000
+
+
+def test_file_id_of_takes_the_largest_photo():
+    result = {"photo": [{"file_id": "small"}, {"file_id": "large"}]}
+
+    assert file_id_of(result, "photo") == "large"
+    assert file_id_of({"document": {"file_id": "D"}}, "animation") == "D"
+    assert file_id_of(True, "photo") is None
+
+
+def test_media_call_picks_the_method_by_extension():
+    assert media_call(1, "a.ogg") == ("sendVoice", {"chat_id": 1, "voice": "local:a.ogg"})
+    assert media_call(1, "a.JPG")[0] == "sendPhoto"
+    assert media_call(1, "a.pdf")[0] == "sendDocument"
+
+
+@override_settings(TELEGRAM_GREETING_MEDIA=["stickers/wave.webp"])
+def test_greeting_is_followed_by_media():
+    calls = router.route({"update_id": 1, "message": {"chat": {"id": 5}, "text": "hi"}})
+
+    assert [method for method, _ in calls] == ["sendMessage", "sendSticker"]
+    assert calls[1][1] == {"chat_id": 5, "sticker": "local:stickers/wave.webp"}
@@ -0,0 +1,160 @@
+import json
+import os
+import re
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core import metrics as metrics_module
+from core.metrics import METRICS, Registry
+from core.telegram import RetryAfter, TelegramClient
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        registry.observe("telegram_parse_seconds", value)
+
+    text = registry.render()
+
+    assert 'telegram_parse_seconds_bucket{le="0.1"} 1' in text
+    assert 'telegram_parse_seconds_bucket{le="1.0"} 2' in text
+    assert 'telegram_parse_seconds_bucket{le="+Inf"} 3' in text
+    assert "telegram_parse_seconds_count 3" in text
+    assert "telegram_parse_seconds_sum 5.55" in text
+
+
+def test_counters_and_gauges_render_with_labels():
+    registry = Registry()
+    registry.inc("telegram_updates_total", (("type", "message"),))
+    registry.inc("telegram_updates_total", (("type", "message"),))
+    registry.inc("telegram_updates_total", (("type", 'odd"type'),))
+    registry.gauge("telegram_dispatch_queue_depth", lambda: 7)
+
+    text = registry.render()
+
+    assert "# TYPE telegram_updates_total counter" in text
+    assert 'telegram_updates_total{type="message"} 2' in text
+    assert 'telegram_updates_total{type="odd\\"type"} 1' in text
+    assert "telegram_dispatch_queue_depth 7" in text
+
+
+def test_series_missing_from_the_catalogue_are_still_rendered():
+    registry = Registry()
+    registry.inc("telegram_new_thing_total", (("kind", "a"),))
+    registry.observe("telegram_new_seconds", 0.2)
+    registry.gauge("telegram_new_depth", lambda: 3)
+
+    text = registry.render()
+
+    assert '# TYPE telegram_new_thing_total counter\ntelegram_new_thing_total{kind="a"} 1' in text
+    assert "telegram_new_seconds_count 1" in text
+    assert "# TYPE telegram_new_depth gauge\ntelegram_new_depth 3" in text
+
+
+def test_every_recorded_metric_is_documented():
+    used = set()
+    for path in Path(metrics_module.__file__).parent.rglob("*.py"):
+        if "tests" not in path.parts:
+            used.update(re.findall(r'metrics\.(?:inc|observe|timer|gauge)\(\s*"([a-z_]+)"', path.read_text()))
+
+    assert "telegram_webhook_seconds" in used
+    assert used - METRICS.keys() == set()
+
+
+def test_shared_directory_merges_worker_snapshots(tmp_path):
+    registry = Registry()
+    registry._directory = str(tmp_path)
+    registry.inc("telegram_webhook_rejected_total")
+    registry.gauge("telegram_dispatch_queue_depth", lambda: 2)
+    sibling = {
+        "pid": os.getppid(),
+        "counters": [["telegram_webhook_rejected_total", [], 3]],
+        "histograms": [],
+        "gauges": {"telegram_dispatch_queue_depth": 5},
+    }
+    exited = dict(sibling, pid=2**22 + 1)
+    (tmp_path / "sibling.json").write_text(json.dumps(sibling))
+    (tmp_path / "exited.json").write_text(json.dumps(exited))
+
+    text = registry.render()
+
+    assert "telegram_webhook_rejected_total 7" in text
+    assert "telegram_dispatch_queue_depth 7" in text
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+
+
+def test_client_records_latency_failures_and_throttling():
+    client = TelegramClient("TOKEN", session=mock.Mock())
+    registry = Registry()
+
+    with mock.patch("core.telegram.metrics", registry):
+        client.session.post.return_value.json.return_value = {"ok": True, "result": True}
+        client.request("sendMessage", {})
+        client.session.post.return_value.json.return_value = {"ok": False, "parameters": {"retry_after": 1}}
+        try:
+            client.request("sendMessage", {})
+        except RetryAfter:
+            pass
+        client.session.post.side_effect = ConnectionError
+        client._post("getMe", {})
+
+    text = registry.render()
+    assert 'telegram_api_seconds_count{method="sendMessage"} 2' in text
+    assert 'telegram_api_throttled_total{method="sendMessage"} 1' in text
+    assert 'telegram_api_failures_total{method="getMe"} 1' in text
+
+
+@override_settings(
+    TELEGRAM_WEBHOOK_SECRET="secret", TELEGRAM_ALLOWED_UPDATES=["message"], TELEGRAM_METRICS_TOKEN="scrape-token"
+)
+class MetricsEndpointTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+        patchers = [
+            mock.patch(target, self.registry)
+            for target in ("core.views.metrics", "core.webhook.metrics", "core.telegram.metrics")
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.registry.gauge("telegram_dispatch_queue_depth", lambda: 0)
+
+    def _post(self, payload, secret="secret"):
+        return self.client.post(
+            "/telegram/webhook/",
+            data=payload,
+            content_type="application/json",
+            HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=secret,
+        )
+
+    def test_webhook_traffic_is_exposed_as_prometheus_text(self):
+        with mock.patch("core.webhook.telegram_client.call", return_value=True):
+            self._post({"update_id": 901, "message": {"chat": {"id": 1}, "from": {"first_name": "A"}}})
+        self._post({"update_id": 902, "channel_post": {"chat": {"id": 2}}})
+        self._post({"update_id": 903}, secret="wrong")
+
+        response = self.client.get("/telegram/metrics/", HTTP_AUTHORIZATION="Bearer scrape-token")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = response.content.decode()
+        self.assertIn('telegram_updates_total{type="message"} 1', text)
+        self.assertIn('telegram_updates_total{type="channel_post"} 1', text)
+        self.assertIn("telegram_webhook_rejected_total 1", text)
+        self.assertIn("telegram_webhook_seconds_count 3", text)
+        self.assertIn("telegram_parse_seconds_count 1", text)
+        self.assertIn("telegram_dispatch_queue_depth 0", text)
+
+    def test_endpoint_requires_the_bearer_token(self):
+        self.assertEqual(self.client.get("/telegram/metrics/").status_code, 401)
+        wrong = self.client.get("/telegram/metrics/", HTTP_AUTHORIZATION="Bearer guess")
+        self.assertEqual(wrong.status_code, 401)
+        self.assertEqual(wrong["WWW-Authenticate"], "Bearer")
+
+    @override_settings(TELEGRAM_METRICS_TOKEN="")
+    def test_endpoint_is_off_without_a_token(self):
+        response = self.client.get("/telegram/metrics/", HTTP_AUTHORIZATION="Bearer ")
+
+        self.assertEqual(response.status_code, 404)
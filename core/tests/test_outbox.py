@@ -0,0 +1,147 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from core.models import OutboxMessage
+from core.outbox import OutboxDrainer, OutboxWriter
+from core.telegram import CircuitOpen, RetryAfter, TelegramError
+
+
+class OutboxWriterTests(TransactionTestCase):
+    def test_concurrent_appends_are_committed_before_returning(self):
+        writer = OutboxWriter(max_batch=16)
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda i: writer.append("sendMessage", {"chat_id": i % 3}), range(40)))
+
+        self.assertTrue(all(results))
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.Status.PENDING).count(), 40)
+        self.assertEqual(set(OutboxMessage.objects.values_list("chat_id", flat=True)), {"0", "1", "2"})
+
+    def test_append_reports_failed_commit(self):
+        writer = OutboxWriter()
+
+        with mock.patch.object(OutboxMessage.objects, "bulk_create", side_effect=RuntimeError("disk full")):
+            self.assertFalse(writer.append("sendMessage", {"chat_id": 1, "text": "hi"}))
+
+    def test_a_timed_out_append_is_withdrawn_before_it_is_written(self):
+        writer = OutboxWriter(timeout=0.01)
+
+        with mock.patch.object(writer, "_ensure_started"):
+            self.assertFalse(writer.append("sendMessage", {"chat_id": 1, "text": "hi"}))
+
+        self.assertEqual(writer._pending, [])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_an_append_the_writer_took_waits_for_its_commit(self):
+        writer = OutboxWriter(timeout=0.05)
+        writer._ensure_started()
+        bulk_create = OutboxMessage.objects.bulk_create
+
+        def slow_bulk_create(messages):
+            time.sleep(0.3)
+            return bulk_create(messages)
+
+        with mock.patch.object(OutboxMessage.objects, "bulk_create", side_effect=slow_bulk_create):
+            self.assertTrue(writer.append("sendMessage", {"chat_id": 1, "text": "hi"}))
+
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+class OutboxDrainerTests(TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.drainer = OutboxDrainer(self.client, rate=0, backoff=10)
+        self.executor = ThreadPoolExecutor(4)
+        self.addCleanup(self.executor.shutdown)
+
+    def _store(self, chat_id, text):
+        payload = {"chat_id": chat_id, "text": text}
+        return OutboxMessage.objects.create(method="sendMessage", chat_id=str(chat_id), payload=payload)
+
+    def test_sends_pending_rows_and_marks_them_done(self):
+        rows = [self._store(1, "a"), self._store(2, "b"), self._store(1, "c")]
+
+        self.assertEqual(self.drainer.drain_once(self.executor), 3)
+
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.Status.DONE, sent_at__isnull=False).count(), 3)
+        chat_one = [c.args[1]["text"] for c in self.client.request.call_args_list if c.args[1]["chat_id"] == 1]
+        self.assertEqual(chat_one, ["a", "c"])
+        self.assertEqual(self.drainer.drain_once(self.executor), 0)
+        self.assertEqual(len(rows), self.client.request.call_count)
+
+    def test_calls_to_one_chat_are_paced(self):
+        drainer = OutboxDrainer(self.client, rate=0, chat_rate=10)
+        self._store(1, "a")
+        second = self._store(1, "b")
+        self._store(2, "c")
+
+        drainer.drain_once(self.executor)
+
+        second.refresh_from_db()
+        self.assertEqual([c.args[1]["text"] for c in self.client.request.call_args_list], ["a", "c"])
+        self.assertEqual(second.status, OutboxMessage.Status.PENDING)
+        self.assertGreater(second.next_attempt_at, timezone.now())
+        self.assertEqual(drainer.drain_once(self.executor), 0)
+
+        time.sleep(0.11)
+        self.assertEqual(drainer.drain_once(self.executor), 1)
+        self.assertEqual(self.client.request.call_args.args[1]["text"], "b")
+
+    def test_failure_defers_the_rest_of_the_chat_with_backoff(self):
+        first, second, other = self._store(1, "a"), self._store(1, "b"), self._store(2, "c")
+
+        def request(method, payload):
+            if payload["text"] == "a":
+                raise ConnectionError()
+
+        self.client.request.side_effect = request
+
+        self.drainer.drain_once(self.executor)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (OutboxMessage.Status.PENDING, 1))
+        self.assertGreater(first.next_attempt_at, timezone.now() + timedelta(seconds=9))
+        self.assertEqual(second.status, OutboxMessage.Status.PENDING)
+        self.assertEqual(second.next_attempt_at, first.next_attempt_at)
+        self.assertEqual(other.status, OutboxMessage.Status.DONE)
+        self.assertEqual(self.drainer.drain_once(self.executor), 0)
+
+    def test_retry_after_is_honoured(self):
+        row = self._store(1, "a")
+        self.client.request.side_effect = RetryAfter(42)
+
+        self.drainer.drain_once(self.executor)
+
+        row.refresh_from_db()
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=40))
+
+    def test_throttling_and_open_circuits_do_not_use_up_attempts(self):
+        row = OutboxMessage.objects.create(method="sendMessage", chat_id="1", payload={"chat_id": 1}, attempts=9)
+
+        for exc in (RetryAfter(1), CircuitOpen("sendMessage", 1)):
+            self.client.request.side_effect = exc
+            OutboxMessage.objects.filter(id=row.id).update(next_attempt_at=timezone.now())
+            self.drainer.drain_once(self.executor)
+
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (OutboxMessage.Status.PENDING, 9))
+        self.assertIn("Circuit for sendMessage is open", row.last_error)
+
+    def test_permanent_errors_and_exhausted_attempts_fail_the_row(self):
+        blocked = self._store(1, "a")
+        flaky = OutboxMessage.objects.create(method="sendMessage", chat_id="2", payload={"chat_id": 2}, attempts=9)
+        self.client.request.side_effect = [TelegramError({"ok": False, "error_code": 403}), ConnectionError()]
+
+        with ThreadPoolExecutor(1) as executor:
+            self.drainer.drain_once(executor)
+
+        blocked.refresh_from_db()
+        flaky.refresh_from_db()
+        self.assertEqual(blocked.status, OutboxMessage.Status.FAILED)
+        self.assertEqual((flaky.status, flaky.attempts), (OutboxMessage.Status.FAILED, 10))
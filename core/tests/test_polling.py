@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+
+from core.polling import UpdatePoller, chat_key
+from core.update import Update
+
+
+def _update(update_id, chat_id):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": str(update_id)}}
+
+
+class _FakeClient:
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.offsets = []
+
+    def get_updates(self, offset, *, timeout, limit, allowed_updates=None):
+        self.offsets.append(offset)
+        self.allowed_updates = allowed_updates
+        if self.batches:
+            return self.batches.pop(0)
+        time.sleep(0.01)
+        return []
+
+
+def _run(batches, handle, expected):
+    client = _FakeClient(batches)
+    poller = UpdatePoller(client, handle, retry_delay=0.01)
+    worker = threading.Thread(target=poller.run)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while not expected() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    poller.stop()
+    worker.join(5)
+    return client, poller
+
+
+class UpdatePollerTests(SimpleTestCase):
+    def test_processes_batches_and_advances_offset(self):
+        handled = []
+        client, poller = _run(
+            [[_update(1, 10), _update(2, 11)], [_update(3, 10)]],
+            lambda update: handled.append(update["update_id"]) or True,
+            expected=lambda: len(handled) == 3,
+        )
+
+        self.assertEqual(sorted(handled), [1, 2, 3])
+        self.assertEqual(client.offsets[:3], [None, 3, 4])
+        self.assertEqual(poller.offset, 4)
+
+    def test_keeps_per_chat_order_within_a_batch(self):
+        handled = []
+        lock = threading.Lock()
+
+        def handle(update):
+            time.sleep(0.001 * (update["update_id"] % 3))
+            with lock:
+                handled.append(update)
+            return True
+
+        batch = [_update(n, n % 4) for n in range(1, 41)]
+        poller = UpdatePoller(mock.Mock(), handle, workers=8)
+        with ThreadPoolExecutor(8) as executor:
+            poller.process_batch(batch, executor)
+
+        for chat in range(4):
+            ids = [update["update_id"] for update in handled if update["message"]["chat"]["id"] == chat]
+            self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(handled), 40)
+
+    def test_asks_getupdates_for_the_allowed_update_types(self):
+        client = _FakeClient([])
+        poller = UpdatePoller(client, mock.Mock(), allowed_updates=["message", "inline_query"])
+        worker = threading.Thread(target=poller.run)
+        worker.start()
+        deadline = time.monotonic() + 5
+        while not client.offsets and time.monotonic() < deadline:
+            time.sleep(0.01)
+        poller.stop()
+        worker.join(5)
+
+        self.assertEqual(client.allowed_updates, ["message", "inline_query"])
+
+    @override_settings(TELEGRAM_BOT_TOKEN="token", TELEGRAM_ALLOWED_UPDATES=["message"])
+    def test_process_update_skips_update_types_that_are_not_allowed(self):
+        with mock.patch("core.webhook.WebhookHandler._deliver_calls") as deliver:
+            from core.webhook import WebhookHandler
+
+            self.assertTrue(WebhookHandler.process_update({"update_id": 1, "callback_query": {"id": "c"}}))
+            self.assertTrue(WebhookHandler.process_update(_update(2, 10)))
+            self.assertTrue(WebhookHandler.process_update(Update.from_dict(_update(3, 10))))
+
+        self.assertEqual(deliver.call_count, 2)
+
+    def test_lazy_updates_are_grouped_by_the_same_chat_as_dicts(self):
+        for payload in (_update(1, 10), {"update_id": 2, "edited_message": {"chat": {"id": -5}}}, {"update_id": 3}):
+            self.assertEqual(chat_key(Update.from_dict(payload)), chat_key(payload))
+
+    def test_retries_updates_the_handler_defers(self):
+        attempts = []
+
+        def handle(update):
+            attempts.append(update["update_id"])
+            return len(attempts) > 2
+
+        _run([[_update(1, 10), _update(2, 10)]], handle, expected=lambda: 2 in attempts)
+
+        self.assertEqual(attempts, [1, 1, 1, 2])
+
+
+class RunPollerCommandTests(SimpleTestCase):
+    @override_settings(TELEGRAM_BOT_TOKEN="")
+    def test_requires_bot_token(self):
+        with self.assertRaises(CommandError):
+            call_command("runpoller")
+
+    @override_settings(TELEGRAM_BOT_TOKEN="token", TELEGRAM_ALLOWED_UPDATES=["message"])
+    def test_feeds_updates_to_the_webhook_handler(self):
+        with mock.patch("core.management.commands.runpoller.UpdatePoller") as poller_cls, mock.patch(
+            "core.management.commands.runpoller.TelegramClient"
+        ) as client_cls, mock.patch("core.management.commands.runpoller.signal"):
+            call_command("runpoller", "--delete-webhook", "--workers", "4", stdout=mock.Mock())
+
+        client_cls.return_value.delete_webhook.assert_called_once_with()
+        self.assertEqual(poller_cls.call_args.args[1].__name__, "process_update")
+        self.assertEqual(poller_cls.call_args.kwargs["workers"], 4)
+        self.assertEqual(poller_cls.call_args.kwargs["allowed_updates"], ["message"])
+        poller_cls.return_value.run.assert_called_once_with()
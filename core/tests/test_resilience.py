@@ -0,0 +1,69 @@
+from unittest import mock
+
+from core.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, deadline, remaining
+
+
+def test_circuit_opens_on_failure_ratio_and_probes_once_after_cooldown():
+    breaker = CircuitBreaker(failure_ratio=0.5, min_calls=4, window=30, cooldown=10)
+
+    with mock.patch("core.resilience.time.monotonic", return_value=100.0) as clock:
+        for ok in (True, False, True):
+            assert breaker.allow("sendMessage") == 0
+            breaker.record("sendMessage", ok)
+        assert breaker.state("sendMessage") == CLOSED
+        breaker.record("sendMessage", False)
+        assert breaker.state("sendMessage") == OPEN
+        assert breaker.allow("sendMessage") == 10
+        assert breaker.allow("getMe") == 0
+
+        clock.return_value = 110.0
+        assert breaker.allow("sendMessage") == 0
+        assert breaker.state("sendMessage") == HALF_OPEN
+        assert breaker.allow("sendMessage") > 0
+        breaker.record("sendMessage", False)
+        assert breaker.state("sendMessage") == OPEN
+
+        clock.return_value = 120.0
+        assert breaker.allow("sendMessage") == 0
+        breaker.record("sendMessage", None)
+        assert breaker.state("sendMessage") == HALF_OPEN
+        assert breaker.allow("sendMessage") == 0
+        breaker.record("sendMessage", True)
+        assert breaker.state("sendMessage") == CLOSED
+        assert breaker.open_circuits() == 0
+
+
+def test_old_failures_slide_out_of_the_window():
+    breaker = CircuitBreaker(failure_ratio=0.5, min_calls=2, window=30)
+
+    with mock.patch("core.resilience.time.monotonic", return_value=0.0) as clock:
+        breaker.record("sendMessage", False)
+        clock.return_value = 31.0
+        breaker.record("sendMessage", True)
+        breaker.record("sendMessage", True)
+        breaker.record("sendMessage", False)
+
+    assert breaker.state("sendMessage") == CLOSED
+
+
+def test_zero_min_calls_disables_the_breaker():
+    breaker = CircuitBreaker(min_calls=0)
+
+    for _ in range(10):
+        breaker.record("sendMessage", False)
+
+    assert breaker.allow("sendMessage") == 0
+
+
+def test_nested_deadlines_only_shrink():
+    assert remaining() is None
+
+    with deadline(1.0):
+        with deadline(5.0):
+            assert remaining() <= 1.0
+        with deadline(0.5):
+            assert remaining() <= 0.5
+        with deadline(0):
+            assert 0.5 < remaining() <= 1.0
+
+    assert remaining() is None
@@ -0,0 +1,148 @@
+import re
+from unittest import mock
+
+import pytest
+
+from core.handlers import greet
+from core.router import ASCII_FOLDS, PatternSet, Router, required_literal
+
+
+def _message(text, chat_id=1):
+    return {"update_id": 1, "message": {"chat": {"id": chat_id}, "text": text}}
+
+
+def _router():
+    router = Router(bot_username="GreeterBot")
+
+    @router.command("start", "/help")
+    def start(context):
+        return "sendMessage", {"chat_id": context.event["chat"]["id"], "text": f"{context.command}:{context.args}"}
+
+    @router.pattern(r"(?P<amount>\d+) (eur|usd)")
+    def money(context):
+        return "sendMessage", {"chat_id": 1, "text": context.match.group("amount")}
+
+    @router.pattern(r"hello|hi", flags=re.IGNORECASE)
+    def hello(context):
+        return None
+
+    @router.on("message")
+    def fallback(context):
+        return [("sendMessage", {"chat_id": 1, "text": "a"}), ("sendMessage", {"chat_id": 1, "text": "b"})]
+
+    @router.on("callback_query")
+    def callback(context):
+        return "answerCallbackQuery", {"callback_query_id": context.event["id"], "text": context.text}
+
+    return router
+
+
+def test_commands_are_matched_by_name_with_arguments_and_mentions():
+    router = _router()
+
+    assert router.route(_message("/start now please")) == [("sendMessage", {"chat_id": 1, "text": "start:now please"})]
+    assert router.route(_message("/HELP@greeterbot")) == [("sendMessage", {"chat_id": 1, "text": "help:"})]
+    handler, _ = router.resolve(_message("/start@OtherBot"))
+    assert handler.__name__ == "fallback"
+
+
+def test_patterns_run_only_when_no_command_matched():
+    router = _router()
+
+    assert router.route(_message("pay 12 eur")) == [("sendMessage", {"chat_id": 1, "text": "12"})]
+    assert router.route(_message("/start 12 eur"))[0][1]["text"] == "start:12 eur"
+    assert router.resolve(_message("oh HI there"))[0].__name__ == "hello"
+    assert router.resolve(_message("/unknown 5 usd"))[0].__name__ == "money"
+
+
+def test_patterns_are_tried_in_registration_order():
+    router = _router()
+
+    assert router.resolve(_message("hi, it costs 3 usd"))[0].__name__ == "money"
+    assert router.resolve(_message("Hello"))[0].__name__ == "hello"
+
+
+def test_required_literal_is_the_longest_top_level_run():
+    assert required_literal(re.compile(r"\border (?P<number>\d+)\b")) == "order "
+    assert required_literal(re.compile(r"^/vote (\d+) for (yes|no)")) == "/vote "
+    assert required_literal(re.compile(r"hello|hi")) == "h"
+    assert required_literal(re.compile(r"\d+ (eur|usd)")) == " "
+    assert required_literal(re.compile(r"café au lait")) == " au lait"
+
+
+def test_pattern_set_searches_only_patterns_whose_literal_occurs():
+    patterns = PatternSet()
+    searched = []
+
+    class Counting:
+        def __init__(self, regex, flags=0):
+            self.compiled = re.compile(regex, flags)
+            self.pattern, self.flags = self.compiled.pattern, self.compiled.flags
+
+        def search(self, text):
+            searched.append(self.pattern)
+            return self.compiled.search(text)
+
+    for n in range(100):
+        patterns.add(Counting(rf"\border{n}\b"), f"order{n}")
+    patterns.add(Counting(r"ORDER1", re.IGNORECASE), "shouting")
+    patterns.add(Counting(r"\d{3}"), "digits")
+
+    assert patterns.match("track order1 and order12 please")[0] == "order1"
+    assert patterns.match("track order12 please")[0] == "order12"
+    assert searched == [r"\border1\b", r"\border1\b", r"\border12\b"]
+    assert patterns.match("Order10x")[0] == "shouting"
+    assert patterns.match("no orders, 123")[0] == "digits"
+    assert patterns.match("nothing here") is None
+
+
+def test_ignorecase_patterns_match_unicode_case_folds_of_their_literal():
+    patterns = PatternSet()
+    patterns.add(re.compile(r"\bsale\b"), "sale")
+    patterns.add(re.compile(r"sale now", re.IGNORECASE), "shouting")
+    patterns.add(re.compile(r"link", re.IGNORECASE), "link")
+
+    assert patterns.match("ſALE NOW")[0] == "shouting"
+    assert patterns.match("ſale now")[0] == "shouting"
+    assert patterns.match("LIN\u212a")[0] == "link"
+    assert patterns.match("l\u0131nk")[0] == "link"
+
+
+def test_ascii_folds_cover_every_letter_ignorecase_matches_beyond_ascii():
+    non_ascii = "".join(chr(code) for code in range(128, 0x110000) if not 0xD800 <= code < 0xE000)
+    for letter in "abcdefghijklmnopqrstuvwxyz":
+        for found in re.finditer(letter, non_ascii, re.IGNORECASE):
+            assert letter in found.group().lower().translate(ASCII_FOLDS), hex(ord(found.group()))
+
+
+def test_update_types_route_to_their_fallback():
+    router = _router()
+
+    assert router.route({"update_id": 2, "callback_query": {"id": "q", "data": "yes"}}) == [
+        ("answerCallbackQuery", {"callback_query_id": "q", "text": "yes"})
+    ]
+    assert len(router.route(_message("good day"))) == 2
+    assert router.route({"update_id": 3, "poll": {"id": "p"}}) == []
+    assert router.route({"update_id": 4, "message": "not a dict"}) == []
+    assert router.update_types == ["message", "edited_message", "callback_query"]
+
+
+def test_duplicate_registrations_are_rejected():
+    router = _router()
+
+    with pytest.raises(ValueError):
+        router.command("START")(lambda context: None)
+    with pytest.raises(ValueError):
+        router.on("callback_query")(lambda context: None)
+
+
+def test_greeting_handler_replies_to_messages_with_a_chat():
+    router = Router()
+    router.on("message")(greet)
+
+    with mock.patch("core.handlers.pick_greeting", return_value="Hola, Ana!") as pick_greeting:
+        calls = router.route({"message": {"chat": {"id": 5}, "from": {"first_name": "Ana"}}})
+
+    pick_greeting.assert_called_once_with("Ana")
+    assert calls == [("sendMessage", {"chat_id": 5, "text": "Hola, Ana!"})]
+    assert router.route({"message": {"text": "no chat"}}) == []
@@ -4,9 +4,16 @@ from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.test import TestCase, override_settings
 
+DEFAULT_OPTIONS = {
+    "allowed_updates": ["message", "edited_message"],
+    "max_connections": None,
+    "drop_pending_updates": False,
+}
 
+
+@override_settings(TELEGRAM_ALLOWED_UPDATES=["message", "edited_message"])
 class SetWebhookCommandTests(TestCase):
-    def _call(self, *, url="https://example.com/hook", secret="s3cr3t"):
+    def _call(self, *args, url="https://example.com/hook", secret="s3cr3t"):
         with override_settings(
             TELEGRAM_WEBHOOK_URL=url,
             TELEGRAM_WEBHOOK_SECRET=secret,
@@ -15,18 +22,18 @@ class SetWebhookCommandTests(TestCase):
             with mock.patch("core.management.commands.setwebhook.TelegramClient") as client_cls:
                 client_instance = client_cls.return_value
                 client_instance.set_webhook.return_value = True
-                call_command("setwebhook")
+                call_command("setwebhook", *args, stdout=mock.Mock())
         return client_instance.set_webhook.call_args
 
     def test_passes_secret_token_when_provided(self):
         call_args = self._call(url="https://example.com/hook", secret="topsecret")
         self.assertEqual(call_args.args, ("https://example.com/hook",))
-        self.assertEqual(call_args.kwargs, {"secret_token": "topsecret"})
+        self.assertEqual(call_args.kwargs, {"secret_token": "topsecret", **DEFAULT_OPTIONS})
 
     def test_preserves_existing_query_params(self):
         call_args = self._call(url="https://example.com/hook?foo=bar", secret="topsecret")
         self.assertEqual(call_args.args, ("https://example.com/hook?foo=bar",))
-        self.assertEqual(call_args.kwargs, {"secret_token": "topsecret"})
+        self.assertEqual(call_args.kwargs, {"secret_token": "topsecret", **DEFAULT_OPTIONS})
 
     def test_uses_plain_url_when_secret_missing(self):
         with override_settings(
@@ -39,7 +46,9 @@ class SetWebhookCommandTests(TestCase):
                 client_instance.set_webhook.return_value = True
                 call_command("setwebhook")
 
-        client_cls.return_value.set_webhook.assert_called_once_with("https://example.com/hook", secret_token=None)
+        client_cls.return_value.set_webhook.assert_called_once_with(
+            "https://example.com/hook", secret_token=None, **DEFAULT_OPTIONS
+        )
 
     def test_raises_when_webhook_registration_fails(self):
         with override_settings(
@@ -51,3 +60,22 @@ class SetWebhookCommandTests(TestCase):
                 client_cls.return_value.set_webhook.return_value = False
                 with self.assertRaises(CommandError):
                     call_command("setwebhook")
+
+    def test_passes_update_filtering_options(self):
+        call_args = self._call(
+            "--allowed-updates", "message, callback_query", "--max-connections", "80", "--drop-pending-updates"
+        )
+
+        self.assertEqual(
+            call_args.kwargs,
+            {
+                "secret_token": "s3cr3t",
+                "allowed_updates": ["message", "callback_query"],
+                "max_connections": 80,
+                "drop_pending_updates": True,
+            },
+        )
+
+    def test_rejects_out_of_range_max_connections(self):
+        with self.assertRaises(CommandError):
+            self._call("--max-connections", "500")
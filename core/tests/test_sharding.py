@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import signal
+import time
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core.sharding import ShardPool, shard_for
+
+
+def _update(update_id, chat_id):
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": str(update_id)}}
+
+
+def test_shard_for_is_stable_and_moves_few_keys_when_growing():
+    keys = list(range(-500, 500)) + [f"@channel{n}" for n in range(200)]
+
+    before = {key: shard_for(key, 4) for key in keys}
+    after = {key: shard_for(key, 5) for key in keys}
+
+    assert all(0 <= shard < 4 for shard in before.values())
+    assert len(set(before.values())) == 4
+    moved = [key for key in keys if before[key] != after[key]]
+    assert all(after[key] == 4 for key in moved)
+    assert len(moved) < len(keys) / 3
+    assert shard_for(-1001234567890, 1) == 0
+
+
+def test_pool_keeps_each_chat_in_order_on_one_process_across_resizes():
+    results = multiprocessing.get_context("fork").Queue()
+
+    def handle(update):
+        time.sleep(0.001 * (update["update_id"] % 3))
+        results.put((update["message"]["chat"]["id"], update["update_id"], os.getpid()))
+        return True
+
+    pool = ShardPool(handle, 3)
+    pool.start()
+    for n in range(60):
+        assert pool.submit(_update(n, n % 6))
+    pool.resize(2)
+    for n in range(60, 120):
+        assert pool.submit(_update(n, n % 6))
+    pool.stop(timeout=10)
+
+    handled = [results.get(timeout=5) for _ in range(120)]
+    for chat in range(6):
+        ids = [update_id for chat_id, update_id, _ in handled if chat_id == chat]
+        assert ids == sorted(ids)
+        assert len({pid for chat_id, update_id, pid in handled if chat_id == chat and update_id < 60}) == 1
+    assert len({pid for _, _, pid in handled}) == 5
+    assert pool.submit(_update(200, 1)) is False
+
+
+def test_a_shard_that_dies_is_started_again_on_its_next_update(tmp_path):
+    # Results go through files: a process killed while writing to a shared queue would keep its lock.
+    def handle(update):
+        (tmp_path / f"{update['update_id']}.tmp").write_text(str(os.getpid()))
+        (tmp_path / f"{update['update_id']}.tmp").rename(tmp_path / str(update["update_id"]))
+        return True
+
+    def handled_by(update_id):
+        deadline = time.monotonic() + 5
+        while not (tmp_path / str(update_id)).exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return int((tmp_path / str(update_id)).read_text())
+
+    pool = ShardPool(handle, 2)
+    pool.start()
+    assert pool.submit(_update(1, 7))
+    first_pid = handled_by(1)
+    os.kill(first_pid, signal.SIGKILL)
+    pool._workers[shard_for(7, 2)].join(5)
+    stale = pool._queues[shard_for(7, 2)]
+
+    assert pool.submit(_update(2, 7))
+    second_pid = handled_by(2)
+    pool.stop(timeout=10)
+
+    assert stale._closed
+
+    assert second_pid not in (first_pid, os.getpid())
+
+
+class RunPollerShardingTests(SimpleTestCase):
+    @override_settings(TELEGRAM_BOT_TOKEN="token")
+    def test_processes_option_feeds_the_poller_through_a_shard_pool(self):
+        with mock.patch("core.management.commands.runpoller.UpdatePoller") as poller_cls, mock.patch(
+            "core.management.commands.runpoller.TelegramClient"
+        ), mock.patch("core.management.commands.runpoller.ShardPool") as pool_cls, mock.patch(
+            "core.management.commands.runpoller.signal"
+        ):
+            call_command("runpoller", "--processes", "4", stdout=mock.Mock())
+
+        self.assertEqual(pool_cls.call_args.args[0].__name__, "process_update")
+        self.assertEqual(pool_cls.call_args.args[1], 4)
+        self.assertIs(poller_cls.call_args.args[1], pool_cls.return_value.submit)
+        pool_cls.return_value.start.assert_called_once_with()
+        pool_cls.return_value.stop.assert_called_once_with(30)
@@ -0,0 +1,165 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from core import telegram
+from core.resilience import CircuitBreaker, DeadlineExceeded, deadline
+from core.telegram import AsyncTelegramClient, CircuitOpen, RetryAfter, TelegramClient
+
+
+def _response(data: dict) -> mock.Mock:
+    response = mock.Mock()
+    response.json.return_value = data
+    return response
+
+
+class TelegramClientTests(SimpleTestCase):
+    def test_clients_share_the_process_session(self):
+        self.assertIs(TelegramClient("a").session, TelegramClient("b").session)
+        self.assertIs(telegram.get_session(), TelegramClient("c").session)
+
+    def test_session_is_rebuilt_after_fork(self):
+        session = telegram.get_session()
+
+        with mock.patch("core.telegram.os.getpid", return_value=-1):
+            forked = telegram.get_session()
+
+        self.assertIsNot(forked, session)
+
+    def test_build_session_uses_configured_pool_size(self):
+        session = telegram.build_session(pool_size=7)
+
+        adapter = session.get_adapter("https://api.telegram.org")
+        self.assertEqual(adapter._pool_maxsize, 7)
+
+    @override_settings(TELEGRAM_CONNECT_TIMEOUT=1.5, TELEGRAM_READ_TIMEOUT=4.0)
+    def test_post_uses_split_timeouts_and_injected_session(self):
+        session = mock.Mock()
+        session.post.return_value = _response({"ok": True})
+        client = TelegramClient("token", session=session, api_base="http://127.0.0.1:9")
+
+        self.assertTrue(client.send_message(5, "hi"))
+        session.post.assert_called_once_with(
+            "http://127.0.0.1:9/bottoken/sendMessage",
+            json={"chat_id": 5, "text": "hi"},
+            timeout=(1.5, 4.0),
+        )
+
+    def test_post_reports_api_failures(self):
+        session = mock.Mock()
+        session.post.return_value = _response({"ok": False, "description": "Bad Request"})
+        client = TelegramClient("token", session=session)
+
+        self.assertFalse(client.send_message(5, "hi"))
+
+    def test_request_raises_retry_after_on_429(self):
+        session = mock.Mock()
+        session.post.return_value = _response(
+            {"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 3}}
+        )
+        client = TelegramClient("token", session=session)
+
+        with self.assertRaises(RetryAfter) as raised:
+            client.request("sendMessage", {"chat_id": 5, "text": "hi"})
+        self.assertEqual(raised.exception.retry_after, 3.0)
+        self.assertFalse(client.send_message(5, "hi"))
+
+    def test_set_webhook_sends_only_requested_options(self):
+        session = mock.Mock()
+        session.post.return_value = _response({"ok": True, "result": True})
+        client = TelegramClient("token", session=session)
+
+        client.set_webhook("https://example.com/hook", allowed_updates=["message"], drop_pending_updates=True)
+
+        self.assertEqual(
+            session.post.call_args.kwargs["json"],
+            {"url": "https://example.com/hook", "allowed_updates": ["message"], "drop_pending_updates": True},
+        )
+
+    def test_request_returns_result(self):
+        session = mock.Mock()
+        session.post.return_value = _response({"ok": True, "result": {"message_id": 9}})
+        client = TelegramClient("token", session=session)
+
+        self.assertEqual(client.request("sendMessage", {"chat_id": 5, "text": "hi"}), {"message_id": 9})
+
+    def test_get_updates_returns_lazy_views_over_the_response_body(self):
+        body = b'{"ok":true,"result":[{"update_id":4,"message":{"chat":{"id":7},"text":"hi"}}, {"update_id":5}]}'
+        session = mock.Mock()
+        session.post.return_value = mock.Mock(status_code=200, content=body)
+        client = TelegramClient("token", session=session)
+
+        updates = client.get_updates(4, timeout=1, allowed_updates=["message"])
+
+        self.assertEqual([update.update_id for update in updates], [4, 5])
+        self.assertEqual(updates[0].message.chat_id, 7)
+        self.assertEqual(session.post.call_args.kwargs["json"]["allowed_updates"], ["message"])
+
+    def test_get_updates_raises_retry_after_on_429(self):
+        session = mock.Mock()
+        session.post.return_value = _response({"ok": False, "parameters": {"retry_after": 2}})
+        session.post.return_value.status_code = 429
+        client = TelegramClient("token", session=session)
+
+        with self.assertRaises(RetryAfter):
+            client.get_updates(None, timeout=1)
+
+    def test_open_circuit_fails_fast_per_method(self):
+        session = mock.Mock()
+        session.post.side_effect = requests.ConnectionError("api down")
+        breaker = CircuitBreaker(min_calls=2, cooldown=60)
+        client = TelegramClient("token", session=session, breaker=breaker)
+
+        self.assertFalse(client.send_message(5, "hi"))
+        self.assertFalse(client.send_message(5, "hi"))
+        with self.assertRaises(CircuitOpen):
+            client.request("sendMessage", {"chat_id": 5, "text": "hi"})
+
+        self.assertEqual(session.post.call_count, 2)
+        session.post.side_effect = None
+        session.post.return_value = _response({"ok": True})
+        self.assertTrue(client.call("getMe", {}))
+
+    def test_api_errors_below_500_do_not_trip_the_breaker(self):
+        session = mock.Mock()
+        session.post.return_value = _response({"ok": False, "error_code": 403, "description": "Forbidden"})
+        client = TelegramClient("token", session=session, breaker=CircuitBreaker(min_calls=2))
+
+        for _ in range(5):
+            self.assertFalse(client.send_message(5, "hi"))
+
+        self.assertEqual(session.post.call_count, 5)
+
+    @override_settings(TELEGRAM_CONNECT_TIMEOUT=1.5, TELEGRAM_READ_TIMEOUT=4.0)
+    def test_deadline_clips_timeouts_and_skips_calls_once_spent(self):
+        session = mock.Mock()
+        session.post.return_value = _response({"ok": True})
+        client = TelegramClient("token", session=session)
+
+        with deadline(2.0):
+            client.send_message(5, "hi")
+        connect, read = session.post.call_args.kwargs["timeout"]
+        self.assertEqual(connect, 1.5)
+        self.assertTrue(1.9 < read <= 2.0)
+
+        with mock.patch("core.telegram.remaining", return_value=-0.1):
+            with self.assertRaises(DeadlineExceeded):
+                client.request("sendMessage", {"chat_id": 5, "text": "hi"})
+            self.assertFalse(client.send_message(5, "hi"))
+        self.assertEqual(session.post.call_count, 1)
+
+
+class AsyncTelegramClientTests(SimpleTestCase):
+    async def test_send_message_posts_through_async_client(self):
+        http = mock.Mock()
+        http.post = mock.AsyncMock(return_value=_response({"ok": True}))
+        client = AsyncTelegramClient("token", http=http, api_base="http://127.0.0.1:9", timeout=(1.0, 2.0))
+
+        self.assertTrue(await client.send_message(3, "hi"))
+        http.post.assert_awaited_once_with(
+            "http://127.0.0.1:9/bottoken/sendMessage", json={"chat_id": 3, "text": "hi"}, timeout=mock.ANY
+        )
+
+    async def test_shared_http_client_is_reused_within_a_loop(self):
+        self.assertIs(telegram.get_async_http(), AsyncTelegramClient("a").http)
@@ -0,0 +1,82 @@
+import json
+import pickle
+
+import pytest
+
+from core.helpers import extract_message, extract_sender_name, get_chat_id
+from core.update import Update, updates_in
+
+PAYLOADS = [
+    {
+        "update_id": 1,
+        "message": {"message_id": 5, "from": {"id": 7, "first_name": "Ana"}, "chat": {"id": 7}, "text": "hi"},
+    },
+    {"update_id": 2, "edited_message": {"message_id": 6, "from": {"id": 8, "username": "bo"}, "chat": {"id": -100}}},
+    {"update_id": 3, "message": {"message_id": 7, "chat": {"id": 9, "type": "private"}, "sticker": {"emoji": "🎉"}}},
+    {"update_id": 4, "callback_query": {"id": "q", "from": {"id": 1}, "data": "noop"}},
+    {"update_id": 5, "message": {"from": {"id": 2, "first_name": "Chloé \"C\" \\ é"}, "chat": {"id": 3}}},
+]
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_update_reads_the_same_values_as_the_dict_helpers(payload):
+    for raw in (json.dumps(payload).encode(), json.dumps(payload, ensure_ascii=False, indent=2).encode()):
+        update = Update.from_bytes(b"\n " + raw)
+        message = extract_message(payload)
+
+        assert update.update_id == payload["update_id"]
+        assert update.to_dict() == payload
+        if message is None:
+            assert update.message is None
+        else:
+            assert update.message.chat_id == get_chat_id(message)
+            assert update.message.sender_name == extract_sender_name(message)
+            assert update.message.text == message.get("text")
+
+
+def test_fields_are_decoded_on_demand_and_nested_values_are_not_walked():
+    raw = (
+        b'{"update_id": 9, "message": {"chat": {"id": -5, "title": "t"}, "text": "x, [y]",'
+        b' "photo": [{"file_id": "a"}, {"file_id": "b]}"}], "entities": [[{}]], "date": 1.5, "pinned": true}}'
+    )
+    update = Update.from_bytes(raw)
+
+    assert update.type == "message"
+    assert update.message.chat.id == -5
+    assert list(update.message._fields) == ["chat"]
+    assert update._unskipped is not None
+    assert update.message.get("photo")[1] == {"file_id": "b]}"}
+    assert update.message.get("date") == 1.5
+    assert update.message.get("pinned") is True
+    assert update.message.get("missing", "default") == "default"
+    assert "entities" in update.message and "nope" not in update.message
+    assert update.message.chat is update.message.chat
+    assert update.message.get("chat") == {"id": -5, "title": "t"}
+
+
+def test_update_pickles_as_its_raw_body():
+    update = Update.from_dict(PAYLOADS[0])
+    update.message.chat_id
+
+    restored = pickle.loads(pickle.dumps(update))
+
+    assert restored.to_dict() == PAYLOADS[0]
+    assert restored._fields is None
+
+
+def test_non_object_body_is_rejected():
+    with pytest.raises(ValueError):
+        Update.from_bytes(b"[1, 2]")
+
+
+def test_getupdates_bodies_become_updates_sharing_the_body():
+    raw = b' {"ok": true, "result": [ %s ,\n%s]}' % tuple(json.dumps(payload).encode() for payload in PAYLOADS[:2])
+
+    updates = updates_in(raw)
+
+    assert [update.to_dict() for update in updates] == PAYLOADS[:2]
+    assert all(update._raw is raw for update in updates)
+    assert pickle.loads(pickle.dumps(updates[1])).to_dict() == PAYLOADS[1]
+    assert updates_in(b'{"ok": true, "result": []}') == []
+    assert updates_in(b'{"ok": false, "error_code": 429}') is None
+    assert updates_in(b"<html>") is None
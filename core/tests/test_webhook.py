@@ -5,6 +5,9 @@ from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from core.dedup import MemoryUpdateCache
+from core.limiter import AdaptiveLimiter
+
 
 class WebhookViewTests(APITestCase):
     _DEFAULT_SECRET = object()
@@ -42,7 +45,7 @@ class WebhookViewTests(APITestCase):
     def test_webhook_ignores_updates_without_message_payload(self):
         payload = {"callback_query": {"data": "noop"}}
 
-        with mock.patch("core.views.telegram_client.send_message") as send_message:
+        with mock.patch("core.webhook.telegram_client.call") as send_message:
             response = self._post(payload)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -58,14 +61,14 @@ class WebhookViewTests(APITestCase):
             }
         }
 
-        with mock.patch("core.views.pick_greeting", return_value="Bonjour, Ariana!") as pick_greeting, mock.patch(
-            "core.views.telegram_client.send_message", return_value=True
+        with mock.patch("core.handlers.pick_greeting", return_value="Bonjour, Ariana!") as pick_greeting, mock.patch(
+            "core.webhook.telegram_client.call", return_value=True
         ) as send_message:
             response = self._post(payload)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         pick_greeting.assert_called_once()
-        send_message.assert_called_once_with(99, "Bonjour, Ariana!")
+        send_message.assert_called_once_with("sendMessage", {"chat_id": 99, "text": "Bonjour, Ariana!"})
 
     @override_settings(TELEGRAM_BOT_TOKEN="secret-token")
     def test_webhook_replies_to_non_text_messages(self):
@@ -76,20 +79,20 @@ class WebhookViewTests(APITestCase):
             }
         }
 
-        with mock.patch("core.views.pick_greeting", return_value="Hey there!") as pick_greeting, mock.patch(
-            "core.views.telegram_client.send_message", return_value=True
+        with mock.patch("core.handlers.pick_greeting", return_value="Hey there!") as pick_greeting, mock.patch(
+            "core.webhook.telegram_client.call", return_value=True
         ) as send_message:
             response = self._post(payload)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         pick_greeting.assert_called_once()
-        send_message.assert_called_once_with(42, "Hey there!")
+        send_message.assert_called_once_with("sendMessage", {"chat_id": 42, "text": "Hey there!"})
 
     @override_settings(TELEGRAM_WEBHOOK_SECRET="topsecret")
     def test_webhook_rejects_missing_secret(self):
         payload = {"message": {"chat": {"id": 11}, "text": "hello"}}
 
-        with mock.patch("core.views.telegram_client.send_message") as send_message:
+        with mock.patch("core.webhook.telegram_client.call") as send_message:
             response = self._post(payload, secret=None)
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -99,7 +102,7 @@ class WebhookViewTests(APITestCase):
     def test_webhook_rejects_invalid_secret(self):
         payload = {"message": {"chat": {"id": 11}, "text": "hello"}}
 
-        with mock.patch("core.views.telegram_client.send_message") as send_message:
+        with mock.patch("core.webhook.telegram_client.call") as send_message:
             response = self._post(payload, secret="wrong")
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -114,16 +117,16 @@ class WebhookViewTests(APITestCase):
             }
         }
 
-        with mock.patch("core.views.telegram_client.send_message", return_value=True) as send_message:
+        with mock.patch("core.webhook.telegram_client.call", return_value=True) as send_message:
             response = self._post(payload, secret="topsecret")
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        send_message.assert_called_once_with(77, mock.ANY)
+        send_message.assert_called_once_with("sendMessage", {"chat_id": 77, "text": mock.ANY})
 
     def test_webhook_requires_chat_id(self):
         payload = {"message": {"text": "hola"}}
 
-        with mock.patch("core.views.telegram_client.send_message") as send_message:
+        with mock.patch("core.webhook.telegram_client.call") as send_message:
             response = self._post(payload)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -138,7 +141,7 @@ class WebhookViewTests(APITestCase):
             }
         }
 
-        with mock.patch("core.views.telegram_client.send_message") as send_message:
+        with mock.patch("core.webhook.telegram_client.call") as send_message:
             response = self._post(payload)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -153,8 +156,150 @@ class WebhookViewTests(APITestCase):
             }
         }
 
-        with mock.patch("core.views.telegram_client.send_message", return_value=False) as send_message:
+        with mock.patch("core.webhook.telegram_client.call", return_value=False) as send_message:
+            response = self._post(payload)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        send_message.assert_called_once_with("sendMessage", {"chat_id": 88, "text": mock.ANY})
+
+    @override_settings(TELEGRAM_BOT_TOKEN="secret-token", TELEGRAM_INLINE_REPLIES=True)
+    def test_webhook_answers_inline_when_enabled(self):
+        payload = {
+            "message": {
+                "chat": {"id": 31},
+                "text": "hi",
+                "from": {"first_name": "Noor"},
+            }
+        }
+
+        with mock.patch("core.handlers.pick_greeting", return_value="Hello, Noor!"), mock.patch(
+            "core.webhook.telegram_client.call"
+        ) as send_message:
+            response = self._post(payload)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"method": "sendMessage", "chat_id": 31, "text": "Hello, Noor!"})
+        send_message.assert_not_called()
+
+    @override_settings(TELEGRAM_BOT_TOKEN="secret-token", TELEGRAM_INLINE_REPLIES=True)
+    def test_inline_mode_falls_back_to_api_calls_for_multiple_replies(self):
+        calls = [("sendMessage", {"chat_id": 31, "text": "one"}), ("sendMessage", {"chat_id": 31, "text": "two"})]
+
+        with mock.patch("core.webhook.router.route", return_value=calls), mock.patch(
+            "core.webhook.telegram_client.call", return_value=True
+        ) as call:
+            response = self._post({"message": {"chat": {"id": 31}, "text": "hi"}})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data)
+        self.assertEqual(call.call_args_list, [mock.call(*c) for c in calls])
+
+    @override_settings(TELEGRAM_INLINE_REPLIES=True)
+    def test_inline_mode_ignores_updates_without_message_payload(self):
+        payload = {"callback_query": {"data": "noop"}}
+
+        response = self._post(payload)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data)
+
+    @override_settings(TELEGRAM_BOT_TOKEN="secret-token", TELEGRAM_DISPATCH_WORKERS=2)
+    def test_webhook_queues_greeting_when_dispatch_enabled(self):
+        payload = {"message": {"chat": {"id": 12}, "text": "hi"}}
+
+        with mock.patch("core.handlers.pick_greeting", return_value="Hola, there!"), mock.patch(
+            "core.webhook.dispatcher.submit", return_value=True
+        ) as submit, mock.patch("core.webhook.telegram_client.call") as send_message:
             response = self._post(payload)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        send_message.assert_called_once_with(88, mock.ANY)
+        submit.assert_called_once_with("sendMessage", {"chat_id": 12, "text": "Hola, there!"})
+        send_message.assert_not_called()
+
+    @override_settings(TELEGRAM_BOT_TOKEN="secret-token", TELEGRAM_DISPATCH_WORKERS=2)
+    def test_webhook_returns_503_when_dispatch_queue_is_full(self):
+        payload = {"update_id": 7, "message": {"chat": {"id": 12}, "text": "hi"}}
+
+        with mock.patch("core.webhook.dispatcher.submit", return_value=False):
+            response = self._post(payload)
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @override_settings(TELEGRAM_BOT_TOKEN="secret-token", TELEGRAM_OUTBOX=True, TELEGRAM_DISPATCH_WORKERS=2)
+    def test_webhook_stores_greeting_in_outbox_when_enabled(self):
+        payload = {"update_id": 8, "message": {"chat": {"id": 12}, "text": "hi"}}
+
+        with mock.patch("core.handlers.pick_greeting", return_value="Hola, there!"), mock.patch(
+            "core.webhook.outbox_writer.append_many", side_effect=[True, False]
+        ) as append, mock.patch("core.webhook.dispatcher.submit") as submit:
+            stored = self._post(payload)
+            failed = self._post(dict(payload, update_id=9))
+
+        self.assertEqual(stored.status_code, status.HTTP_200_OK)
+        self.assertEqual(failed.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        append.assert_any_call([("sendMessage", {"chat_id": 12, "text": "Hola, there!"})])
+        submit.assert_not_called()
+
+    @override_settings(TELEGRAM_BOT_TOKEN="secret-token")
+    def test_webhook_drops_redelivered_updates(self):
+        payload = {"update_id": 501, "message": {"chat": {"id": 3}, "text": "hi"}}
+
+        with mock.patch("core.webhook.update_cache", MemoryUpdateCache()), mock.patch(
+            "core.webhook.telegram_client.call", return_value=True
+        ) as send_message:
+            first = self._post(payload)
+            second = self._post(payload)
+
+        self.assertEqual((first.status_code, second.status_code), (status.HTTP_200_OK, status.HTTP_200_OK))
+        send_message.assert_called_once_with("sendMessage", {"chat_id": 3, "text": mock.ANY})
+
+    @override_settings(TELEGRAM_BOT_TOKEN="secret-token", TELEGRAM_DISPATCH_WORKERS=2)
+    def test_webhook_accepts_redelivery_after_503(self):
+        payload = {"update_id": 502, "message": {"chat": {"id": 3}, "text": "hi"}}
+
+        with mock.patch("core.webhook.update_cache", MemoryUpdateCache()), mock.patch(
+            "core.webhook.dispatcher.submit", side_effect=[False, True]
+        ) as submit:
+            first = self._post(payload)
+            second = self._post(payload)
+
+        self.assertEqual(first.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(submit.call_count, 2)
+
+    @override_settings(TELEGRAM_ALLOWED_UPDATES=["message", "edited_message"])
+    def test_webhook_filters_unwanted_update_types_before_parsing(self):
+        body = '{"update_id": 900, "callback_query": {"id": "1", "data": "noop"}}'
+
+        with mock.patch("core.webhook.update_cache", MemoryUpdateCache()) as cache, mock.patch(
+            "core.views.WebhookView._route"
+        ) as build_reply:
+            response = self.client.post(
+                "/telegram/webhook/",
+                data=body,
+                content_type="application/json",
+                HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=self.DEFAULT_SECRET_VALUE,
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        build_reply.assert_not_called()
+        self.assertFalse(cache.seen(900))
+
+    @override_settings(TELEGRAM_BOT_TOKEN="secret-token")
+    def test_webhook_sheds_load_at_the_concurrency_limit_without_marking_the_update_seen(self):
+        payload = {"update_id": 901, "message": {"chat": {"id": 3}, "text": "hi"}}
+        limiter = AdaptiveLimiter(2)
+        limiter.in_flight = 2
+
+        with mock.patch("core.webhook.update_cache", MemoryUpdateCache()) as cache, mock.patch(
+            "core.views.webhook_limiter", limiter
+        ), mock.patch("core.webhook.telegram_client.call", return_value=True) as call:
+            shed = self._post(payload)
+            limiter.in_flight = 1
+            accepted = self._post(payload)
+
+        self.assertEqual(shed.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(accepted.status_code, status.HTTP_200_OK)
+        call.assert_called_once()
+        self.assertTrue(cache.seen(901))
+        self.assertEqual(limiter.in_flight, 1)
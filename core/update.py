@@ -0,0 +1,324 @@
+"""
+Read-only views over a raw update body that decode a field only when it is read.
+
+An `Update` keeps the request bytes and, per JSON object that is actually visited, a small table of
+where each key's value sits. A value is decoded from its own byte range when it is read, so arrays
+such as `entities` or `photo` that nobody reads never become Python objects.
+The body is assumed to be well-formed JSON; validate it before trusting a view over it.
+"""
+import json
+import re
+from typing import Any, Dict, KeysView, List, Optional, Tuple
+
+from .router import MESSAGE_TYPES
+
+# Strings use the unrolled form of "(?:[^"\\]|\\.)*" so the regex engine never backtracks.
+_STRING_PATTERN = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_PLAIN = rb'[^"\[\]{}]*'
+_KEY = re.compile(rb'\s*"([^"\\]*(?:\\.[^"\\]*)*)"\s*:\s*')
+# One "key": value member with a string or scalar value, and its trailing comma. Objects and arrays
+# go through _skip instead: a nested pattern is barely faster and makes the regex engine allocate
+# several times the size of the update on every match.
+_PAIR = re.compile(rb'\s*"([^"\\]*(?:\\.[^"\\]*)*)"\s*:\s*(%s|[^"\[{,}\]\s][^,}\]\s]*)\s*,?' % _STRING_PATTERN)
+_STRING = re.compile(_STRING_PATTERN)
+_SCALAR = re.compile(rb"[^,}\]\s]+")
+_SEPARATOR = re.compile(rb"\s*([,}])")
+_ITEM_SEPARATOR = re.compile(rb"\s*([,\]])\s*")
+_WHITESPACE = re.compile(rb"\s*")
+# Everything up to and including the next bracket outside of a string, as `plain* (string plain*)*`.
+_NEXT_BRACKET = re.compile(rb'%s(?:%s%s)*[\[\]{}]' % (_PLAIN, _STRING_PATTERN, _PLAIN))
+_OPEN = frozenset(b"[{")
+_LITERALS = {b"true": True, b"false": False, b"null": None}
+
+
+def _skip(raw: bytes, start: int) -> int:
+    """
+    Return the offset just past the JSON value that begins at `start`.
+    """
+    first = raw[start]
+    if first == 0x22:  # "
+        return _STRING.match(raw, start).end()
+    if first not in _OPEN:
+        return _SCALAR.match(raw, start).end()
+    depth, position = 0, start
+    while True:
+        match = _NEXT_BRACKET.match(raw, position)
+        if match is None:
+            raise ValueError(f"Unterminated JSON value at offset {start}")
+        position = match.end()
+        depth += 1 if raw[position - 1] in _OPEN else -1
+        if not depth:
+            return position
+
+
+def _next_field(raw: bytes, position: int) -> Optional[Tuple[str, int, Optional[int], Optional[int]]]:
+    """
+    Read the object member at `position`: its key, where its value starts and ends, and where the
+    next member starts. Returns None past the object's end.
+
+    Both ends are None for object and array values, which are only walked when something needs to
+    look past them.
+    """
+    pair = _PAIR.match(raw, position)
+    if pair is not None:
+        name, (start, end), after = pair.group(1), pair.span(2), pair.end()
+    else:
+        key = _KEY.match(raw, position)
+        if key is None:
+            return None
+        name, start, end, after = key.group(1), key.end(), None, None
+    return json.loads(b'"%s"' % name) if b"\\" in name else name.decode(), start, end, after
+
+
+def _decode(value: bytes) -> Any:
+    # Plain strings, integers and literals cover nearly every field; json.loads handles the rest.
+    first = value[0]
+    if first == 0x22 and b"\\" not in value:
+        return value[1:-1].decode()
+    if 0x30 <= first <= 0x39 or first == 0x2D:
+        try:
+            return int(value)
+        except ValueError:
+            return json.loads(value)
+    if value in _LITERALS:
+        return _LITERALS[value]
+    return json.loads(value)
+
+
+class _Field:
+    __slots__ = ("key", "default")
+
+    def __init__(self, key: str, default: Any = None):
+        self.key = key
+        self.default = default
+
+    def __get__(self, obj: Optional["LazyObject"], owner: type) -> Any:
+        return self if obj is None else obj.get(self.key, self.default)
+
+
+class _Child:
+    __slots__ = ("key", "cls")
+
+    def __init__(self, key: str, cls: type):
+        self.key = key
+        self.cls = cls
+
+    def __get__(self, obj: Optional["LazyObject"], owner: type) -> Any:
+        return self if obj is None else obj._child(self.key, self.cls)
+
+
+class LazyObject:
+    """
+    One JSON object inside `raw`, starting at byte `start`.
+
+    Members are scanned in order only as far as the last key asked for. Each scanned key maps to the
+    byte range of its value, or to the LazyObject built for it once it has been read as one, so
+    reading `chat.id` never looks past the `id` member.
+    """
+
+    __slots__ = ("_raw", "_start", "_fields", "_position", "_unskipped")
+
+    def __init__(self, raw: bytes, start: int = 0):
+        if raw[start] != 0x7B:  # {
+            raise ValueError(f"Expected a JSON object at offset {start}")
+        self._raw = raw
+        self._start = start
+        self._fields: Optional[Dict[str, Any]] = None
+        # Where the next member starts (-1 once the object is done), unless `_unskipped` holds the
+        # start of an object or array value that has to be walked first.
+        self._position = start + 1
+        self._unskipped: Optional[int] = None
+
+    def _advance(self) -> bool:
+        """
+        Scan one more member into `_fields`; False once the object has no more members.
+        """
+        if self._position < 0:
+            return False
+        if self._unskipped is not None:
+            separator = _SEPARATOR.match(self._raw, _skip(self._raw, self._unskipped))
+            self._unskipped = None
+            if separator is None or separator.group(1) == b"}":
+                self._position = -1
+                return False
+            self._position = separator.end()
+        member = _next_field(self._raw, self._position)
+        if member is None:
+            self._position = -1
+            return False
+        name, start, end, after = member
+        if end is None:
+            self._unskipped = start
+        else:
+            self._position = after
+        self._fields[name] = (start, end)
+        return True
+
+    def _lookup(self, key: Optional[str]) -> Any:
+        if self._fields is None:
+            self._fields = {}
+        entry = self._fields.get(key)
+        while entry is None and self._advance():
+            entry = self._fields.get(key)
+        return entry
+
+    def _table(self) -> Dict[str, Any]:
+        # No key is None, so this scans the rest of the object.
+        self._lookup(None)
+        return self._fields
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._table()
+
+    def keys(self) -> KeysView[str]:
+        return self._table().keys()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Decode a single field, nested objects and arrays included, or return `default` if it is absent.
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            return default
+        if isinstance(entry, LazyObject):
+            return entry.to_dict()
+        start, end = entry
+        value = _decode(self._raw[start : end if end is not None else _skip(self._raw, start)])
+        return default if value is None else value
+
+    def _child(self, key: str, cls: type) -> Any:
+        entry = self._lookup(key)
+        if entry is None or isinstance(entry, LazyObject):
+            return entry
+        if self._raw[entry[0]] != 0x7B:
+            return None
+        child = self._fields[key] = cls(self._raw, entry[0])
+        return child
+
+    def to_dict(self) -> Dict[str, Any]:
+        return json.loads(self._raw[self._start : _skip(self._raw, self._start)])
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._raw[self._start : _skip(self._raw, self._start)][:80]!r})"
+
+
+class User(LazyObject):
+    __slots__ = ()
+
+    id = _Field("id")
+    is_bot = _Field("is_bot", False)
+    first_name = _Field("first_name")
+    last_name = _Field("last_name")
+    username = _Field("username")
+    language_code = _Field("language_code")
+
+    @property
+    def display_name(self) -> str:
+        """
+        Same choice as helpers.extract_sender_name: the friendliest name the user shared.
+        """
+        for key in ("first_name", "username", "last_name", "language_code"):
+            value = self.get(key)
+            if value:
+                return value
+        return "there"
+
+
+class Chat(LazyObject):
+    __slots__ = ()
+
+    id = _Field("id")
+    type = _Field("type")
+    title = _Field("title")
+    username = _Field("username")
+
+
+class Message(LazyObject):
+    __slots__ = ()
+
+    message_id = _Field("message_id")
+    date = _Field("date")
+    text = _Field("text")
+    caption = _Field("caption")
+    chat = _Child("chat", Chat)
+    sender = _Child("from", User)
+
+    @property
+    def chat_id(self) -> Optional[int]:
+        chat = self.chat
+        return chat.id if chat is not None else None
+
+    @property
+    def sender_name(self) -> str:
+        sender = self.sender
+        return sender.display_name if sender is not None else "there"
+
+
+class Update(LazyObject):
+    """
+    A Telegram update read straight from the webhook body or a `getUpdates` item.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "Update":
+        start = len(raw) - len(raw.lstrip())
+        return cls(raw, start)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Update":
+        return cls(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode())
+
+    update_id = _Field("update_id")
+
+    @property
+    def type(self) -> Optional[str]:
+        """
+        The update type, i.e. the one key besides `update_id`.
+        """
+        self._lookup("update_id")
+        while True:
+            update_type = next((key for key in self._fields if key != "update_id"), None)
+            if update_type is not None or not self._advance():
+                return update_type
+
+    @property
+    def message(self) -> Optional[Message]:
+        """
+        The message carried by a message or edited_message update, like helpers.extract_message.
+        """
+        update_type = self.type
+        return self._child(update_type, Message) if update_type in MESSAGE_TYPES else None
+
+    def __reduce__(self):
+        # Queues and process pipes carry the raw body instead of a tree of objects.
+        return Update, (self._raw[self._start : _skip(self._raw, self._start)],)
+
+
+def updates_in(raw: bytes) -> Optional[List[Update]]:
+    """
+    Return the updates of a getUpdates response body as views over that one body, or None when the
+    body is not a successful result list.
+
+    No update is decoded here, so a polled batch waits in memory as the response bytes it came in.
+    """
+    start = _WHITESPACE.match(raw).end()
+    if start == len(raw) or raw[start] != 0x7B:
+        return None
+    envelope = LazyObject(raw, start)
+    entry = envelope._lookup("result") if envelope.get("ok") is True else None
+    if entry is None or raw[entry[0]] != 0x5B:  # [
+        return None
+    updates: List[Update] = []
+    position = _WHITESPACE.match(raw, entry[0] + 1).end()
+    if raw[position] == 0x5D:  # ]
+        return updates
+    while True:
+        updates.append(Update(raw, position))
+        separator = _ITEM_SEPARATOR.match(raw, _skip(raw, position))
+        if separator is None:
+            raise ValueError(f"Unterminated JSON array at offset {entry[0]}")
+        if separator.group(1) == b"]":
+            return updates
+        position = separator.end()
@@ -1,8 +1,12 @@
 from django.urls import path
 
-from .views import WebhookView
+from .views import AsyncWebhookView, MetricsView, WebhookView
 
 urlpatterns = [
     path('webhook/', WebhookView.as_view(), name='telegram-webhook'),
     path('webhook', WebhookView.as_view(), name='telegram-webhook-noslash'),
+    path('webhook/async/', AsyncWebhookView.as_view(), name='telegram-webhook-async'),
+    path('bots/<slug:bot>/webhook/', WebhookView.as_view(), name='telegram-bot-webhook'),
+    path('bots/<slug:bot>/webhook/async/', AsyncWebhookView.as_view(), name='telegram-bot-webhook-async'),
+    path('metrics/', MetricsView.as_view(), name='telegram-metrics'),
 ]
@@ -1,88 +1,139 @@
+import json
 import logging
 import secrets
-from typing import Any, Dict, Optional
+from typing import Optional
 
 from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.exceptions import ParseError
 from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .helpers import extract_sender_name, pick_greeting
-from .telegram import TelegramClient
+from .helpers import Payload, peek_update
+from .metrics import metrics
+from .resilience import deadline
+from .webhook import WebhookHandler, webhook_limiter
 
 logger = logging.getLogger(__name__)
-telegram_client = TelegramClient()
 
-Payload = Dict[str, Any]
-Message = Dict[str, Any]
 
-
-class WebhookView(APIView):
+class WebhookView(WebhookHandler, APIView):
     authentication_classes = []
     permission_classes = []
     parser_classes = [JSONParser]
 
-    def post(self, request, *args, **kwargs):
-        if not self._is_authorized(request):
-            logger.warning("Rejected webhook call due to missing/invalid secret.")
-            return Response(status=status.HTTP_403_FORBIDDEN)
-
+    def post(self, request, *args, bot: Optional[str] = None, **kwargs):
+        with metrics.timer("telegram_webhook_seconds"), deadline(settings.TELEGRAM_WEBHOOK_DEADLINE):
+            if not self._is_authorized(request, bot):
+                logger.warning("Rejected webhook call due to missing/invalid secret.")
+                return Response(status=status.HTTP_403_FORBIDDEN)
+
+            self._capture(request.body, request.headers, bot)
+            update_id, update_type = peek_update(request.body)
+            self._count_update(update_type)
+            if self._is_filtered(update_type):
+                return Response(status=status.HTTP_200_OK)
+
+            with webhook_limiter.admit() as admitted:
+                if not admitted:
+                    # Saturated: refuse before decoding anything and let Telegram redeliver later.
+                    return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                if self._is_duplicate(update_id, bot):
+                    return Response(status=status.HTTP_200_OK)
+
+                try:
+                    response = self._handle_update(request, bot)
+                except Exception:
+                    self._forget_update(update_id, bot)
+                    raise
+                if response.status_code >= 500:
+                    self._forget_update(update_id, bot)
+                return response
+
+    def _handle_update(self, request, bot: Optional[str] = None):
         try:
-            payload: Payload = request.data or {}
+            with metrics.timer("telegram_parse_seconds"):
+                payload: Payload = request.data or {}
         except ParseError:
             logger.warning("Received invalid JSON payload from Telegram.")
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
         logger.debug("Received Telegram payload: %s", payload)
 
-        message = self._extract_message(payload)
-        if not message:
-            logger.debug("Ignoring update without message payload: %s", payload.get("update_id"))
-            return Response(status=status.HTTP_200_OK)
-
-        chat_id = self._get_chat_id(message)
-        if chat_id is None:
-            logger.warning("Received message without chat id: %s", message)
-            return Response(status=status.HTTP_200_OK)
-
-        greeting = self._prepare_greeting(message)
-        if self._send_greeting(chat_id, greeting):
-            logger.debug("Greeting sent to chat %s: %s", chat_id, greeting)
-        else:
-            logger.error("Failed to send greeting to chat %s", chat_id)
-        return Response(status=status.HTTP_200_OK)
-
-    @staticmethod
-    def _extract_message(payload: Payload) -> Optional[Message]:
-        if not isinstance(payload, dict):
-            return None
-        message = payload.get("message") or payload.get("edited_message")
-        return message if isinstance(message, dict) else None
-
-    @staticmethod
-    def _get_chat_id(message: Message) -> Optional[int]:
-        chat = message.get("chat")
-        return chat.get("id") if isinstance(chat, dict) else None
-
-    @staticmethod
-    def _prepare_greeting(message: Message) -> str:
-        return pick_greeting(extract_sender_name(message))
-
-    @staticmethod
-    def _send_greeting(chat_id: int, greeting: str) -> bool:
-        token = settings.TELEGRAM_BOT_TOKEN
+        status_code, body = self.answer_update(payload, bot)
+        return Response(body, status=status_code)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncWebhookView(View):
+    """
+    Native async twin of WebhookView for ASGI deployments; awaits the Bot API instead of holding a thread.
+    """
+
+    http_method_names = ["post"]
+
+    async def post(self, request, *args, bot: Optional[str] = None, **kwargs):
+        with metrics.timer("telegram_webhook_seconds"), deadline(settings.TELEGRAM_WEBHOOK_DEADLINE):
+            await WebhookView._load_bots_async(bot)
+            if not WebhookView._is_authorized(request, bot):
+                logger.warning("Rejected webhook call due to missing/invalid secret.")
+                return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+
+            WebhookView._capture(request.body, request.headers, bot)
+            update_id, update_type = peek_update(request.body)
+            WebhookView._count_update(update_type)
+            if WebhookView._is_filtered(update_type):
+                return HttpResponse(status=status.HTTP_200_OK)
+
+            with webhook_limiter.admit() as admitted:
+                if not admitted:
+                    return HttpResponse(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                if WebhookView._is_duplicate(update_id, bot):
+                    return HttpResponse(status=status.HTTP_200_OK)
+
+                try:
+                    response = await self._handle_update(request, bot)
+                except Exception:
+                    WebhookView._forget_update(update_id, bot)
+                    raise
+                if response.status_code >= 500:
+                    WebhookView._forget_update(update_id, bot)
+                return response
+
+    async def _handle_update(self, request, bot: Optional[str] = None):
+        try:
+            with metrics.timer("telegram_parse_seconds"):
+                payload: Payload = json.loads(request.body) if request.body else {}
+        except ValueError:
+            logger.warning("Received invalid JSON payload from Telegram.")
+            return HttpResponse(status=status.HTTP_400_BAD_REQUEST)
+
+        logger.debug("Received Telegram payload: %s", payload)
+        status_code, body = await WebhookView.answer_update_async(payload, bot)
+        if body is not None:
+            return JsonResponse(body, status=status_code)
+        return HttpResponse(status=status_code)
+
+
+class MetricsView(View):
+    """
+    Serve the webhook and Bot API metrics of every worker in the Prometheus text format.
+
+    Off unless TELEGRAM_METRICS_TOKEN is set, and then only to requests bearing that token.
+    """
+
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):
+        token = settings.TELEGRAM_METRICS_TOKEN
         if not token:
-            logger.error("TELEGRAM_BOT_TOKEN is not configured; cannot respond.")
-            return False
-        return telegram_client.send_message(chat_id, greeting)
-
-    @staticmethod
-    def _is_authorized(request) -> bool:
-        if settings.DEBUG and not settings.TELEGRAM_WEBHOOK_SECRET:
-            return True
-        if not settings.TELEGRAM_WEBHOOK_SECRET:
-            return False
-        header = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
-        return secrets.compare_digest(header, settings.TELEGRAM_WEBHOOK_SECRET)
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(credentials.encode(), token.encode()):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED, headers={"WWW-Authenticate": "Bearer"})
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,315 @@
+"""
+Webhook handling shared by the DRF view, the async view, the WSGI fast path and the poller.
+
+Nothing here imports DRF, so a worker behind the fast path answers updates without loading it.
+"""
+import logging
+import secrets
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .bots import bots
+from .capture import WebhookCapture
+from .coalesce import Coalescer
+from .dedup import build_update_cache
+from .dispatch import Dispatcher
+from .handlers import router
+from .helpers import Payload, get_chat_id
+from .limiter import AdaptiveLimiter
+from .log import log_context, update_fields
+from .media import file_ids
+from .metrics import metrics
+from .outbox import OutboxWriter
+from .router import MESSAGE_TYPES, Call
+from .telegram import AsyncTelegramClient, TelegramClient, get_breaker, webhook_reply
+from .update import Update
+
+logger = logging.getLogger(__name__)
+telegram_client = TelegramClient()
+async_telegram_client = AsyncTelegramClient()
+dispatcher = Dispatcher(
+    telegram_client,
+    workers=settings.TELEGRAM_DISPATCH_WORKERS,
+    max_queue=settings.TELEGRAM_DISPATCH_QUEUE_SIZE,
+    flush_timeout=settings.TELEGRAM_DISPATCH_FLUSH_TIMEOUT,
+    rate=settings.TELEGRAM_RATE_LIMIT,
+    chat_rate=settings.TELEGRAM_CHAT_RATE_LIMIT,
+)
+update_cache = build_update_cache()
+bot_update_caches: Dict[str, object] = {}
+outbox_writer = OutboxWriter(max_batch=settings.TELEGRAM_OUTBOX_BATCH_SIZE, timeout=settings.TELEGRAM_OUTBOX_TIMEOUT)
+capture = (
+    WebhookCapture(
+        settings.TELEGRAM_CAPTURE_DIR,
+        max_bytes=settings.TELEGRAM_CAPTURE_MAX_BYTES,
+        max_queue=settings.TELEGRAM_CAPTURE_QUEUE_SIZE,
+    )
+    if settings.TELEGRAM_CAPTURE_DIR
+    else None
+)
+coalescer = Coalescer(
+    lambda calls, bot: WebhookHandler._deliver_calls(calls, bot),
+    # At exit the dispatch queue's thread pool no longer sends, so held replies go straight to the Bot API.
+    flush_deliver=lambda calls, bot: WebhookHandler._deliver_calls(calls, bot, WebhookHandler._client(bot)),
+    window=settings.TELEGRAM_COALESCE_WINDOW,
+    max_delay=settings.TELEGRAM_COALESCE_MAX_DELAY,
+    max_chats=settings.TELEGRAM_COALESCE_MAX_CHATS,
+)
+webhook_limiter = AdaptiveLimiter(
+    settings.TELEGRAM_WEBHOOK_MAX_CONCURRENCY,
+    min_limit=settings.TELEGRAM_WEBHOOK_MIN_CONCURRENCY,
+    target_latency=settings.TELEGRAM_WEBHOOK_TARGET_LATENCY,
+)
+
+metrics.gauge("telegram_dispatch_queue_depth", lambda: dispatcher.depth)
+metrics.gauge("telegram_open_circuits", lambda: get_breaker().open_circuits())
+if coalescer.enabled and settings.TELEGRAM_OUTBOX:
+    logger.warning("TELEGRAM_COALESCE_WINDOW is ignored with TELEGRAM_OUTBOX; replies go to the outbox unheld.")
+elif coalescer.enabled:
+    metrics.gauge("telegram_coalesce_held_chats", lambda: coalescer.depth)
+if webhook_limiter.enabled:
+    metrics.gauge("telegram_webhook_in_flight", lambda: webhook_limiter.in_flight)
+    metrics.gauge("telegram_webhook_concurrency_limit", lambda: int(webhook_limiter.limit))
+if settings.TELEGRAM_METRICS_DIR:
+    metrics.share(settings.TELEGRAM_METRICS_DIR, settings.TELEGRAM_METRICS_FLUSH_INTERVAL)
+
+
+class WebhookHandler:
+    """
+    Authorization, filtering, duplicate detection, routing and reply delivery for one update.
+    """
+
+    @classmethod
+    def answer_update(cls, payload: Payload, bot: Optional[str] = None) -> Tuple[int, Optional[Payload]]:
+        """
+        Handle a decoded update and return the HTTP status and JSON body to answer the webhook with.
+
+        `bot` names the registered bot the update came to; None is the TELEGRAM_BOT_TOKEN bot.
+        """
+        with log_context(**update_fields(payload)):
+            body, calls = cls._plan_answer(payload, bot)
+            return cls._answer_status(payload, body, not calls or cls._deliver_calls(calls, bot))
+
+    @classmethod
+    async def answer_update_async(cls, payload: Payload, bot: Optional[str] = None) -> Tuple[int, Optional[Payload]]:
+        """
+        Async twin of answer_update: the same decisions, with replies awaited instead of sent on a thread.
+        """
+        with log_context(**update_fields(payload)):
+            body, calls = cls._plan_answer(payload, bot)
+            return cls._answer_status(payload, body, not calls or await cls._deliver_calls_async(calls, bot))
+
+    @classmethod
+    def _plan_answer(cls, payload: Payload, bot: Optional[str] = None) -> Tuple[Optional[Payload], List[Call]]:
+        """
+        Route an update and return the inline reply body, if any, and the calls still to be delivered.
+        """
+        calls = cls._route(payload)
+        if not calls or cls._coalesce(payload, calls, bot):
+            return None, []
+
+        inline = cls._inline_call(calls, bot)
+        if inline is not None:
+            # Single-call replies ride back on the webhook response; Telegram executes them for us.
+            logger.debug("Answering update %s inline: %s", payload.get("update_id"), inline)
+            return webhook_reply(*inline), []
+        return None, calls
+
+    @staticmethod
+    def _answer_status(payload: Payload, body: Optional[Payload], delivered: bool) -> Tuple[int, Optional[Payload]]:
+        if not delivered:
+            # Let Telegram hold on to the update and redeliver it once the queue drains.
+            logger.warning("Could not queue the reply; deferring update %s", payload.get("update_id"))
+            return HTTPStatus.SERVICE_UNAVAILABLE, None
+        return HTTPStatus.OK, body
+
+    @classmethod
+    def process_update(cls, payload: "Payload | Update") -> bool:
+        """
+        Answer a polled update outside of an HTTP request; returns False when it should be retried later.
+        """
+        if isinstance(payload, Update):
+            # Polled updates wait in batches and shard queues undecoded; decode one only to handle it.
+            payload = payload.to_dict()
+        if cls._is_filtered(cls._update_type(payload)):
+            return True
+        with log_context(**update_fields(payload)):
+            calls = cls._route(payload)
+            return not calls or cls._coalesce(payload, calls) or cls._deliver_calls(calls)
+
+    @classmethod
+    def replay_update(cls, payload: Payload, bot: Optional[str] = None, *, client=None, dedup: bool = True) -> bool:
+        """
+        Handle a captured update the way the webhook did, sending its replies through the Bot API.
+
+        `client` (a stub, say) sends the replies instead of the configured delivery. Returns False when the
+        reply could not be queued.
+        """
+        update_id = payload.get("update_id")
+        if cls._is_filtered(cls._update_type(payload)) or (dedup and cls._is_duplicate(update_id, bot)):
+            return True
+        with log_context(**update_fields(payload)):
+            calls = cls._route(payload)
+            delivered = not calls or cls._deliver_calls(calls, bot, client)
+        if not delivered and dedup:
+            cls._forget_update(update_id, bot)
+        return delivered
+
+    @staticmethod
+    def _route(payload: Payload) -> List[Call]:
+        return router.route(payload)
+
+    @classmethod
+    def _deliver_calls(cls, calls: List[Call], bot: Optional[str] = None, client=None) -> bool:
+        if client is None:
+            if settings.TELEGRAM_OUTBOX or settings.TELEGRAM_DISPATCH_WORKERS:
+                return cls._queue_calls(calls, bot)
+            if bot is None and not settings.TELEGRAM_BOT_TOKEN:
+                logger.error("TELEGRAM_BOT_TOKEN is not configured; cannot respond.")
+                return True
+            client = cls._client(bot)
+        for method, call_payload in calls:
+            if client.call(method, call_payload):
+                logger.debug("%s sent to chat %s", method, call_payload.get("chat_id"))
+            else:
+                logger.error("Failed to send %s to chat %s", method, call_payload.get("chat_id"))
+        return True
+
+    @classmethod
+    async def _deliver_calls_async(cls, calls: List[Call], bot: Optional[str] = None) -> bool:
+        if settings.TELEGRAM_OUTBOX:
+            # Waiting for the outbox commit must not stall the event loop.
+            return await sync_to_async(cls._queue_calls, thread_sensitive=False)(calls, bot)
+        if settings.TELEGRAM_DISPATCH_WORKERS:
+            return cls._queue_calls(calls, bot)
+        if bot is None and not settings.TELEGRAM_BOT_TOKEN:
+            logger.error("TELEGRAM_BOT_TOKEN is not configured; cannot respond.")
+            return True
+        client = cls._async_client(bot)
+        for method, call_payload in calls:
+            if await client.call(method, call_payload):
+                logger.debug("%s sent to chat %s", method, call_payload.get("chat_id"))
+            else:
+                logger.error("Failed to send %s to chat %s", method, call_payload.get("chat_id"))
+        return True
+
+    @staticmethod
+    def _coalesce(payload: Payload, calls: List[Call], bot: Optional[str] = None) -> bool:
+        """
+        Hold the reply to a message for its chat's coalescing window; False means deliver it now.
+
+        Never with the outbox: a held reply lives in process memory, and the webhook has already answered.
+        """
+        if not coalescer.enabled or settings.TELEGRAM_OUTBOX:
+            return False
+        message = next((payload[key] for key in MESSAGE_TYPES if isinstance(payload.get(key), dict)), None)
+        chat_id = get_chat_id(message) if message is not None else None
+        return chat_id is not None and coalescer.offer((bot, chat_id), calls, bot)
+
+    @staticmethod
+    def _inline_call(calls: List[Call], bot: Optional[str] = None) -> Optional[Call]:
+        """
+        Return the call to answer inline with, or None when the reply must go through the Bot API.
+
+        A response body cannot carry a file, so a local file qualifies only once its file_id is known here.
+        """
+        if not settings.TELEGRAM_INLINE_REPLIES or len(calls) != 1:
+            return None
+        token = settings.TELEGRAM_BOT_TOKEN if bot is None else bots.get(bot).token
+        return file_ids.resolve(token, *calls[0])
+
+    @staticmethod
+    def _client(bot: Optional[str] = None) -> TelegramClient:
+        return telegram_client if bot is None else bots.client(bot)
+
+    @staticmethod
+    def _async_client(bot: Optional[str] = None) -> AsyncTelegramClient:
+        return async_telegram_client if bot is None else bots.async_client(bot)
+
+    @staticmethod
+    def _queue_calls(calls: List[Call], bot: Optional[str] = None) -> bool:
+        if bot is None:
+            if settings.TELEGRAM_OUTBOX:
+                return outbox_writer.append_many(calls)
+            return all(dispatcher.submit(method, call_payload) for method, call_payload in calls)
+        if settings.TELEGRAM_OUTBOX:
+            return outbox_writer.append_many(calls, bot=bot)
+        client = bots.client(bot)
+        return all(dispatcher.submit(method, call_payload, client) for method, call_payload in calls)
+
+    @staticmethod
+    def _capture(body: bytes, headers, bot: Optional[str] = None) -> None:
+        if capture is not None:
+            capture.record(body, headers, bot)
+
+    @staticmethod
+    def _count_update(update_type: Optional[str]) -> None:
+        metrics.inc("telegram_updates_total", (("type", update_type or "unknown"),))
+
+    @staticmethod
+    def _update_type(payload: Payload) -> Optional[str]:
+        return next((key for key in payload if key != "update_id"), None)
+
+    @staticmethod
+    def _is_filtered(update_type: Optional[str]) -> bool:
+        allowed = settings.TELEGRAM_ALLOWED_UPDATES
+        if update_type is None or not allowed or update_type in allowed:
+            return False
+        logger.debug("Ignoring %s update before parsing it.", update_type)
+        return True
+
+    @staticmethod
+    def _update_cache(bot: Optional[str] = None):
+        if bot is None:
+            return update_cache
+        if bot not in bot_update_caches:
+            # setdefault keeps the first cache built if two requests of a new bot race here.
+            bot_update_caches.setdefault(bot, build_update_cache(bot))
+        return bot_update_caches[bot]
+
+    @classmethod
+    def _is_duplicate(cls, update_id, bot: Optional[str] = None) -> bool:
+        cache = cls._update_cache(bot)
+        if update_id is None or cache is None or not cache.seen(update_id):
+            return False
+        logger.info("Dropping redelivered update %s", update_id)
+        return True
+
+    @classmethod
+    def _forget_update(cls, update_id, bot: Optional[str] = None) -> None:
+        # The update was not handled, so Telegram's redelivery must not be treated as a duplicate.
+        cache = cls._update_cache(bot)
+        if update_id is not None and cache is not None:
+            cache.forget(update_id)
+
+    @staticmethod
+    async def _load_bots_async(bot: Optional[str]) -> None:
+        if bot is not None:
+            await bots.aload()
+
+    @classmethod
+    def _is_authorized(cls, request, bot: Optional[str] = None) -> bool:
+        header = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if bot is None:
+            return cls._secret_matches(header)
+        config = bots.get(bot)
+        if config is None:
+            # Refused like a wrong secret, so the answer does not tell which bot names exist.
+            metrics.inc("telegram_webhook_rejected_total")
+            return False
+        return cls._secret_matches(header, config.secret)
+
+    @staticmethod
+    def _secret_matches(header: str, expected: Optional[str] = None) -> bool:
+        # `expected` is a registered bot's secret; None checks TELEGRAM_WEBHOOK_SECRET.
+        if expected is None:
+            expected = settings.TELEGRAM_WEBHOOK_SECRET
+        if settings.DEBUG and not expected:
+            return True
+        if expected and secrets.compare_digest(header, expected):
+            return True
+        metrics.inc("telegram_webhook_rejected_total")
+        return False
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 
@@ -21,6 +22,13 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
 
 
+def env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -91,6 +99,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # WAL lets the outbox drainer read while webhook workers append; IMMEDIATE avoids lock upgrades.
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
     }
 }
 
@@ -139,13 +153,136 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
 TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
 TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+# Update types requested from Telegram by setwebhook and accepted by the webhook; empty accepts everything.
+TELEGRAM_ALLOWED_UPDATES = [
+    update_type.strip()
+    for update_type in os.getenv('TELEGRAM_ALLOWED_UPDATES', 'message,edited_message,inline_query').split(',')
+    if update_type.strip()
+]
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org')
+# More bots served at /telegram/bots/<name>/webhook/, as JSON {"name": {"token": ..., "secret": ...}}; active
+# rows of the Bot model are added to them and re-read every RELOAD_INTERVAL seconds.
+TELEGRAM_BOTS = json.loads(os.getenv('TELEGRAM_BOTS', '') or '{}')
+TELEGRAM_BOTS_RELOAD_INTERVAL = float(os.getenv('TELEGRAM_BOTS_RELOAD_INTERVAL', '60'))
+
+# Outbound HTTP: keep-alive pool size per process and (connect, read) timeouts in seconds.
+TELEGRAM_HTTP_POOL_SIZE = int(os.getenv('TELEGRAM_HTTP_POOL_SIZE', '10'))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv('TELEGRAM_CONNECT_TIMEOUT', '3.05'))
+TELEGRAM_READ_TIMEOUT = float(os.getenv('TELEGRAM_READ_TIMEOUT', '10'))
+TELEGRAM_ASYNC_MAX_CONNECTIONS = int(os.getenv('TELEGRAM_ASYNC_MAX_CONNECTIONS', '100'))
+# Per-method circuit breaker: open once FAILURE_RATIO of at least MIN_CALLS calls in WINDOW seconds failed,
+# probe again after COOLDOWN seconds. MIN_CALLS=0 disables it.
+TELEGRAM_BREAKER_FAILURE_RATIO = float(os.getenv('TELEGRAM_BREAKER_FAILURE_RATIO', '0.5'))
+TELEGRAM_BREAKER_MIN_CALLS = int(os.getenv('TELEGRAM_BREAKER_MIN_CALLS', '5'))
+TELEGRAM_BREAKER_WINDOW = float(os.getenv('TELEGRAM_BREAKER_WINDOW', '30'))
+TELEGRAM_BREAKER_COOLDOWN = float(os.getenv('TELEGRAM_BREAKER_COOLDOWN', '15'))
+# Seconds after a webhook request arrives by which its outbound calls must finish; 0 disables the budget.
+TELEGRAM_WEBHOOK_DEADLINE = float(os.getenv('TELEGRAM_WEBHOOK_DEADLINE', '5'))
+
+# Webhook-only worker profile: no admin, auth, sessions, messages or staticfiles, only the /telegram/ URLs, and
+# the fast path always on, so a cold worker answers its first update without loading DRF or the admin.
+TELEGRAM_WEBHOOK_ONLY = env_flag('TELEGRAM_WEBHOOK_ONLY')
+if TELEGRAM_WEBHOOK_ONLY:
+    INSTALLED_APPS = ['core']
+    MIDDLEWARE = [
+        'django.middleware.security.SecurityMiddleware',
+        'django.middleware.common.CommonMiddleware',
+    ]
+    TEMPLATES = []
+    # DRF still serves the per-bot webhooks, without django.contrib.auth or the browsable API.
+    REST_FRAMEWORK = {
+        'DEFAULT_AUTHENTICATION_CLASSES': [],
+        'DEFAULT_PERMISSION_CLASSES': [],
+        'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+        'UNAUTHENTICATED_USER': None,
+    }
+
+# Serve webhook POSTs from a bare WSGI handler that skips MIDDLEWARE and DRF (see core/fastpath.py).
+TELEGRAM_WEBHOOK_FAST_PATH = env_flag('TELEGRAM_WEBHOOK_FAST_PATH') or TELEGRAM_WEBHOOK_ONLY
+
+# Append every authorized webhook request to rotating JSONL files in this directory for `manage.py replay`; empty
+# disables capture. Files rotate at MAX_BYTES; requests beyond QUEUE_SIZE waiting to be written are not captured.
+TELEGRAM_CAPTURE_DIR = os.getenv('TELEGRAM_CAPTURE_DIR', '')
+TELEGRAM_CAPTURE_MAX_BYTES = int(os.getenv('TELEGRAM_CAPTURE_MAX_BYTES', str(100 * 1024 * 1024)))
+TELEGRAM_CAPTURE_QUEUE_SIZE = int(os.getenv('TELEGRAM_CAPTURE_QUEUE_SIZE', '10000'))
+
+# Adaptive webhook concurrency limit (AIMD) per process; requests over it get 503 and Telegram redelivers them.
+# The limit shrinks while requests take longer than TARGET_LATENCY seconds. MAX_CONCURRENCY=0 disables shedding.
+TELEGRAM_WEBHOOK_MAX_CONCURRENCY = int(os.getenv('TELEGRAM_WEBHOOK_MAX_CONCURRENCY', '0'))
+TELEGRAM_WEBHOOK_MIN_CONCURRENCY = int(os.getenv('TELEGRAM_WEBHOOK_MIN_CONCURRENCY', '2'))
+TELEGRAM_WEBHOOK_TARGET_LATENCY = float(os.getenv('TELEGRAM_WEBHOOK_TARGET_LATENCY', '1'))
+
+# Answer updates in the webhook HTTP response body instead of a separate sendMessage call.
+TELEGRAM_INLINE_REPLIES = env_flag('TELEGRAM_INLINE_REPLIES')
+
+# Local media sent with core.media.local(name), uploaded once per bot and reused by file_id; GREETING_MEDIA is
+# a comma-separated list of such files, one of which follows each greeting (empty sends text only).
+TELEGRAM_MEDIA_ROOT = os.getenv('TELEGRAM_MEDIA_ROOT', '') or str(BASE_DIR / 'media')
+TELEGRAM_GREETING_MEDIA = [name.strip() for name in os.getenv('TELEGRAM_GREETING_MEDIA', '').split(',') if name.strip()]
+
+# Inline mode: built answers kept per process, and seconds Telegram may reuse an answer for the same user.
+TELEGRAM_INLINE_CACHE_SIZE = int(os.getenv('TELEGRAM_INLINE_CACHE_SIZE', '1000'))
+TELEGRAM_INLINE_CACHE_TIME = int(os.getenv('TELEGRAM_INLINE_CACHE_TIME', '300'))
+
+# Per-chat reply coalescing: a chat's messages and edits within WINDOW seconds of each other get one reply, to the
+# latest, sent at most MAX_DELAY seconds after the first; at most MAX_CHATS chats are held. WINDOW=0 disables it.
+TELEGRAM_COALESCE_WINDOW = float(os.getenv('TELEGRAM_COALESCE_WINDOW', '0'))
+TELEGRAM_COALESCE_MAX_DELAY = float(os.getenv('TELEGRAM_COALESCE_MAX_DELAY', '3'))
+TELEGRAM_COALESCE_MAX_CHATS = int(os.getenv('TELEGRAM_COALESCE_MAX_CHATS', '10000'))
+
+# Background dispatch of outbound calls; 0 workers keeps sending synchronously on the request thread.
+TELEGRAM_DISPATCH_WORKERS = int(os.getenv('TELEGRAM_DISPATCH_WORKERS', '0'))
+TELEGRAM_DISPATCH_QUEUE_SIZE = int(os.getenv('TELEGRAM_DISPATCH_QUEUE_SIZE', '1000'))
+TELEGRAM_DISPATCH_FLUSH_TIMEOUT = float(os.getenv('TELEGRAM_DISPATCH_FLUSH_TIMEOUT', '5'))
+# Outbound pacing in messages per second: bot-wide and per chat (Telegram allows ~30/s and ~1/s).
+TELEGRAM_RATE_LIMIT = float(os.getenv('TELEGRAM_RATE_LIMIT', '30'))
+TELEGRAM_CHAT_RATE_LIMIT = float(os.getenv('TELEGRAM_CHAT_RATE_LIMIT', '1'))
+
+# Drop redelivered updates by update_id: '' disables, 'memory' is per process, 'sqlite' is shared by all workers.
+TELEGRAM_DEDUP_BACKEND = os.getenv('TELEGRAM_DEDUP_BACKEND', 'memory')
+TELEGRAM_DEDUP_SIZE = int(os.getenv('TELEGRAM_DEDUP_SIZE', '10000'))
+TELEGRAM_DEDUP_TTL = float(os.getenv('TELEGRAM_DEDUP_TTL', '3600'))
+TELEGRAM_DEDUP_PATH = os.getenv('TELEGRAM_DEDUP_PATH', str(BASE_DIR / 'dedup.sqlite3'))
+
+# Persist replies in the database outbox and send them from `manage.py drainoutbox` (true/false).
+TELEGRAM_OUTBOX = env_flag('TELEGRAM_OUTBOX')
+TELEGRAM_OUTBOX_BATCH_SIZE = int(os.getenv('TELEGRAM_OUTBOX_BATCH_SIZE', '500'))
+TELEGRAM_OUTBOX_TIMEOUT = float(os.getenv('TELEGRAM_OUTBOX_TIMEOUT', '5'))
+
+# Shared directory where each worker publishes its metrics; empty serves this process only.
+TELEGRAM_METRICS_DIR = os.getenv('TELEGRAM_METRICS_DIR', '')
+TELEGRAM_METRICS_FLUSH_INTERVAL = float(os.getenv('TELEGRAM_METRICS_FLUSH_INTERVAL', '5'))
+# Bearer token a scraper must send to read /telegram/metrics/; empty turns the endpoint off.
+TELEGRAM_METRICS_TOKEN = os.getenv('TELEGRAM_METRICS_TOKEN', '')
+
+# Logging for the core app, written as JSON lines ('json') or plain text ('text') by a background thread. Up to
+# RATE_LIMIT warnings and errors per message pass every RATE_INTERVAL seconds (0 lets all through), messages are
+# cut at MAX_LENGTH characters, and REDACT_KEYS are hidden in logged payloads.
+CORE_LOG_FORMAT = os.getenv('CORE_LOG_FORMAT', 'json')
+CORE_LOG_QUEUE_SIZE = int(os.getenv('CORE_LOG_QUEUE_SIZE', '10000'))
+CORE_LOG_RATE_LIMIT = int(os.getenv('CORE_LOG_RATE_LIMIT', '10'))
+CORE_LOG_RATE_INTERVAL = float(os.getenv('CORE_LOG_RATE_INTERVAL', '60'))
+CORE_LOG_MAX_LENGTH = int(os.getenv('CORE_LOG_MAX_LENGTH', '2000'))
+CORE_LOG_REDACT_KEYS = [
+    key.strip()
+    for key in os.getenv(
+        'CORE_LOG_REDACT_KEYS', 'text,caption,query,phone_number,first_name,last_name,username'
+    ).split(',')
+    if key.strip()
+]
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
+            '()': 'core.log.QueueLogHandler',
+            'json_format': CORE_LOG_FORMAT == 'json',
+            'max_queue': CORE_LOG_QUEUE_SIZE,
+            'rate': CORE_LOG_RATE_LIMIT,
+            'interval': CORE_LOG_RATE_INTERVAL,
+            'max_length': CORE_LOG_MAX_LENGTH,
+            'redact_keys': CORE_LOG_REDACT_KEYS,
         },
     },
     'loggers': {